@@ -0,0 +1,180 @@
+import os
+import math
+import heapq
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, Tuple
+
+from backend.deadline import remaining_time
+
+
+# Chat turns running at once in this worker; more would only queue on Gemini and the threadpool
+MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32"))
+# Turns one client may have running or queued
+MAX_PER_CLIENT = int(os.getenv("ADMISSION_MAX_PER_CLIENT", "4"))
+QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "16"))
+# Longest a turn waits for a slot before it is turned away
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+MAX_RETRY_AFTER_SECONDS = 30
+
+# Lower runs first: a slot confirmation completes a booking the user already waited for
+PRIORITY_CONFIRMATION = 0
+PRIORITY_CALENDAR = 1
+PRIORITY_CHAT = 2
+
+
+class Overloaded(Exception):
+    """A turn was turned away; answered as 429 (client over its share) or 503 (server full)"""
+
+    def __init__(self, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class AdmissionController:
+    """
+    Caps chat turns running at once, globally and per client.
+
+    A turn over the cap waits in a short queue ordered by priority, then
+    arrival. When the queue is full a newcomer may displace the least
+    important waiter; otherwise it, or a turn that would not get a slot
+    before its deadline, is rejected at once rather than left to time out.
+    Keeping the number of running turns at capacity keeps their latency,
+    and so throughput, close to that of an unloaded worker.
+
+    Used from the event loop only, so the bookkeeping needs no lock. Limits
+    apply per worker process.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_per_client: int = MAX_PER_CLIENT,
+                 queue_size: int = QUEUE_SIZE, queue_timeout: float = QUEUE_TIMEOUT_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_per_client = max_per_client
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._per_client: Dict[str, int] = {}
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        # Smoothed time a turn holds its slot, for queue wait and Retry-After estimates
+        self._service_seconds = 1.0
+        self.admitted = 0
+        self.rejected = {"client": 0, "full": 0, "timeout": 0, "displaced": 0}
+
+    def _waiting(self) -> int:
+        return sum(1 for _, _, waiter in self._queue if not waiter.done())
+
+    def _expected_wait(self, ahead: int) -> float:
+        return self._service_seconds * (ahead + 1) / self.max_in_flight
+
+    def _retry_after(self, ahead: Optional[int] = None) -> int:
+        ahead = self._waiting() if ahead is None else ahead
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(self._expected_wait(ahead))))
+
+    def _reject(self, reason: str, status_code: int, detail: str, retry_after: Optional[int] = None) -> Overloaded:
+        self.rejected[reason] += 1
+        return Overloaded(status_code, retry_after or self._retry_after(), detail)
+
+    def _displace_least_important(self, priority: int) -> bool:
+        """Turn away the latest arrival of the lowest priority below the given one"""
+        candidates = [entry for entry in self._queue if not entry[2].done() and entry[0] > priority]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda entry: (entry[0], entry[1]))
+        victim[2].set_exception(self._reject("displaced", 503, "Server busy, please retry"))
+        return True
+
+    def _wake_next(self):
+        while self._queue and self.in_flight < self.max_in_flight:
+            _, _, waiter = heapq.heappop(self._queue)
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def _acquire(self, priority: int):
+        if self.in_flight < self.max_in_flight and not self._waiting():
+            self.in_flight += 1
+            return
+        ahead = sum(1 for p, _, waiter in self._queue if not waiter.done() and p <= priority)
+        budget = remaining_time()
+        timeout = self.queue_timeout if budget is None else min(self.queue_timeout, budget)
+        if self._expected_wait(ahead) > timeout:
+            raise self._reject("full", 503, "Server busy, please retry", self._retry_after(ahead))
+        if self._waiting() >= self.queue_size and not self._displace_least_important(priority):
+            raise self._reject("full", 503, "Server busy, please retry")
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._order), waiter))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # Admitted just as the wait ran out
+                return
+            if not waiter.done():
+                waiter.cancel()
+            raise self._reject("timeout", 503, "Server busy, please retry")
+        except asyncio.CancelledError:
+            # The client went away while queued; hand over a slot it was given
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                self._release_slot()
+            else:
+                waiter.cancel()
+            raise
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._wake_next()
+
+    @asynccontextmanager
+    async def admit(self, client: str, priority: int = PRIORITY_CHAT):
+        """
+        Hold a slot for one turn.
+
+        Raises:
+            Overloaded: 429 if the client already has MAX_PER_CLIENT turns,
+                503 if no slot frees up in time
+        """
+        if self._per_client.get(client, 0) >= self.max_per_client:
+            raise self._reject("client", 429, "Too many requests in progress", self._retry_after(0))
+        self._per_client[client] = self._per_client.get(client, 0) + 1
+        try:
+            await self._acquire(priority)
+        except BaseException:
+            self._leave(client)
+            raise
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * held
+            self._leave(client)
+            self._release_slot()
+
+    def _leave(self, client: str):
+        count = self._per_client.get(client, 0) - 1
+        if count > 0:
+            self._per_client[client] = count
+        else:
+            self._per_client.pop(client, None)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self._waiting(),
+            "clients": len(self._per_client),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "service_seconds": round(self._service_seconds, 3),
+            "max_in_flight": self.max_in_flight,
+            "max_per_client": self.max_per_client,
+            "queue_size": self.queue_size
+        }
+
+
+admission = AdmissionController()
@@ -1,21 +1,43 @@
 import os
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema.messages import HumanMessage, AIMessage
 import re
+from collections import Counter
+from collections.abc import MutableMapping
 from datetime import datetime, timedelta, time, date
 from backend.calendar_utils import (
     suggest_available_slots,
-    get_calendar_service,
     book_slot,
     extract_date_time,
+    extract_date_time_with_confidence,
     check_calendar_events,
     is_time_slot_available,
-    get_available_slots
+    get_events_in_range,
+    get_agenda,
+    get_view_range,
+    summarize_agenda,
+    find_best_slots,
+    get_busy_intervals,
+    book_recurring,
+    cancel_events,
+    reschedule_events,
+    find_next_available,
+    NEXT_AVAILABLE_HORIZONS
 )
-from typing import Optional, Tuple, List, Dict, Any
-import pytz
+from backend.events import Event, format_time
+from backend.profiles import current_profile
+from backend.recurrence import is_recurring_request, parse_recurrence, describe_rule
+from backend.deadline import (
+    hedged_call, call_with_deadline, check_deadline, start_branch, Branch, LatencyTracker, UPSTREAM_TIMEOUT_SECONDS
+)
+from backend.profiling import profiled
+from backend.turn_cache import turn_scope
+from backend.sessions import SessionStore, current_session_id, session_turn
+from backend.admission import PRIORITY_CONFIRMATION, PRIORITY_CALENDAR, PRIORITY_CHAT
+from backend.conversation import ConversationContext, CHAT_PROMPT, EXTRACTION_PROMPT, count_tokens
+from typing import Optional, Tuple, List, Dict, Any, Literal, Callable
+from pydantic import BaseModel, Field, ValidationError, field_validator
+import json
 
 
 load_dotenv()
@@ -24,33 +46,112 @@ load_dotenv()
 llm = ChatGoogleGenerativeAI(
     model="gemini-2.0-flash",
     #temperature=0.7,  
+    timeout=UPSTREAM_TIMEOUT_SECONDS,
 )
 
+chat_chain = CHAT_PROMPT | llm
+extraction_chain = EXTRACTION_PROMPT | llm
 
-session_state = {
-    'intent': None,
-    'date': None,
-    'time': None,
-    'slots': [], 
-    'slot_selected': None,
-    'confirmed': False,
-    'context': [],  
-    'waiting_for_slot': False, 
-    'selected_date': None
-}
+# Recent Gemini latencies; a call slower than their p95 gets a hedged duplicate
+llm_latency = LatencyTracker()
 
-def reset_session():
-    session_state.update({
+def invoke_llm(runnable, variables):
+    """Invoke a chain or the model within the request deadline, hedging slow calls"""
+    return hedged_call(runnable.invoke, variables, tracker=llm_latency)
+
+# Below this rule-parser confidence the LLM is asked to extract the date/time instead
+PARSE_CONFIDENCE_THRESHOLD = float(os.getenv("PARSE_CONFIDENCE_THRESHOLD", "0.75"))
+# Start the likely calendar read for the rule-parsed date while Gemini is still working
+SPECULATIVE_READS = os.getenv("SPECULATIVE_READS", "true").lower() in ("1", "true", "yes")
+
+# How often each date/time extraction path is taken: rule, rule_no_date or llm
+# (llm_no_result counts the llm extractions that found nothing, a subset of llm)
+routing_stats = Counter()
+# How whole calendar turns were handled: structured (one Gemini call) or rule_turn
+turn_routing = Counter()
+
+
+def new_session_state() -> Dict[str, Any]:
+    return {
         'intent': None,
         'date': None,
         'time': None,
         'slots': [],
         'slot_selected': None,
         'confirmed': False,
-        'context': [],
+        'context': ConversationContext(),
         'waiting_for_slot': False,
-        'selected_date': None
-    })
+        'selected_date': None,
+        'waiting_for_cancel': False,
+        'cancel_candidates': [],
+        'cancel_needs_yes': False
+    }
+
+
+sessions = SessionStore(new_session_state)
+
+
+class _SessionState(MutableMapping):
+    """State of the session bound with use_session (the default session otherwise)"""
+
+    def _state(self) -> Dict[str, Any]:
+        return sessions.get(current_session_id())
+
+    def __getitem__(self, key):
+        return self._state()[key]
+
+    def __setitem__(self, key, value):
+        self._state()[key] = value
+
+    def __delitem__(self, key):
+        del self._state()[key]
+
+    def __iter__(self):
+        return iter(self._state())
+
+    def __len__(self):
+        return len(self._state())
+
+
+session_state = _SessionState()
+
+def reset_session():
+    sessions.reset(current_session_id())
+
+DEFAULT_MEETING_MINUTES = 60
+SUGGESTED_SLOTS = 3
+
+# "cancel all my meetings Friday", "clear my calendar tomorrow"; not "the all-hands" or "all week"
+_BULK_PATTERN = re.compile(
+    r'\b(all|every)\s+(of\s+)?(my\s+|the\s+)?(meetings?|events?|appointments?)\b|\bclear\b.*\b(day|calendar|schedule)\b',
+    re.IGNORECASE
+)
+# Replies that confirm or decline a cancellation offered in the previous turn
+_YES_REPLIES = {"yes", "y", "yes please", "yep", "yeah", "sure", "ok", "okay", "confirm", "go ahead", "do it"}
+_NO_REPLIES = {"none", "no", "n", "nope", "never mind", "nevermind", "neither", "cancel that", "don't"}
+# "reschedule my 3pm", "move my 3pm to 5pm", "push the standup to 10am"
+_RESCHEDULE_PATTERN = re.compile(
+    r'\breschedule\b|\b(move|push|shift)\s+(my|the|all|every|today|tomorrow)\b.*\bto\b', re.IGNORECASE
+)
+# "when's the soonest free hour", "next available 30 minutes"
+_NEXT_AVAILABLE_PATTERN = re.compile(
+    r'\b(soonest|earliest|next (available|free|open)|first (available|free|open))\b', re.IGNORECASE
+)
+# Titles too generic to pick one event out by name
+GENERIC_TITLES = {"meeting", "event", "appointment", "call", "busy", "no title"}
+
+def extract_duration(message: str) -> Optional[int]:
+    """Meeting length in minutes from phrases like '30 minutes', '1.5 hours' or 'half an hour'"""
+    message_lower = message.lower()
+    if "half an hour" in message_lower or "half hour" in message_lower:
+        return 30
+    match = re.search(r'(\d+(?:\.\d+)?)\s*(minutes?|mins?|hours?|hrs?|h)\b', message_lower)
+    if not match:
+        return None
+    amount = float(match.group(1))
+    if match.group(2).startswith('h'):
+        amount *= 60
+    return int(amount) or None
 
 def detect_intent(message: str) -> str:
     """Detect the user's intent from the message"""
@@ -82,6 +183,20 @@ def detect_intent(message: str) -> str:
    
     return "general"
 
+def admission_priority(message: str) -> int:
+    """
+    How urgent a turn is when the server is busy, without get_intent's side
+    effects: picking from slots or events just offered first, calendar
+    requests next, small talk last
+    """
+    text = message.strip().lower()
+    if session_state.get('waiting_for_slot', False) and text.isdigit() and \
+            1 <= int(text) <= len(session_state.get('slots', [])):
+        return PRIORITY_CONFIRMATION
+    if session_state.get('waiting_for_cancel', False) and pending_cancel_pick(text) is not None:
+        return PRIORITY_CONFIRMATION
+    return PRIORITY_CHAT if detect_intent(text) == "general" else PRIORITY_CALENDAR
+
 def get_intent(message: str) -> str:
     """Determine user's intent using keyword matching and context"""
     message = message.lower()
@@ -94,16 +209,25 @@ def get_intent(message: str) -> str:
         if time_related and not message.strip().isdigit():
             session_state['waiting_for_slot'] = False
     
+    if session_state.get('waiting_for_cancel', False) and pending_cancel_pick(message) is not None:
+        return "confirm cancel"
+    
+    if _RESCHEDULE_PATTERN.search(message):
+        return "reschedule meeting"
+    
     if intent == "cancel meeting":
         return intent
     
+    if _NEXT_AVAILABLE_PATTERN.search(message):
+        return "next available"
+    
     if any(keyword in message for keyword in ["book", "schedule", "meeting", "appointment"]):
         return "book meeting"
     if any(keyword in message for keyword in ["available", "slots", "time", "when"]):
         return "check availability"
     if any(keyword in message for keyword in ["cancel", "remove", "delete"]):
         return "cancel meeting"
-    if any(keyword in message for keyword in ["view", "show", "list", "calendar"]):
+    if any(keyword in message for keyword in ["view", "show", "list", "calendar", "agenda", "week", "month", "what do i have"]):
         return "check calendar"
     
     if session_state.get('waiting_for_slot', False):
@@ -120,7 +244,193 @@ def get_intent(message: str) -> str:
     
     return "general conversation"
 
-def handle_calendar_action(intent: str, message: str) -> str:
+CALENDAR_INTENTS = ["check availability", "book meeting", "cancel meeting", "reschedule meeting", "next available",
+                    "check calendar"]
+# Flows that read the message themselves; the structured extraction has no fields for them
+RULE_ONLY_INTENTS = ["reschedule meeting", "next available"]
+# Replies to a question the bot asked in the previous turn
+FOLLOW_UP_INTENTS = ["confirm slot", "confirm cancel"]
+
+class TurnExtraction(BaseModel):
+    """Intent, slots and reply for one chat turn, returned by a single Gemini call"""
+    intent: Literal["book meeting", "check availability", "cancel meeting", "check calendar", "general conversation"] = Field(
+        description="What the user wants to do")
+    date: Optional[str] = Field(None, description="Date the request is about, YYYY-MM-DD")
+    start_time: Optional[str] = Field(None, description="Start time, HH:MM 24-hour")
+    end_time: Optional[str] = Field(None, description="End time, HH:MM 24-hour")
+    duration_minutes: Optional[int] = Field(None, description="Meeting length in minutes if stated")
+    attendees: List[str] = Field(default_factory=list, description="Email addresses of people to invite")
+    title: Optional[str] = Field(None, description="Title of the meeting the user refers to, e.g. to cancel it")
+    view: Literal["day", "week", "month"] = Field(
+        "day", description="Whether the user asks about the day of date, or the week or month around it")
+    reply: str = Field(description="Short, friendly reply to the user in markdown")
+
+    @field_validator('date')
+    @classmethod
+    def _check_date(cls, value):
+        if value:
+            datetime.strptime(value, '%Y-%m-%d')
+        return value or None
+
+    @field_validator('start_time', 'end_time')
+    @classmethod
+    def _check_time(cls, value):
+        if value:
+            datetime.strptime(value, '%H:%M')
+        return value or None
+
+    @field_validator('duration_minutes')
+    @classmethod
+    def _check_duration(cls, value):
+        if value is not None and not 0 < value <= 24 * 60:
+            raise ValueError("duration must be between 1 minute and 24 hours")
+        return value
+
+    def to_message(self, bulk: bool = False, week: bool = False) -> str:
+        """
+        Restate the extracted request in the phrasing the rule-based flows parse with full confidence,
+        so the existing flows run unchanged and never need the LLM again this turn.
+
+        bulk keeps "all" in a cancel restatement, which the extraction has no field for;
+        week, or a week view, keeps a week-long slot search. The title is not restated: a title such as
+        "Sprint 12 review" would be read as a time, so it is passed to the flow separately.
+        """
+        if not self.date:
+            return ""
+        week = week or self.view == "week"
+        parsed = datetime.strptime(self.date, '%Y-%m-%d')
+        # "October 20th, 2026": a bare "20" would also be read as 8 PM by parse_time
+        suffix = 'th' if 10 <= parsed.day % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(parsed.day % 10, 'th')
+        day = f"{parsed.strftime('%B')} {parsed.day}{suffix}, {parsed.year}"
+        end_time = self.end_time
+        if self.start_time and not end_time and self.duration_minutes:
+            start = datetime.strptime(self.start_time, '%H:%M')
+            end_time = (start + timedelta(minutes=self.duration_minutes)).strftime('%H:%M')
+        if self.intent == "book meeting":
+            if self.start_time and end_time:
+                return f"book meeting {day} from {self.start_time} to {end_time}"
+            if self.start_time:
+                return f"book meeting {day} at {self.start_time}"
+            return f"book meeting {day} for the week" if week else f"book meeting {day}"
+        if self.intent == "check availability":
+            if self.start_time:
+                return f"available {day} at {self.start_time}"
+            return f"available {day} for the week" if week else f"available {day}"
+        if self.intent == "cancel meeting":
+            target = f" at {self.start_time}" if self.start_time else ""
+            return f"cancel {'all meetings' if bulk else 'meeting'} {day}{target}"
+        if self.view != "day":
+            return f"show {self.view} calendar {day}"
+        return f"show calendar {day}"
+
+TURN_SCHEMA = json.dumps(TurnExtraction.model_json_schema())
+TURN_SCHEMA_TOKENS = count_tokens(TURN_SCHEMA) + 80
+
+def _parse_json_object(text: str) -> Dict[str, Any]:
+    """Pull the JSON object out of a model reply, tolerating markdown code fences"""
+    start = text.find('{')
+    end = text.rfind('}')
+    if start == -1 or end == -1:
+        raise ValueError(f"No JSON object in model reply: {text[:100]}")
+    return json.loads(text[start:end + 1])
+
+def extract_turn_with_gemini(message: str) -> Optional[TurnExtraction]:
+    """
+    One Gemini call that returns intent, date, times, duration, attendees and the reply.
+
+    Returns None when the call fails or the output does not validate; callers
+    then fall back to the deterministic parser.
+    """
+    try:
+        profile = current_profile()
+        user_input = f"""Current context:
+- User's timezone: {profile.timezone}
+- Current time: {profile.now().strftime('%A, %B %d, %Y at %I:%M %p')}
+
+User's message: {message}"""
+        conversation = session_state['context']
+        variables = conversation.prompt_variables(user_input, reserved_tokens=TURN_SCHEMA_TOKENS)
+        variables['schema'] = TURN_SCHEMA
+        
+        response = invoke_llm(extraction_chain, variables)
+        extraction = TurnExtraction.model_validate(_parse_json_object(response.content))
+        print(f"Structured extraction: {extraction.model_dump()}")
+        return extraction
+        
+    except (ValidationError, ValueError) as e:
+        print(f"Invalid structured output from Gemini: {e}")
+        return None
+    except Exception as e:
+        print(f"Error in extract_turn_with_gemini: {e}")
+        return None
+
+def needs_model(intent: str, message: str) -> bool:
+    """Whether the rule-based path cannot handle this turn alone"""
+    if intent in FOLLOW_UP_INTENTS or session_state.get('waiting_for_slot', False):
+        return False
+    if intent in RULE_ONLY_INTENTS:
+        return False
+    if intent not in CALENDAR_INTENTS:
+        return True
+    result = extract_date_time_with_confidence(message)
+    return has_date_cue(result) and result.confidence < PARSE_CONFIDENCE_THRESHOLD
+
+def has_date_cue(result) -> bool:
+    """Whether the rule parser saw anything date- or time-like in the message"""
+    return result.dt is not None or result.time is not None or result.ambiguous
+
+def is_small_talk(intent: str, message: str) -> bool:
+    """No calendar keywords and nothing date-like: plain conversation the chat chain can stream"""
+    return intent not in CALENDAR_INTENTS and intent not in FOLLOW_UP_INTENTS \
+        and not session_state.get('waiting_for_slot', False) \
+        and not has_date_cue(extract_date_time_with_confidence(message))
+
+def _as_date(value) -> Optional[date]:
+    return value.date() if isinstance(value, datetime) else value
+
+def availability_days(message: str) -> int:
+    """Days a slot search covers: a week when the message asks about one, else the day"""
+    return 7 if "week" in message.lower() else 1
+
+def calendar_view(message: str) -> str:
+    """Calendar view a message asks for: month, week or day"""
+    message_lower = message.lower()
+    if "month" in message_lower:
+        return "month"
+    if "week" in message_lower:
+        return "week"
+    return "day"
+
+def planned_read(intent: str, day: Optional[date], has_time: bool, days: int = 1, view: str = "day") -> Optional[Tuple]:
+    """
+    The calendar read the flow for intent starts with on day, as (fn, *args),
+    when it is predictable: the events of the view around day for viewing,
+    the day's events for cancelling, the busy blocks of the days searched
+    (availability_days) for slot suggestions.
+    """
+    if day is None:
+        return None
+    if intent == "check calendar":
+        return (get_events_in_range, *get_view_range(day, view))
+    if intent == "cancel meeting":
+        return (get_events_in_range, day, day)
+    if intent in ("check availability", "book meeting") and not has_time:
+        return (get_busy_intervals, day, day + timedelta(days=days - 1))
+    return None
+
+def start_speculative_read(plan: Optional[Tuple]) -> Optional[Branch]:
+    """
+    Run a planned read in the background. Nothing joins the branch directly:
+    the flow's identical call finds it in the turn cache and waits for it
+    there, so the turn costs max(LLM, read) instead of the sum.
+    """
+    if plan is None or not SPECULATIVE_READS:
+        return None
+    fn, *args = plan
+    return start_branch(fn, *args)
+
+def handle_calendar_action(intent: str, message: str, attendees: Optional[List[str]] = None,
+                           title: Optional[str] = None) -> str:
     """Handle calendar-specific actions with improved conversation flow"""
     intent = intent.lower()
     
@@ -130,100 +440,71 @@ def handle_calendar_action(intent: str, message: str) -> str:
     if intent == "check availability":
         return check_availability_flow(message)
     elif intent == "book meeting":
+        if is_recurring_request(message):
+            return book_recurring_flow(message)
         dt, time_obj = extract_date_time(message)
         if dt and time_obj:
-            return book_meeting_flow(message)
+            return book_meeting_flow(message, attendees=attendees)
         elif dt:
             return check_availability_flow(message)
         else:
             return "I'd be happy to help you book a meeting. Could you please tell me when you'd like to schedule it?"
     elif intent == "cancel meeting":
-        return handle_cancel_request(message)
+        return handle_cancel_request(message, title=title)
+    elif intent == "reschedule meeting":
+        return reschedule_flow(message)
+    elif intent == "next available":
+        return next_available_flow(message)
     elif intent == "check calendar":
         return check_calendar(message)
     
     return "I'm not sure how to help with that. I can help you book meetings, check availability, or view your calendar."
 
-def handle_default_response(message: str) -> str:
+def handle_default_response(message: str, on_token: Optional[Callable[[str], None]] = None) -> str:
     """Handle default conversation flow with enhanced context awareness and natural responses"""
     try:
-        chat_history = []
-        for i in range(0, len(session_state.get('context', [])), 2):
-            if i + 1 < len(session_state['context']):
-                chat_history.append((session_state['context'][i].content, session_state['context'][i+1].content))
-        
-        system_message = """You are TailorTalk Assistant, a friendly and professional calendar scheduling bot. 
-Your goal is to help users manage their calendar, book meetings, and check availability.
-
-Guidelines:
-- Be warm, concise, and helpful
-- Use natural language and emojis when appropriate
-- If you need more information, ask specific questions
-- When confirming actions, summarize the details
-- Keep responses brief and to the point
-- Use markdown for better readability
-
-You can help with:
-- Booking meetings
-- Checking availability
-- Viewing calendar events
-- Managing existing bookings"""
-        
-        messages = [("system", system_message)]
-        
-        for user_msg, ai_msg in chat_history[-4:]:
-            messages.extend([
-                ("user", user_msg),
-                ("assistant", ai_msg)
-            ])
-        
+        profile = current_profile()
         current_context = f"""Current context:
-- User's timezone: Asia/Kolkata
-- Current time: {datetime.now().strftime('%A, %B %d, %Y at %I:%M %p')}
+- User's timezone: {profile.timezone}
+- Current time: {profile.now().strftime('%A, %B %d, %Y at %I:%M %p')}
 
 User's message: {message}"""
         
-        messages.append(("user", current_context))
-        
-        template = ChatPromptTemplate.from_messages([
-            (role, content) for role, content in messages
-        ])
+        conversation = session_state['context']
+        variables = conversation.prompt_variables(current_context)
+        print(f"Prompt size: ~{conversation.last_prompt_tokens}/{conversation.max_prompt_tokens} tokens")
         
-        chain = template | llm
-        response = chain.invoke({})
+        if on_token is None:
+            response = invoke_llm(chat_chain, variables)
+            return response.content.strip()
         
-        response_text = response.content.strip()
+        def stream() -> str:
+            parts = []
+            for chunk in chat_chain.stream(variables):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    on_token(chunk.content)
+            return "".join(parts).strip()
         
-        session_state.setdefault('context', []).append(AIMessage(content=response_text))
-        
-        return response_text
+        # Streaming is not hedged: a duplicate would interleave tokens
+        return call_with_deadline(stream)
         
     except Exception as e:
         print(f"Error in handle_default_response: {str(e)}")
         return "I apologize, but I'm having trouble processing your request. Could you please rephrase or try again?"
 
-def format_calendar_response(events: list) -> str:
+def format_calendar_response(events: List[Event]) -> str:
     """Format calendar events into a natural language response"""
     if not events:
         return "You don't have any events scheduled for this time."
     
+    tz = current_profile().tz
     response = ["Here's what I found on your calendar:"]
     
     for i, event in enumerate(events, 1):
-        start = datetime.fromisoformat(event['start'].get('dateTime', event['start'].get('date')))
-        end = datetime.fromisoformat(event['end'].get('dateTime', event['end'].get('date')))
-        
-        time_str = f"{start.strftime('%I:%M %p').lstrip('0')} - {end.strftime('%I:%M %p').lstrip('0')}"
-            
-        response.append(f"{i}.  *{event.get('summary', 'No title')}*")
-        response.append(f"    {start.strftime('%A, %B %d, %Y')}" + 
-                      f" at {time_str}")
-        
-        if 'location' in event:
-            response.append(f"    {event['location']}")
-        if 'description' in event:
-            desc = event['description'][:100] + '...' if len(event['description']) > 100 else event['description']
-            response.append(f"    {desc}")
+        response.append(f"{i}.  *{event.summary}*")
+        response.append(f"    {event.start_dt(tz).strftime('%A, %B %d, %Y')}" + 
+                      f" at {event.time_range_text(tz)}")
         response.append("")
     
     return "\n".join(response)
@@ -248,10 +529,12 @@ def check_availability_flow(message: str) -> str:
                 print(f"Error parsing time range: {e}")
         
         if time_obj:
-            if not (datetime.time(9, 0) <= time_obj.time() < datetime.time(18, 0)):
-                return f"I'm only available between 9 AM and 6 PM. Would you like to pick another time?"
+            profile = current_profile()
+            if not profile.is_working_time(time_obj):
+                return f"I'm only available between {profile.working_hours_text()}. Would you like to pick another time?"
                 
-            available = is_time_slot_available(dt, time_obj, time_obj.replace(hour=time_obj.hour + 1))
+            start_dt = dt.replace(hour=time_obj.hour, minute=time_obj.minute, second=0, microsecond=0)
+            available = is_time_slot_available(dt, start_dt, start_dt + timedelta(hours=1))
             if available:
                 time_str = time_obj.strftime('%I:%M %p').lstrip('0')
                 return f"Yes, I'm available on {dt.strftime('%A, %B %d, %Y')} at {time_str}. Would you like to book this time?"
@@ -259,20 +542,24 @@ def check_availability_flow(message: str) -> str:
                 time_str = time_obj.strftime('%I:%M %p').lstrip('0')
                 return f"I'm sorry, I'm not available at {time_str} on {dt.strftime('%A, %B %d')}. Would you like to check another time?"
         
-        available_slots = get_available_slots(dt)
+        days = availability_days(message)
+        duration = extract_duration(message) or DEFAULT_MEETING_MINUTES
+        best_slots = find_best_slots(dt.date(), days=days, duration_minutes=duration, k=SUGGESTED_SLOTS)
         
-        if not available_slots:
+        if not best_slots:
             return f"I don't have any available slots on {dt.strftime('%A, %B %d, %Y')}. Would you like to check another day?"
         
-        session_state['slots'] = available_slots
+        session_state['slots'] = best_slots
         session_state['selected_date'] = dt
         session_state['waiting_for_slot'] = True
         
-        response = [f"I'm available on {dt.strftime('%A, %B %d, %Y')} at the following times:"]
-        for i, slot in enumerate(available_slots, 1):
-            start = slot[0].strftime('%I:%M %p').lstrip('0')
-            end = slot[1].strftime('%I:%M %p').lstrip('0')
-            response.append(f"{i}. {start} - {end}")
+        if days == 1:
+            response = [f"Here are the best times I have on {dt.strftime('%A, %B %d, %Y')}:"]
+        else:
+            response = ["Here are the best times I have this week:"]
+        for i, (start, end) in enumerate(best_slots, 1):
+            day = f"{start.strftime('%a, %b %d')} " if days > 1 else ""
+            response.append(f"{i}. {day}{format_time(start)} - {format_time(end)}")
         
         response.append("\nPlease let me know which time slot works best for you by entering the number, or suggest another time that might work better for you.")
         
@@ -284,7 +571,41 @@ def check_availability_flow(message: str) -> str:
         traceback.print_exc()
         return "I'm sorry, I encountered an error while checking availability. Could you please try again?"
 
-def book_meeting_flow(message: str) -> str:
+def next_available_flow(message: str) -> str:
+    """
+    Answer "when's the soonest free hour?" with the earliest fitting slot and
+    offer it for booking. A day or time in the message ("soonest slot on
+    Friday", "next free 30 minutes after 3pm") moves the search start.
+    """
+    try:
+        profile = current_profile()
+        now = profile.now()
+        duration = extract_duration(message) or DEFAULT_MEETING_MINUTES
+        rule = extract_date_time_with_confidence(message)
+        after = None
+        if rule.dt or rule.time:
+            day = _as_date(rule.dt) or now.date()
+            after = max(datetime.combine(day, rule.time or time.min, tzinfo=profile.tz), now)
+        
+        slot = find_next_available(duration, after=after)
+        if not slot:
+            return f"I couldn't find a free {duration}-minute slot in the next {NEXT_AVAILABLE_HORIZONS[-1]} days."
+        
+        start, end = slot
+        session_state['slots'] = [slot]
+        session_state['selected_date'] = start
+        session_state['waiting_for_slot'] = True
+        return (
+            f"The soonest I have for {duration} minutes is:\n"
+            f"1. {start.strftime('%A, %B %d')} {format_time(start)} - {format_time(end)}\n\n"
+            "Reply 1 to book it, or ask for another time."
+        )
+        
+    except Exception as e:
+        print(f"Error in next_available_flow: {e}")
+        return "I'm sorry, I encountered an error while looking for the next free slot. Could you please try again?"
+
+def book_meeting_flow(message: str, attendees: Optional[List[str]] = None) -> str:
     """Handle meeting booking flow with improved time range parsing"""
     try:
         print(f"Processing booking request: {message}")
@@ -330,7 +651,7 @@ def book_meeting_flow(message: str) -> str:
                 date_str = dt.strftime('%A, %B %d')
                 return f"I'm sorry, I'm not available from {start_time} to {end_time} on {date_str}. Would you like to try another time?"
             
-            event_link = book_slot(start_dt, end_dt, "Meeting")
+            event_link = book_slot(start_dt, end_dt, "Meeting", attendees=attendees)
             if event_link:
                 start_time = start_dt.strftime('%I:%M %p').lstrip('0')
                 end_time = end_dt.strftime('%I:%M %p').lstrip('0')
@@ -354,7 +675,7 @@ def book_meeting_flow(message: str) -> str:
             date_str = dt.strftime('%A, %B %d')
             return f"I'm sorry, I'm not available at {time_str} on {date_str}. Would you like to try another time?"
         
-        event_link = book_slot(start_dt, end_dt, "Meeting")
+        event_link = book_slot(start_dt, end_dt, "Meeting", attendees=attendees)
         if not event_link:
             return "Failed to book the slot. Please try again."
             
@@ -364,88 +685,407 @@ def book_meeting_flow(message: str) -> str:
         print(f"Error in book_meeting_flow: {e}")
         return "I'm sorry, I encountered an error while processing your request. Please try again."
 
-def handle_cancel_request(message: str) -> str:
-    """Handle meeting cancellation requests"""
+def book_recurring_flow(message: str) -> str:
+    """Book a repeating meeting such as "every Tuesday at 3pm for 3 months" """
     try:
-        dt, _, _ = extract_datetime_with_gemini(message)
+        dt, time_obj = extract_date_time(message)
+        if not dt or not time_obj:
+            return "When should the recurring meeting start? Please include a day and a time, e.g. \"every Tuesday at 3pm for 3 months\"."
         
-        if not dt:
-            dt, _ = extract_date_time(message)
+        start_dt = dt.replace(hour=time_obj.hour, minute=time_obj.minute, second=0, microsecond=0)
+        end_dt = start_dt + timedelta(minutes=extract_duration(message) or DEFAULT_MEETING_MINUTES)
+        rule = parse_recurrence(message, start_dt)
+        skip_conflicts = any(word in message.lower() for word in ["skip conflicts", "skip busy", "except when busy"])
+        
+        result = book_recurring(start_dt, end_dt, rule, "Meeting", skip_conflicts=skip_conflicts)
+        if not result["link"]:
+            return "I'm sorry, I couldn't book your recurring meeting. Please try again later."
+        
+        response = [
+            f" Recurring meeting booked: {describe_rule(rule)}, "
+            f"{format_time(start_dt)} - {format_time(end_dt)} starting {start_dt.strftime('%A, %B %d, %Y')} "
+            f"({result['occurrences']} occurrences)."
+        ]
+        conflicts = result["conflicts"]
+        if conflicts:
+            action = "skipped" if skip_conflicts else "overlap existing events"
+            response.append(f"\n{len(conflicts)} occurrence(s) {action}:")
+            for start, end in conflicts[:10]:
+                response.append(f"- {start.strftime('%a, %b %d')} {format_time(start)} - {format_time(end)}")
+            if len(conflicts) > 10:
+                response.append(f"- ...and {len(conflicts) - 10} more")
+        response.append(f"\n {result['link']}")
+        return "\n".join(response)
+        
+    except Exception as e:
+        print(f"Error in book_recurring_flow: {e}")
+        return "I'm sorry, I encountered an error while booking your recurring meeting. Please try again."
+
+def resolve_date_time(message: str) -> Tuple[Optional[datetime], Optional[time]]:
+    """
+    Extract date and time, consulting Gemini only when the rule-based parse is not confident.
+
+    Messages with nothing date-like in them skip the LLM as well: there is
+    nothing for it to resolve and the caller's default applies.
+    """
+    result = extract_date_time_with_confidence(message)
+    
+    if result.confidence >= PARSE_CONFIDENCE_THRESHOLD:
+        routing_stats['rule'] += 1
+        return result.dt, result.time
+    
+    # Same test as the router's, so a turn it kept off the model does not reach it here
+    if not has_date_cue(result):
+        routing_stats['rule_no_date'] += 1
+        return None, None
+    
+    routing_stats['llm'] += 1
+    dt, t, _ = extract_datetime_with_gemini(message)
+    if dt is None and t is None:
+        routing_stats['llm_no_result'] += 1
+        return result.dt, result.time
+    return dt, t
+
+def get_routing_stats() -> Dict[str, Any]:
+    """Counts of rule-based vs LLM routing decisions and the share handled without Gemini"""
+    total = routing_stats['rule'] + routing_stats['rule_no_date'] + routing_stats['llm']
+    stats = dict(routing_stats)
+    stats['total'] = total
+    stats['rule_share'] = (total - routing_stats['llm']) / total if total else None
+    stats['threshold'] = PARSE_CONFIDENCE_THRESHOLD
+    turns = turn_routing['structured'] + turn_routing['rule_turn']
+    stats['turns'] = dict(turn_routing, total=turns,
+                          rule_share=turn_routing['rule_turn'] / turns if turns else None)
+    return stats
+
+def select_events(events: List[Event], message: str, time_obj: Optional[time] = None,
+                  title: Optional[str] = None) -> Optional[List[Event]]:
+    """
+    Events a message points at: all of them ("all my meetings"), the ones
+    starting at time_obj ("my 3pm"), or the ones whose title it mentions
+    ("the standup") or that match title. None when the message names no
+    target at all.
+    """
+    if _BULK_PATTERN.search(message):
+        return list(events)
+    tz = current_profile().tz
+    if time_obj is not None:
+        return [
+            e for e in events
+            if not e.all_day and (e.start_dt(tz).hour, e.start_dt(tz).minute) == (time_obj.hour, time_obj.minute)
+        ]
+    lowered = message.lower()
+    title = title.lower().strip() if title else None
+    named = [
+        e for e in events
+        if e.summary.lower() not in GENERIC_TITLES
+        and (e.summary.lower() in lowered or (title and title not in GENERIC_TITLES and title in e.summary.lower()))
+    ]
+    return named or None
+
+def select_from_reply(candidates: List[Event], message: str) -> Optional[List[Event]]:
+    """
+    The events picked in a reply to a numbered list: "2", "1 and 3", "all",
+    an exact title, or "none". Only short, explicit replies count; None for
+    anything else, so a new request is never mistaken for a pick.
+    """
+    text = message.lower().strip().rstrip('.!')
+    if not candidates:
+        return None
+    if text in _NO_REPLIES:
+        return []
+    if text in ("all", "all of them", "all of those") or (text == "both" and len(candidates) == 2):
+        return list(candidates)
+    if re.fullmatch(r'(?:\d+\s*(?:,|and|&)?\s*)+', text):
+        numbers = [int(n) for n in re.findall(r'\d+', text)]
+        picked = [candidates[n - 1] for n in dict.fromkeys(numbers) if 1 <= n <= len(candidates)]
+        return picked or None
+    title = text.removeprefix("the ")
+    named = [e for e in candidates if e.summary.lower().strip() == title]
+    return named or None
+
+def pending_cancel_pick(message: str) -> Optional[List[Event]]:
+    """
+    What a reply picks from the cancellation offered last turn: from the
+    numbered list, or, when asked to confirm several, all of them on an
+    explicit yes. None when the reply is not an answer to the offer.
+    """
+    candidates = session_state.get('cancel_candidates', [])
+    if not session_state.get('cancel_needs_yes', False):
+        return select_from_reply(candidates, message)
+    text = message.lower().strip().rstrip('.!')
+    if text in _YES_REPLIES:
+        return list(candidates)
+    if text in _NO_REPLIES:
+        return []
+    return None
+
+def ask_to_confirm_cancel(events: List[Event], day: date) -> str:
+    """Hold a cancellation of several meetings until the user says yes"""
+    tz = current_profile().tz
+    session_state['cancel_candidates'] = events
+    session_state['cancel_needs_yes'] = True
+    session_state['waiting_for_cancel'] = True
+    listed = "\n".join(f"- {_event_line(e, tz)}" for e in events)
+    return (
+        f"This will cancel {len(events)} meetings on {day.strftime('%A, %B %d, %Y')}:\n{listed}\n\n"
+        "Reply \"yes\" to cancel them all, or \"no\" to keep them."
+    )
+
+def _event_line(event: Event, tz) -> str:
+    return f"{event.summary} at {'all day' if event.all_day else format_time(event.start_dt(tz))}"
+
+def cancel_and_report(events: List[Event], day: date) -> str:
+    """Cancel events with one batched request and describe what happened"""
+    result = cancel_events([event.id for event in events])
+    tz = current_profile().tz
+    cancelled = set(result['cancelled'])
+    day_text = day.strftime('%A, %B %d, %Y')
+    
+    if len(events) == 1 and cancelled:
+        return f" Successfully cancelled your meeting: {events[0].summary} on {day_text}"
+    
+    response = []
+    if cancelled:
+        response.append(f" Cancelled {len(cancelled)} meeting{'s' if len(cancelled) > 1 else ''} on {day_text}:")
+        response.extend(f"- {_event_line(e, tz)}" for e in events if e.id in cancelled)
+    if result['failed']:
+        failed_ids = {failure['id'] for failure in result['failed']}
+        response.append(f"\nI couldn't cancel {len(failed_ids)} meeting{'s' if len(failed_ids) > 1 else ''}:")
+        response.extend(f"- {_event_line(e, tz)}" for e in events if e.id in failed_ids)
+        response.append("Please try again in a moment.")
+    return "\n".join(response)
+
+def handle_cancel_request(message: str, title: Optional[str] = None) -> str:
+    """
+    Handle meeting cancellation requests.
+
+    "cancel all my meetings Friday" clears the day with one batched request
+    once the user says yes; "cancel my 3pm" or "cancel the standup" picks
+    events by time or title.
+    When the target is unclear the day's events are listed and the next
+    message can pick from them by number or name. title, when the model
+    extracted one, picks events like a title mentioned in the message.
+    """
+    speculative = None
+    try:
+        rule = extract_date_time_with_confidence(message)
+        if rule.confidence < PARSE_CONFIDENCE_THRESHOLD:
+            # Gemini may be consulted for the date; list the rule-parsed day in the meantime
+            guess = _as_date(rule.dt) or current_profile().now().date()
+            speculative = start_speculative_read(planned_read("cancel meeting", guess, False))
+        
+        dt, time_obj = resolve_date_time(message)
         
         if not dt:
-            dt = datetime.now(pytz.timezone('Asia/Kolkata')).date()
+            dt = current_profile().now().date()
         
-        service = get_calendar_service()
-        events = get_events_for_date(service, dt)
+        if isinstance(dt, datetime):
+            dt = dt.date()
+        
+        events = get_events_for_date(dt)
         
         if not events:
             return f"No meetings found for {dt.strftime('%A, %B %d, %Y')} to cancel."
         
-        if len(events) == 1:
-            event = events[0]
-            event_id = event['id']
-            service.events().delete(calendarId='primary', eventId=event_id).execute()
-            return f" Successfully cancelled your meeting: {event.get('summary', 'Untitled event')} on {dt.strftime('%A, %B %d, %Y')}"
-        
-        events_list = "\n".join([
-            f"{i+1}. {e.get('summary', 'Untitled event')} at "
-            f"{datetime.fromisoformat(e['start'].get('dateTime', e['start'].get('date'))).strftime('%I:%M %p').lstrip('0')}"
-            for i, e in enumerate(events)
-        ])
-        
+        targets = select_events(events, message, time_obj, title)
+        if targets is None and len(events) == 1:
+            targets = events
+        if targets and len(targets) > 1:
+            return ask_to_confirm_cancel(targets, dt)
+        if targets:
+            return cancel_and_report(targets, dt)
+        
+        tz = current_profile().tz
+        events_list = "\n".join(f"{i+1}. {_event_line(e, tz)}" for i, e in enumerate(events))
+        session_state['cancel_candidates'] = events
+        session_state['cancel_needs_yes'] = False
+        session_state['waiting_for_cancel'] = True
+        
+        if targets is not None:
+            return (
+                f"I couldn't find that meeting on {dt.strftime('%A, %B %d, %Y')}. Here's what you have:\n"
+                f"{events_list}\n\n"
+                "Which one should I cancel? Reply with a number, several numbers, or \"all\"."
+            )
         return (
             f"I found multiple meetings on {dt.strftime('%A, %B %d, %Y')}:\n"
             f"{events_list}\n\n"
-            "Please specify which meeting you'd like to cancel by number or name."
+            "Please specify which meeting you'd like to cancel by number or name, or say \"all\"."
         )
         
     except Exception as e:
         print(f"Error in handle_cancel_request: {e}")
         return "I encountered an error while trying to cancel your meeting. Please try again."
+    finally:
+        # A no-op once the read was joined; otherwise stops listing a day Gemini did not pick
+        if speculative:
+            speculative.cancel()
 
-def get_events_for_date(service, date_obj):
-    """Get all events for a specific date"""
+def confirm_cancel(message: str) -> str:
+    """
+    Cancel the events picked from the list shown in the previous turn.
+    Picking several asks for a yes first; the yes then cancels them.
+    """
+    confirmed = session_state.get('cancel_needs_yes', False)
+    picked = pending_cancel_pick(message) or []
+    session_state['waiting_for_cancel'] = False
+    session_state['cancel_needs_yes'] = False
+    session_state['cancel_candidates'] = []
+    if not picked:
+        return "Okay, I won't cancel anything."
+    day = picked[0].start_dt(current_profile().tz).date()
+    if len(picked) > 1 and not confirmed:
+        return ask_to_confirm_cancel(picked, day)
+    return cancel_and_report(picked, day)
+
+def reschedule_flow(message: str) -> str:
+    """
+    Move meetings to a new time or day.
+
+    The message is split at its last " to ": the left half picks the events
+    ("my 3pm", "the standup on Friday", "all my meetings Friday"), the right
+    half gives the new time and/or day ("5pm", "Monday", "tomorrow at 10am").
+    Durations are kept; everything moves in one batched request.
+    """
     try:
-        tz = pytz.timezone('Asia/Kolkata')
-        start_dt = datetime.combine(date_obj, time.min).astimezone(tz)
-        end_dt = datetime.combine(date_obj, time.max).astimezone(tz)
-        
-        start_str = start_dt.isoformat()
-        end_str = end_dt.isoformat()
-        
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=start_str,
-            timeMax=end_str,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+        source, separator, target = message.rpartition(" to ")
+        if not separator:
+            return "Which meeting should I move, and to when? For example: \"move my 3pm to 5pm\"."
+        
+        profile = current_profile()
+        tz = profile.tz
+        src = extract_date_time_with_confidence(source)
+        dst = extract_date_time_with_confidence(target)
+        if dst.dt is None and dst.time is None:
+            return "When should I move it to? For example: \"move my 3pm to 5pm\" or \"move all my meetings Friday to Monday\"."
+        
+        day = _as_date(src.dt) or profile.now().date()
+        new_day = _as_date(dst.dt) or day
+        events = get_events_for_date(day)
+        targets = select_events(events, source, src.time)
+        if targets is None and len(events) == 1:
+            targets = events
+        if not targets:
+            if not events:
+                return f"You don't have any meetings on {day.strftime('%A, %B %d, %Y')} to move."
+            listed = "\n".join(f"- {_event_line(e, tz)}" for e in events)
+            return f"Which meeting should I move? On {day.strftime('%A, %B %d')} you have:\n{listed}"
+        if dst.time is not None and len(targets) > 1:
+            listed = "\n".join(f"- {_event_line(e, tz)}" for e in targets)
+            return f"That matches {len(targets)} meetings. Which one should move to {format_time(datetime.combine(new_day, dst.time))}?\n{listed}"
+        
+        changes = []
+        for event in targets:
+            if dst.time is not None:
+                new_start = datetime.combine(new_day, dst.time, tzinfo=tz)
+            else:
+                # Only a new day: keep each meeting's time of day
+                new_start = datetime.combine(new_day, event.start_dt(tz).time(), tzinfo=tz)
+            changes.append((event, new_start, new_start + timedelta(seconds=event.end - event.start)))
+        
+        moving = {event.id for event in targets}
+        range_start = min(int(start.timestamp()) for _, start, _ in changes)
+        range_end = max(int(end.timestamp()) for _, _, end in changes)
+        existing = get_events_in_range(datetime.fromtimestamp(range_start, tz).date(),
+                                       datetime.fromtimestamp(range_end, tz).date())
+        clashes = [
+            e for e in existing
+            if e.id not in moving and not e.all_day
+            and any(e.overlaps(int(start.timestamp()), int(end.timestamp())) for _, start, end in changes)
+        ]
+        if clashes:
+            listed = "\n".join(f"- {_event_line(e, tz)}" for e in clashes)
+            return f"I can't move that without a clash. The new time overlaps:\n{listed}\nWould you like to pick another time?"
+        
+        result = reschedule_events([(event.id, start, end) for event, start, end in changes])
+        moved = set(result['rescheduled'])
+        response = []
+        for event, start, end in changes:
+            if event.id in moved:
+                response.append(f" Moved {event.summary} to {start.strftime('%A, %B %d')} {format_time(start)} - {format_time(end)}")
+        if result['failed']:
+            response.append(f"\nI couldn't move {len(result['failed'])} meeting(s). Please try again in a moment.")
+        return "\n".join(response)
         
-        return events_result.get('items', [])
+    except Exception as e:
+        print(f"Error in reschedule_flow: {e}")
+        return "I encountered an error while trying to move your meeting. Please try again."
+
+def get_events_for_date(date_obj):
+    """Get all events for a specific date"""
+    try:
+        return get_events_in_range(date_obj, date_obj)
         
     except Exception as e:
         print(f"Error in get_events_for_date: {e}")
         return []
 
+def format_agenda_response(agenda: Dict[date, List[Event]], compact: bool = False) -> str:
+    """Format a multi-day agenda; compact mode only lists per-day counts and busy spans"""
+    days = list(agenda)
+    if not days:
+        return "You don't have any events scheduled for this time."
+    
+    header = f"Here's your agenda from {days[0].strftime('%A, %B %d')} to {days[-1].strftime('%A, %B %d, %Y')}:"
+    response = [header]
+    
+    if compact:
+        for entry in summarize_agenda(agenda):
+            day = date.fromisoformat(entry['date'])
+            if not entry['count']:
+                continue
+            first = format_time(datetime.fromisoformat(entry['first_start']))
+            last = format_time(datetime.fromisoformat(entry['last_end']))
+            plural = "s" if entry['count'] > 1 else ""
+            response.append(f"- {day.strftime('%a, %b %d')}: {entry['count']} event{plural} ({first} - {last})")
+        if len(response) == 1:
+            return "You don't have any events scheduled for this time."
+        return "\n".join(response)
+    
+    tz = current_profile().tz
+    for day, events in agenda.items():
+        if not events:
+            response.append(f"**{day.strftime('%a, %b %d')}**: free")
+            continue
+        response.append(f"**{day.strftime('%a, %b %d')}**")
+        for event in events:
+            if event.all_day:
+                response.append(f"- All day: {event.summary}")
+            else:
+                response.append(f"- {format_time(event.start_dt(tz))} {event.summary}")
+    
+    return "\n".join(response)
+
 def check_calendar(message: str) -> str:
-    """Check calendar events for a specific date"""
+    """Check calendar events for a specific date, week or month"""
     try:
+        view = calendar_view(message)
+        
         dt, _ = extract_date_time(message)
         if not dt:
-            return "I couldn't understand the date you provided. Please try again."
+            if view == "day":
+                return "I couldn't understand the date you provided. Please try again."
+            dt = current_profile().now()
+        
+        if isinstance(dt, datetime):
+            dt = dt.date()
+        
+        if view != "day":
+            start_date, end_date = get_view_range(dt, view)
+            agenda = get_agenda(start_date, end_date)
+            return format_agenda_response(agenda, compact=(view == "month"))
             
-        events = check_calendar_events(dt.date())
+        events = check_calendar_events(dt)
         
         if not events:
             return "No events found on this date."
             
-        event_texts = []
-        for event in events:
-            start = datetime.datetime.fromisoformat(event['start']['dateTime'])
-            end = datetime.datetime.fromisoformat(event['end']['dateTime'])
-            event_texts.append(f"{start.strftime('%I:%M %p')} - {end.strftime('%I:%M %p')}: {event['summary']}")
+        tz = current_profile().tz
+        event_texts = [f"{event.time_range_text(tz)}: {event.summary}" for event in events]
         
-        return f"Events for {dt.strftime('%A, %B %d, %Y')}:\n{'\n'.join(event_texts)}"
+        events_text = "\n".join(event_texts)
+        return f"Events for {dt.strftime('%A, %B %d, %Y')}:\n{events_text}"
         
     except Exception as e:
         return f"Error checking calendar: {str(e)}"
@@ -476,7 +1116,8 @@ def extract_datetime_with_gemini(message: str) -> Tuple[Optional[datetime], Opti
     Returns a tuple of (datetime, time, extracted_text)
     """
     try:
-        current_time = datetime.now(pytz.timezone('Asia/Kolkata'))
+        profile = current_profile()
+        current_time = profile.now()
         prompt = f"""
         Extract the exact date and time from the user's message. 
         
@@ -485,7 +1126,7 @@ def extract_datetime_with_gemini(message: str) -> Tuple[Optional[datetime], Opti
         2. If only date is mentioned, return just the date
         3. Use 24-hour format for times
         4. If date is not specified, use today or the next occurrence
-        5. Current date and time: {current_time.strftime('%Y-%m-%d %H:%M')} IST
+        5. Current date and time: {current_time.strftime('%Y-%m-%d %H:%M')} ({profile.timezone})
         
         User's message: "{message}"
         
@@ -510,7 +1151,7 @@ def extract_datetime_with_gemini(message: str) -> Tuple[Optional[datetime], Opti
         
         print(f"Sending to Gemini: {prompt}")
         
-        response = llm.invoke(prompt)
+        response = invoke_llm(llm, prompt)
         extracted_text = response.content.strip()
         print(f"Gemini raw response: {extracted_text}")
         
@@ -544,74 +1185,83 @@ def extract_datetime_with_gemini(message: str) -> Tuple[Optional[datetime], Opti
         dt, t = extract_date_time(message)
         return dt, t, message
 
-def handle_booking_request(message: str) -> str:
-    """Handle booking requests with Gemini-powered date/time extraction"""
-    try:
-        dt, t, extracted_text = extract_datetime_with_gemini(message)
-        
-        print(f"Extracted - Date: {dt}, Time: {t}, Text: {extracted_text}")
-        
-        if dt is None and t is None:
-            return "I couldn't find a specific date or time in your request. Could you please provide more details?"
-            
-        if t is not None:
-            if dt is None:  
-                dt = datetime.now(pytz.timezone('Asia/Kolkata')).date()
-            
-            booking_dt = datetime.combine(dt, t)
-            
-            formatted_time = t.strftime("%I:%M %p").lstrip('0')
-            formatted_date = dt.strftime("%A, %B %d, %Y")
-            
-            if is_time_slot_available(booking_dt, 30):  
-                return f"I can book a meeting for you on {formatted_date} at {formatted_time}. Would you like to confirm?"
-            else:
-                return f"I'm sorry, the slot on {formatted_date} at {formatted_time} is not available. Would you like to see available slots?"
-        
-        elif dt is not None:
-            available_slots = get_available_slots(dt)
-            
-            if available_slots:
-                slots_text = "\n".join([
-                    f"{i+1}. {s['start'].strftime('%I:%M %p').lstrip('0')} - {s['end'].strftime('%I:%M %p').lstrip('0')}" 
-                    for i, s in enumerate(available_slots)
-                ])
-                return f"Here are the available time slots on {dt.strftime('%A, %B %d, %Y')}:\n{slots_text}\n\nPlease select a slot by number."
-            else:
-                return f"I'm sorry, there are no available slots on {dt.strftime('%A, %B %d, %Y')}."
-        
-    except Exception as e:
-        print(f"Error in handle_booking_request: {e}")
-        return "I encountered an error while processing your request. Please try again."
+@profiled
+@session_turn()
+@turn_scope()
+def process_user_message(message: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Process user message and return response with improved conversation handling.
+
+    The whole turn runs in one turn_scope, so the flows share date parses,
+    the Calendar service handle and identical queries instead of repeating them.
+    Turns of one session never overlap (session_turn).
 
-def process_user_message(message: str) -> str:
-    """Process user message and return response with improved conversation handling"""
+    With on_token, small talk is answered by the streaming chat chain and each
+    text chunk is passed to on_token as it arrives; other turns only return
+    the finished reply.
+    """
+    speculative = None
     try:
-        if 'context' not in session_state:
-            session_state['context'] = []
-            
-        session_state['context'].append(HumanMessage(content=message))
-        
         intent = get_intent(message)
         session_state['intent'] = intent
-        
-        if intent == "confirm slot" and session_state.get('waiting_for_slot', False):
+        if intent != "confirm cancel":
+            # The user moved on from the list of meetings to cancel
+            session_state['waiting_for_cancel'] = False
+            session_state['cancel_needs_yes'] = False
+        
+        streaming = on_token is not None and is_small_talk(intent, message)
+        model_turn = not streaming and needs_model(intent, message)
+        if model_turn and intent in CALENDAR_INTENTS:
+            # Already parsed (and memoized) by needs_model
+            rule = extract_date_time_with_confidence(message)
+            plan = planned_read(intent, _as_date(rule.dt), rule.time is not None, availability_days(message),
+                                calendar_view(message))
+            speculative = start_speculative_read(plan)
+        # One structured Gemini call replaces separate extraction and reply calls when the rules are not enough
+        extraction = extract_turn_with_gemini(message) if model_turn else None
+        extracted_day = date.fromisoformat(extraction.date) if extraction and extraction.date else None
+        week = extraction is not None and (availability_days(message) > 1 or extraction.view == "week")
+        if speculative and extraction and \
+                planned_read(extraction.intent, extracted_day, extraction.start_time is not None,
+                             7 if week else 1, extraction.view) != plan:
+            # Gemini read the request differently; the speculative result would go unused
+            speculative.cancel()
+        # Do not start calendar work the request no longer has time for
+        check_deadline()
+        
+        if streaming:
+            response = handle_default_response(message, on_token=on_token)
+        elif extraction and extraction.intent == "general conversation":
+            turn_routing['structured'] += 1
+            response = extraction.reply
+        elif extraction and not extraction.date:
+            # Calendar request without a usable date: the model's reply asks for it
+            turn_routing['structured'] += 1
+            session_state['intent'] = extraction.intent
+            response = extraction.reply
+        elif extraction:
+            turn_routing['structured'] += 1
+            session_state['intent'] = extraction.intent
+            flow_message = extraction.to_message(bulk=bool(_BULK_PATTERN.search(message)), week=week)
+            response = handle_calendar_action(extraction.intent, flow_message, attendees=extraction.attendees,
+                                              title=extraction.title)
+        elif intent == "confirm slot" and session_state.get('waiting_for_slot', False):
             response = confirm_slot(message)
             session_state['waiting_for_slot'] = False
-        elif intent.lower() in ["check availability", "book meeting", "cancel meeting", "check calendar"]:
+        elif intent == "confirm cancel":
+            response = confirm_cancel(message)
+        elif intent.lower() in CALENDAR_INTENTS:
+            turn_routing['rule_turn'] += 1
             response = handle_calendar_action(intent, message)
-        elif intent.lower() == "book meeting":
-            response = handle_booking_request(message)
         else:
             response = handle_default_response(message)
         
         if not isinstance(response, str):
             response = str(response)
             
-        session_state['context'].append(AIMessage(content=response))
-        
-        if len(session_state['context']) > 10:  
-            session_state['context'] = session_state['context'][-10:]
+        # Recorded after the turn so the prompt for this turn does not contain the message twice
+        session_state['context'].add_user(message)
+        session_state['context'].add_ai(response)
             
         return response
         
@@ -619,6 +1269,9 @@ def process_user_message(message: str) -> str:
         error_msg = f"I'm sorry, I encountered an error: {str(e)}"
         print(f"Error in process_user_message: {error_msg}")
         return "I apologize, but I'm having trouble processing your request. Could you please try again?"
+    finally:
+        if speculative:
+            speculative.cancel()
 
 def main():
     print(process_user_message("Book a meeting tomorrow afternoon"))
@@ -1,15 +1,25 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import Optional, List, Tuple, Dict, Any
+from typing import Optional, List, Tuple, Dict, Any, NamedTuple, Iterable, Iterator
 from datetime import datetime, date, timedelta, time
 import os
-import pytz
 import json
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+import threading
 from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-from dateutil.parser import parse as parse_datetime
+from googleapiclient.errors import HttpError
+from googleapiclient.http import set_user_agent
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
+from backend.event_store import event_store
+from backend.ics import calendar_header, calendar_footer, event_to_ics
+from backend.events import Event, BusyInterval, parse_events, parse_busy, free_intervals, sweep_conflicts
+from backend.profiles import current_profile
+from backend.ranking import SlotPreferences, rank_slots
+from backend.recurrence import iter_occurrences, cap_occurrences
+from backend.deadline import call_with_deadline, DeadlineExceeded, UPSTREAM_TIMEOUT_SECONDS
+from backend.credentials import get_credentials, for_transport, finish_web_flow, CalendarAuthError
+from backend.turn_cache import turn_memoized, invalidate_turn_cache
+from backend.push import hub, notify_session
 import dateparser
 from dateparser.search import search_dates
 from dotenv import load_dotenv
@@ -18,119 +28,185 @@ import re
 
 load_dotenv()
 
-SCOPES = [
-    "https://www.googleapis.com/auth/calendar.events",
-    "https://www.googleapis.com/auth/calendar.freebusy",
-   "https://www.googleapis.com/auth/calendar"
-]
-TOKEN_FILE = "token.json"
-CREDENTIALS_FILE = "credentials.json"
-OAUTH_PORT = 8080  
-
-def get_calendar_service(force_oauth: bool = False, force_freebusy: bool = False):
-    """Get authenticated Google Calendar service"""
-    try:
-        creds = None
-        
-     
-        if force_oauth or force_freebusy:
-            print("Forcing OAuth flow...")
-            if os.path.exists(TOKEN_FILE):
-                os.remove(TOKEN_FILE)
-            force_oauth = True
-            
-         
-            if force_freebusy:
-                print("Removing token to get fresh permissions...")
-                if os.path.exists(TOKEN_FILE):
-                    os.remove(TOKEN_FILE)
-        
-      
-        if os.path.exists(TOKEN_FILE):
-            print("Loading token from file...")
-            try:
-                creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-                if not creds.valid:
-                    if creds.expired and creds.refresh_token:
-                        print("Refreshing expired token...")
-                        creds.refresh(Request())
-                        with open(TOKEN_FILE, "w") as token:
-                            token.write(creds.to_json())
-                    else:
-                        print("Token invalid and no refresh token available")
-                        creds = None
-                        force_oauth = True
-                else:
-                    print("Token is valid")
-            except Exception as e:
-                print(f"Error loading token: {e}")
-                creds = None
-                force_oauth = True
-        
-       
-        if not creds or force_oauth:
-            print("Starting OAuth flow...")
-            if not os.path.exists(CREDENTIALS_FILE):
-                raise ValueError("credentials.json not found. Please download it from Google Cloud Console.")
-            
-    
-            with open(CREDENTIALS_FILE) as f:
-                creds_data = json.load(f)
-            
-            
-            creds_data['installed']['redirect_uris'] = [f'http://localhost:{OAUTH_PORT}/callback']
-            
-         
-            temp_creds_file = 'temp_credentials.json'
-            with open(temp_creds_file, 'w') as f:
-                json.dump(creds_data, f)
-            
-            try:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    temp_creds_file,
-                    SCOPES,
-                    redirect_uri=f'http://localhost:{OAUTH_PORT}/callback'
-                )
-                
-                
-                for port in range(OAUTH_PORT, OAUTH_PORT + 5):
-                    try:
-                        print(f"Trying OAuth on port {port}...")
-                        creds = flow.run_local_server(
-                            port=port,
-                            authorization_prompt_message="Please visit this URL: {url}",
-                            success_message="The auth flow is complete; you may close this window.",
-                            open_browser=True
-                        )
-                        break
-                    except Exception as e:
-                        print(f"Failed to start OAuth on port {port}: {e}")
-                        continue
-                
-                if not creds:
-                    raise ValueError("Failed to complete OAuth flow on all ports")
-                    
-                with open(TOKEN_FILE, "w") as token:
-                    token.write(creds.to_json())
-                
-            finally:
-              
-                if os.path.exists(temp_creds_file):
-                    os.remove(temp_creds_file)
-            
-        service = build("calendar", "v3", credentials=creds)
+MAX_RESULTS_PER_PAGE = 2500
+# Partial-response mask: only the event fields the bot actually reads
+EVENT_FIELDS = "items(id,summary,status,start,end),nextPageToken"
+# Google only gzips responses when the user agent advertises it
+USER_AGENT = "ScheduleAI (gzip)"
+# Google accepts up to 1000 calls per batch but recommends staying around 50
+BATCH_SIZE = 50
+IMPORT_BATCH_SIZE = BATCH_SIZE
+MAX_REPORTED_FAILURES = 50
+EXPORT_FIELDS = "items(id,iCalUID,status,summary,description,location,start,end,recurrence),nextPageToken"
+EXPORT_CHUNK_BYTES = 64 * 1024
+# Next-available search: freebusy windows end this many days out, each query covering only the new days
+NEXT_AVAILABLE_HORIZONS = (1, 3, 7, 14, 28, 56)
+# Longest span find_best_slots ranks in one freebusy read
+MAX_SEARCH_DAYS = 28
+# Suggested start times are rounded up to this many minutes
+SLOT_ROUND_MINUTES = 15
+
+# httplib2 connections are not thread safe, so each thread keeps its own client
+_local = threading.local()
+
+def _service_for(creds):
+    """Calendar client for these credentials, built once per thread"""
+    if getattr(_local, "service", None) is None or _local.creds is not creds:
+        http = set_user_agent(AuthorizedHttp(for_transport(creds), http=httplib2.Http(timeout=UPSTREAM_TIMEOUT_SECONDS)),
+                              USER_AGENT)
+        _local.service = build("calendar", "v3", http=http, cache_discovery=False)
+        _local.creds = creds
         print("Successfully created Calendar service")
-        return service
-        
-    except Exception as e:
-        print(f"Error in get_calendar_service: {e}")
+    return _local.service
+
+def _forget_service():
+    _local.service = None
+    _local.creds = None
+    # Otherwise the rest of the turn keeps getting the abandoned client from the memo
+    invalidate_turn_cache("service")
+
+# Memoized per turn and per thread, since the client must not cross threads
+@turn_memoized(key=lambda: threading.get_ident(), group="service")
+def get_calendar_service():
+    """
+    Get authenticated Google Calendar service.
+
+    Credentials come from a non-interactive provider; when none is usable this
+    fails immediately with CalendarAuthError rather than opening a browser.
+    """
+    return _service_for(get_credentials())
+
+def execute(request):
+    """Execute an API request within the current request's deadline"""
+    try:
+        return call_with_deadline(request.execute)
+    except DeadlineExceeded:
+        # The abandoned call may still be using this thread's connection
+        _forget_service()
         raise
 
+def iter_events(
+    service,
+    time_min: str,
+    time_max: str,
+    fields: str = EVENT_FIELDS,
+    page_size: int = MAX_RESULTS_PER_PAGE,
+    calendar_id: str = 'primary',
+    expand_recurring: bool = True,
+):
+    """
+    Lazily yield events in a time range, following nextPageToken page by page.
+
+    Args:
+        service: Calendar service from get_calendar_service
+        time_min: RFC3339 lower bound (exclusive on event end)
+        time_max: RFC3339 upper bound (exclusive on event start)
+        fields: Partial-response field mask; must keep nextPageToken
+        page_size: maxResults per page
+        calendar_id: Calendar to read from
+        expand_recurring: Return each occurrence (ordered by start time) rather
+            than one master event per series (unordered)
+
+    Yields:
+        dict: Event resources
+    """
+    ordering = {'singleEvents': True, 'orderBy': 'startTime'} if expand_recurring else {'singleEvents': False}
+    page_token = None
+    while True:
+        events_result = execute(service.events().list(
+            calendarId=calendar_id,
+            timeMin=time_min,
+            timeMax=time_max,
+            maxResults=page_size,
+            pageToken=page_token,
+            fields=fields,
+            **ordering
+        ))
+        yield from events_result.get('items', [])
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            return
+
+@turn_memoized(key=lambda service, start, end, tz, calendar_id='primary': (start, end, str(tz), calendar_id), group="calendar")
+def _events_between(service, start: int, end: int, tz, calendar_id: str = 'primary') -> List[Event]:
+    """Events overlapping an epoch window, from the local event store when enabled, else the API"""
+    if event_store:
+        event_store.sync_if_stale(service, calendar_id)
+        if event_store.covers(calendar_id, start, end):
+            return event_store.events_between(calendar_id, start, end, tz)
+    time_min = datetime.fromtimestamp(start, tz).isoformat()
+    time_max = datetime.fromtimestamp(end, tz).isoformat()
+    return parse_events(iter_events(service, time_min, time_max, calendar_id=calendar_id), tz)
+
+def mark_calendar_changed(calendar_id: str = 'primary'):
+    """
+    Our own write makes the local event store and this turn's cached queries
+    stale, and any slots shown on open sockets may no longer be free
+    """
+    invalidate_turn_cache("calendar")
+    if event_store:
+        event_store.mark_stale(calendar_id)
+    hub.broadcast({"type": "calendar_changed", "calendar_id": calendar_id})
+
+class ParseResult(NamedTuple):
+    """Rule-based date/time parse with how much the parser trusts it"""
+    dt: Optional[datetime]
+    time: Optional[time]
+    confidence: float
+    ambiguous: bool
+
+# Base confidence per parser branch
+CONFIDENCE_RELATIVE = 0.95
+CONFIDENCE_WEEKDAY = 0.9
+CONFIDENCE_EXPLICIT_DATE = 0.9
+CONFIDENCE_DATEPARSER = 0.6
+CONFIDENCE_TIME_ONLY = 0.4
+AMBIGUITY_PENALTY = 0.3
+
+VAGUE_TIME_WORDS = ('morning', 'afternoon', 'evening', 'tonight', 'noon', 'lunch', 'later', 'soon', 'sometime', 'around')
+_EXPLICIT_DATE_PATTERN = re.compile(
+    r'\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b|\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b|\b\d{4}-\d{2}-\d{2}\b',
+    re.IGNORECASE
+)
+_EXPLICIT_TIME_PATTERN = re.compile(r'\d\s*[ap]\.?m\b|\d:\d{2}', re.IGNORECASE)
+
+def _is_ambiguous(message: str, time_obj: Optional[time]) -> bool:
+    """Vague time words, a bare hour without am/pm, or a relative weekday like "next friday" """
+    message_lower = message.lower()
+    if any(word in message_lower for word in VAGUE_TIME_WORDS):
+        return True
+    if time_obj is not None and not _EXPLICIT_TIME_PATTERN.search(message):
+        return True
+    return bool(re.search(r'\b(next|this|coming)\s+(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b', message_lower))
+
+def _with_confidence(message: str, dt: Optional[datetime], time_obj: Optional[time], base: float) -> ParseResult:
+    ambiguous = _is_ambiguous(message, time_obj)
+    confidence = round(max(base - AMBIGUITY_PENALTY, 0.0), 2) if ambiguous else base
+    return ParseResult(dt, time_obj, confidence, ambiguous)
+
 def extract_date_time(message: str) -> Tuple[Optional[datetime], Optional[time]]:
+    """Rule-based date/time extraction; see extract_date_time_with_confidence"""
+    result = extract_date_time_with_confidence(message)
+    return result.dt, result.time
+
+@turn_memoized(group="parse")
+def extract_date_time_with_confidence(message: str) -> ParseResult:
+    """
+    Extract a date and time with the deterministic parser and score the result.
+
+    Confidence depends on which rule matched (relative phrase, weekday,
+    explicit date, dateparser search, time only) and drops when the message is
+    ambiguous, so callers can decide whether an LLM needs to be consulted.
+    Within a turn the same message is parsed only once.
+    """
+    return _parse_date_time(message)
+
+def _parse_date_time(message: str) -> ParseResult:
     try:
         print(f"Extracting date/time from: {message}")
-        tz = pytz.timezone('Asia/Kolkata')
-        now = datetime.now(tz)
+        profile = current_profile()
+        tz = profile.tz
+        now = profile.now()
         
        
         relative_phrases = {
@@ -149,7 +225,7 @@ def extract_date_time(message: str) -> Tuple[Optional[datetime], Optional[time]]
       
                 time_part = message.lower().replace(phrase, '').strip()
                 time_obj = parse_time(time_part)
-                return dt, time_obj
+                return _with_confidence(message, dt, time_obj, CONFIDENCE_RELATIVE)
         
        
         days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
@@ -166,15 +242,17 @@ def extract_date_time(message: str) -> Tuple[Optional[datetime], Optional[time]]
               
                 time_part = message.lower().replace(day, '').strip()
                 time_obj = parse_time(time_part)
-                return dt, time_obj
+                return _with_confidence(message, dt, time_obj, CONFIDENCE_WEEKDAY)
         
         
         try:
             parsed_date = search_dates(
                 message,
+                # Without a fixed language, words like "are" and "do" parse as dates
+                languages=['en'],
                 settings={
                     "PREFER_DATES_FROM": "future",
-                    "TIMEZONE": "Asia/Kolkata",
+                    "TIMEZONE": profile.timezone,
                     "DATE_ORDER": "DMY",
                     "PREFER_DAY_OF_MONTH": "first"
                 }
@@ -185,12 +263,18 @@ def extract_date_time(message: str) -> Tuple[Optional[datetime], Optional[time]]
                 if isinstance(parsed_dt, datetime):
                  
                     if not parsed_dt.tzinfo:
-                        parsed_dt = tz.localize(parsed_dt)
+                        parsed_dt = parsed_dt.replace(tzinfo=tz)
              
                     time_obj = parse_time(message)
                     if time_obj:
                         parsed_dt = parsed_dt.replace(hour=time_obj.hour, minute=time_obj.minute, second=0, microsecond=0)
-                    return parsed_dt, time_obj
+                    # A named month or numeric date is as trustworthy as the explicit patterns below
+                    base = CONFIDENCE_EXPLICIT_DATE if _EXPLICIT_DATE_PATTERN.search(date_str) else CONFIDENCE_DATEPARSER
+                    result = _with_confidence(message, parsed_dt, time_obj, base)
+                    if len(parsed_date) > 1:
+                        # Several candidate dates in one message: let the caller double check
+                        result = result._replace(ambiguous=True, confidence=round(max(result.confidence - AMBIGUITY_PENALTY, 0.0), 2))
+                    return result
         except Exception as e:
             print(f"Dateparser error: {e}")
         
@@ -208,7 +292,7 @@ def extract_date_time(message: str) -> Tuple[Optional[datetime], Optional[time]]
             (r'\b(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:tember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)[\s-]*(0?[1-9]|[12][0-9]|3[01])(?:st|nd|rd|th)?(?:[\s-]*(\d{2,4}))?\b',
              '%B %d %Y', 'month day year'),
             
-            (r'\b(0?[1-9]|[12][0-9]|3[01])[\s-/](0?[1-9]|1[0-2])[\s-/](\d{2,4})\b',
+            (r'\b(0?[1-9]|[12][0-9]|3[01])[\s/-](0?[1-9]|1[0-2])[\s/-](\d{2,4})\b',
              '%d-%m-%Y', 'day-month-year')
         ]
         
@@ -238,9 +322,9 @@ def extract_date_time(message: str) -> Tuple[Optional[datetime], Optional[time]]
                             date_obj = datetime.strptime(date_str, date_format)
                             if date_obj:
                               
+                                date_obj = date_obj.replace(tzinfo=tz)
                                 if date_obj < now and 'year' not in date_str:
                                     date_obj = date_obj.replace(year=now.year + 1)
-                                date_obj = tz.localize(date_obj)
                                 print(f"Extracted date ({desc}): {date_obj}")
                                 break
                         except Exception as e:
@@ -259,25 +343,25 @@ def extract_date_time(message: str) -> Tuple[Optional[datetime], Optional[time]]
         if date_obj and time_obj:
             combined = date_obj.replace(hour=time_obj.hour, minute=time_obj.minute, second=0, microsecond=0)
             if not combined.tzinfo:
-                combined = tz.localize(combined)
-            return combined, time_obj
+                combined = combined.replace(tzinfo=tz)
+            return _with_confidence(message, combined, time_obj, CONFIDENCE_EXPLICIT_DATE)
         
      
         if date_obj:
             if not date_obj.tzinfo:
-                date_obj = tz.localize(date_obj)
-            return date_obj, None
+                date_obj = date_obj.replace(tzinfo=tz)
+            return _with_confidence(message, date_obj, None, CONFIDENCE_EXPLICIT_DATE)
             
         if time_obj:
-            return None, time_obj
+            return _with_confidence(message, None, time_obj, CONFIDENCE_TIME_ONLY)
             
-        return None, None
+        return ParseResult(None, None, 0.0, False)
         
     except Exception as e:
         print(f"Error extracting date/time: {e}")
         import traceback
         traceback.print_exc()
-        return None, None
+        return ParseResult(None, None, 0.0, False)
 
 def parse_time(message: str) -> Optional[time]:
     """Helper function to parse time from a string"""
@@ -301,11 +385,17 @@ def parse_time(message: str) -> Optional[time]:
                 continue
     return None
 
+@turn_memoized(key=lambda service, body: json.dumps(body, sort_keys=True), group="calendar")
+def _query_busy(service, body: Dict[str, Any]) -> List[BusyInterval]:
+    """Run a freebusy query and parse the primary calendar's busy blocks"""
+    events_result = execute(service.freebusy().query(body=body))
+    return parse_busy(events_result["calendars"]["primary"]["busy"])
+
 def suggest_available_slots(
     date: date,
     duration_minutes: int = 30,
-    start_hour: int = 9,
-    end_hour: int = 18,
+    start_hour: Optional[int] = None,
+    end_hour: Optional[int] = None,
 ) -> List[Tuple[datetime, datetime]]:
     """Suggest available slots using Google Calendar API"""
     try:
@@ -317,106 +407,160 @@ def suggest_available_slots(
             return []
             
        
-        tz = 'Asia/Kolkata'
-        tz_info = pytz.timezone(tz)
+        profile = current_profile()
+        tz_info = profile.tz
         
-       
-        start_time = datetime.combine(date, time(start_hour, 0))
-        end_time = datetime.combine(date, time(end_hour, 0))
+        # Working window defaults to the user's profile unless hours are given explicitly
+        window_start, window_end = profile.working_window(date)
+        if start_hour is not None:
+            window_start = int(datetime.combine(date, time(start_hour, 0), tzinfo=tz_info).timestamp())
+        if end_hour is not None:
+            window_end = int(datetime.combine(date, time(end_hour, 0), tzinfo=tz_info).timestamp())
         
       
-        time_min = start_time.astimezone(tz_info).isoformat()
-        time_max = end_time.astimezone(tz_info).isoformat()
+        time_min = datetime.fromtimestamp(window_start, tz_info).isoformat()
+        time_max = datetime.fromtimestamp(window_end, tz_info).isoformat()
         
         print(f"Querying availability from {time_min} to {time_max}")
         
+        body = {
+            "timeMin": time_min,
+            "timeMax": time_max,
+            "timeZone": profile.timezone,
+            "items": [{"id": "primary"}],
+        }
+        
         try:
-            body = {
-                "timeMin": time_min,
-                "timeMax": time_max,
-                "timeZone": tz,
-                "items": [{"id": "primary"}],
-            }
-            
-            events_result = service.freebusy().query(body=body).execute()
-            busy_times = events_result["calendars"]["primary"]["busy"]
-            print(f"Found {len(busy_times)} busy time slots")
-            
-            slots = []
-            current = start_time
-            
-            while current + timedelta(minutes=duration_minutes) <= end_time:
-                slot_end = current + timedelta(minutes=duration_minutes)
-                
-               
-                current_tz = current.astimezone(tz_info)
-                slot_end_tz = slot_end.astimezone(tz_info)
-                
-               
-                is_available = True
-                for busy in busy_times:
-                    busy_start = datetime.fromisoformat(busy["start"]).astimezone(tz_info)
-                    busy_end = datetime.fromisoformat(busy["end"]).astimezone(tz_info)
-                    
-                    if current_tz < busy_end and slot_end_tz > busy_start:
-                        is_available = False
-                        break
-                
-                if is_available:
-                    slots.append((current_tz, slot_end_tz))
-                
-                current += timedelta(minutes=30)
-            
-            print(f"Found {len(slots)} available slots")
-            return slots
-            
+            busy_times = _query_busy(service, body)
         except Exception as e:
        
-            if "insufficientPermissions" in str(e):
-                print("Insufficient permissions, forcing OAuth refresh...")
-                service = get_calendar_service(force_freebusy=True)
-                if not service:
-                    return []
-                
-              
-                events_result = service.freebusy().query(body=body).execute()
-                busy_times = events_result["calendars"]["primary"]["busy"]
-                print(f"Found {len(busy_times)} busy time slots after OAuth refresh")
-                
-                slots = []
-                current = start_time
-                
-                while current + timedelta(minutes=duration_minutes) <= end_time:
-                    slot_end = current + timedelta(minutes=duration_minutes)
-                    
-                   
-                    current_tz = current.astimezone(tz_info)
-                    slot_end_tz = slot_end.astimezone(tz_info)
-                    
-                  
-                    is_available = True
-                    for busy in busy_times:
-                        busy_start = datetime.fromisoformat(busy["start"]).astimezone(tz_info)
-                        busy_end = datetime.fromisoformat(busy["end"]).astimezone(tz_info)
-                        
-                        if current_tz < busy_end and slot_end_tz > busy_start:
-                            is_available = False
-                            break
-                    
-                    if is_available:
-                        slots.append((current_tz, slot_end_tz))
-                    
-                    current += timedelta(minutes=30)
-                
-                print(f"Found {len(slots)} available slots after OAuth refresh")
-                return slots
-            
-            raise
+            if "insufficientPermissions" not in str(e):
+                raise
+            raise CalendarAuthError("The Calendar token lacks the freebusy scope. Re-authorize at /oauth/start.") from e
+        
+        print(f"Found {len(busy_times)} busy time slots")
+        
+        duration = duration_minutes * 60
+        step = 30 * 60
+        candidates = (
+            (start, start + duration)
+            for start in range(window_start, window_end - duration + 1, step)
+        )
+        
+        # Busy blocks are sorted, so one forward pass over them covers every candidate slot
+        slots = [
+            (datetime.fromtimestamp(start, tz_info), datetime.fromtimestamp(end, tz_info))
+            for start, end, conflict in sweep_conflicts(candidates, busy_times)
+            if not conflict
+        ]
+        
+        print(f"Found {len(slots)} available slots")
+        return slots
             
     except Exception as e:
         print(f"Error checking availability: {e}")
         return []
 
+def get_busy_intervals(start_date: date, end_date: date) -> List[BusyInterval]:
+    """Busy blocks between two local dates (both inclusive) from a single freebusy query"""
+    profile = current_profile()
+    service = get_calendar_service()
+    body = {
+        "timeMin": datetime.fromtimestamp(profile.day_bounds(start_date)[0], profile.tz).isoformat(),
+        "timeMax": datetime.fromtimestamp(profile.day_bounds(end_date)[1], profile.tz).isoformat(),
+        "timeZone": profile.timezone,
+        "items": [{"id": "primary"}],
+    }
+    return _query_busy(service, body)
+
+def find_best_slots(
+    start_date: date,
+    days: int = 1,
+    duration_minutes: int = 30,
+    k: int = 3,
+    prefs: Optional[SlotPreferences] = None,
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Rank free slots over one or more days and return the top k.
+
+    Args:
+        start_date: First day to search
+        days: Number of days to search, starting at start_date, at most MAX_SEARCH_DAYS
+        duration_minutes: Meeting length
+        k: Number of suggestions
+        prefs: Ranking preferences
+
+    Returns:
+        list: Best (start, end) slots first
+    """
+    if k < 1 or days < 1:
+        return []
+    days = min(days, MAX_SEARCH_DAYS)
+    try:
+        profile = current_profile()
+        end_date = start_date + timedelta(days=days - 1)
+        busy = get_busy_intervals(start_date, end_date)
+        windows = [profile.working_window(start_date + timedelta(days=i)) for i in range(days)]
+        ranked = rank_slots(busy, windows, duration_minutes, k=k, prefs=prefs, tz=profile.tz)
+        return [
+            (datetime.fromtimestamp(start, profile.tz), datetime.fromtimestamp(end, profile.tz))
+            for _, start, end in ranked
+        ]
+    except Exception as e:
+        print(f"Error ranking slots: {e}")
+        return []
+
+def find_next_available(
+    duration_minutes: int = 60,
+    after: Optional[datetime] = None,
+    horizons: Tuple[int, ...] = NEXT_AVAILABLE_HORIZONS,
+) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Earliest free slot of duration_minutes inside working hours.
+
+    Freebusy is queried over growing windows (today, the next 2 days, the
+    rest of the week, ...), each starting where the previous one ended, and
+    the search stops at the first window with a fitting gap. Gaps are
+    scanned in order, so the first fit is the earliest one: a typical answer
+    costs one or two API calls instead of one per day.
+
+    Args:
+        duration_minutes: Meeting length
+        after: Do not start before this moment (default: now)
+        horizons: Cumulative search horizons in days
+
+    Returns:
+        tuple: (start, end) in the user's timezone, or None if nothing fits within the last horizon
+    """
+    profile = current_profile()
+    tz = profile.tz
+    after = profile.localize(after) if after else profile.now()
+    duration = duration_minutes * 60
+    rounding = SLOT_ROUND_MINUTES * 60
+    earliest = -(-int(after.timestamp()) // rounding) * rounding
+    first_day = after.date()
+
+    searched = 0
+    for queries, horizon in enumerate(horizons, 1):
+        if horizon <= searched:
+            continue
+        start_day = first_day + timedelta(days=searched)
+        end_day = first_day + timedelta(days=horizon - 1)
+        busy = get_busy_intervals(start_day, end_day)
+        for offset in range(horizon - searched):
+            window_start, window_end = profile.working_window(start_day + timedelta(days=offset))
+            window_start = max(window_start, earliest)
+            if window_end - window_start < duration:
+                continue
+            gaps = free_intervals(busy, window_start, window_end, min_seconds=duration)
+            if gaps:
+                start = gaps[0][0]
+                print(f"Next available slot found with {queries} freebusy queries")
+                return datetime.fromtimestamp(start, tz), datetime.fromtimestamp(start + duration, tz)
+        searched = horizon
+    print(f"No {duration_minutes}-minute slot within {searched} days")
+    return None
+
 def is_time_slot_available(date: datetime, start_time: datetime, end_time: datetime) -> bool:
     """
     Check if a specific time slot is available in the calendar.
@@ -434,27 +578,22 @@ def is_time_slot_available(date: datetime, start_time: datetime, end_time: datet
         service = get_calendar_service()
         
         # Convert to timezone-aware datetimes
-        timezone = pytz.timezone('Asia/Kolkata')
-        start = timezone.localize(datetime.combine(date, start_time.time()))
-        end = timezone.localize(datetime.combine(date, end_time.time()))
+        timezone = current_profile().tz
+        start = datetime.combine(date, start_time.time(), tzinfo=timezone)
+        end = datetime.combine(date, end_time.time(), tzinfo=timezone)
+        
+        if event_store:
+            return not _events_between(service, int(start.timestamp()), int(end.timestamp()), timezone)
         
         # Format time for API
         time_min = start.isoformat()
         time_max = end.isoformat()
         
-        # Check for existing events in the time slot
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=time_min,
-            timeMax=time_max,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
+        # A single overlapping event is enough to answer, so stop at the first one
+        first_event = next(iter_events(service, time_min, time_max, page_size=1), None)
         
         # If no events found, the slot is available
-        return len(events) == 0
+        return first_event is None
         
     except Exception as e:
         print(f"Error checking time slot availability: {e}")
@@ -473,60 +612,22 @@ def get_available_slots(date: datetime) -> list:
     try:
         # Get the service
         service = get_calendar_service()
-        timezone = pytz.timezone('Asia/Kolkata')
-        
-        # Set up time range for the entire day
-        start_of_day = timezone.localize(datetime.combine(date, time(9, 0)))
-        end_of_day = timezone.localize(datetime.combine(date, time(18, 0)))
-        
-        # Get all events for the day
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=start_of_day.isoformat(),
-            timeMax=end_of_day.isoformat(),
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+        profile = current_profile()
+        timezone = profile.tz
         
-        events = events_result.get('items', [])
+        # Working hours for the day, precomputed per profile
+        if isinstance(date, datetime):
+            date = date.astimezone(timezone).date() if date.tzinfo else date.date()
+        window_start, window_end = profile.working_window(date)
         
-        # Initialize with the full day
-        available_slots = [(start_of_day, end_of_day)]
+        # Get all events for the day, parsed once
+        events = _events_between(service, window_start, window_end, timezone)
         
-        # Split available slots based on existing events
-        for event in events:
-            event_start = parse_datetime(event['start'].get('dateTime', event['start'].get('date')))
-            event_end = parse_datetime(event['end'].get('dateTime', event['end'].get('date')))
-            
-            if not isinstance(event_start, datetime):
-                event_start = datetime.combine(event_start, time(0, 0))
-            if not isinstance(event_end, datetime):
-                event_end = datetime.combine(event_end, time(0, 0))
-                
-            # Make timezone-aware if not already
-            if event_start.tzinfo is None:
-                event_start = timezone.localize(event_start)
-            if event_end.tzinfo is None:
-                event_end = timezone.localize(event_end)
-                
-            new_slots = []
-            for slot_start, slot_end in available_slots:
-                # If event overlaps with slot
-                if not (event_end <= slot_start or event_start >= slot_end):
-                    # Add slot before event
-                    if slot_start < event_start:
-                        new_slots.append((slot_start, event_start))
-                    # Add slot after event
-                    if event_end < slot_end:
-                        new_slots.append((event_end, slot_end))
-                else:
-                    new_slots.append((slot_start, slot_end))
-            available_slots = new_slots
-        
-        # Filter out slots that are too short (less than 30 minutes)
+        # Subtract events from the working window, dropping gaps shorter than 30 minutes
+        free = free_intervals(events, window_start, window_end, min_seconds=1800)
         available_slots = [
-            (start, end) for start, end in available_slots 
-            if (end - start).total_seconds() >= 1800  # 30 minutes in seconds
+            (datetime.fromtimestamp(start, timezone), datetime.fromtimestamp(end, timezone))
+            for start, end in free
         ]
         
         return available_slots
@@ -539,8 +640,9 @@ def book_slot(
     start_time: datetime,
     end_time: datetime,
     summary: str = "Meeting",
+    attendees: Optional[List[str]] = None,
 ) -> Optional[str]:
-    """Book a meeting slot using Google Calendar API"""
+    """Book a meeting slot using Google Calendar API, inviting any attendee email addresses"""
     try:
         print(f"Booking slot from {start_time} to {end_time}")
         service = get_calendar_service()
@@ -549,59 +651,437 @@ def book_slot(
             return None
             
         # Make sure times are timezone-aware
+        profile = current_profile()
         if not start_time.tzinfo:
-            start_time = start_time.astimezone(pytz.timezone('Asia/Kolkata'))
+            start_time = profile.localize(start_time)
         if not end_time.tzinfo:
-            end_time = end_time.astimezone(pytz.timezone('Asia/Kolkata'))
+            end_time = profile.localize(end_time)
         
         event = {
             'summary': summary,
             'start': {
                 'dateTime': start_time.isoformat(),
-                'timeZone': 'Asia/Kolkata'
+                'timeZone': profile.timezone
             },
             'end': {
                 'dateTime': end_time.isoformat(),
-                'timeZone': 'Asia/Kolkata'
+                'timeZone': profile.timezone
             },
             'reminders': {
                 'useDefault': True
             }
         }
+        if attendees:
+            event['attendees'] = [{'email': email} for email in attendees if '@' in email]
         
         print("Creating event...")
-        event = service.events().insert(calendarId='primary', body=event).execute()
+        event = execute(service.events().insert(calendarId='primary', body=event))
+        mark_calendar_changed()
         print(f"Event created successfully: {event.get('htmlLink')}")
+        notify_session("booking_confirmed", start=start_time.isoformat(), end=end_time.isoformat(),
+                       summary=summary, link=event.get('htmlLink'))
         return event.get('htmlLink')
         
     except Exception as e:
         print(f"Error in book_slot: {e}")
         return None
 
-def check_calendar_events(date: date) -> List[Dict[str, str]]:
-    """Check events in calendar using Google Calendar API"""
+def book_recurring(
+    start_time: datetime,
+    end_time: datetime,
+    rule: str,
+    summary: str = "Meeting",
+    skip_conflicts: bool = False,
+) -> Dict[str, Any]:
+    """
+    Book a recurring meeting as a single event after checking every occurrence.
+
+    The rule is expanded lazily twice in process: once to find where the
+    series ends and once to sweep the occurrences against the busy blocks of
+    a single freebusy query covering the whole series. The API cost is one
+    freebusy call and one insert whatever the number of occurrences.
+
+    Args:
+        start_time: Start of the first occurrence
+        end_time: End of the first occurrence
+        rule: RRULE (with or without the "RRULE:" prefix), bounded by COUNT or UNTIL;
+            a longer series is cut to MAX_OCCURRENCES
+        summary: Event title
+        skip_conflicts: Exclude conflicting occurrences (EXDATE) instead of booking over them
+
+    Returns:
+        dict: link (None if booking failed), the rule booked, occurrences count and conflicts as (start, end) pairs
+    """
+    result = {"link": None, "rule": None, "occurrences": 0, "conflicts": []}
     try:
-        print(f"Checking events for date: {date}")
+        profile = current_profile()
+        start_time = profile.localize(start_time)
+        end_time = profile.localize(end_time)
+        duration = end_time - start_time
+        rule = result["rule"] = cap_occurrences(rule, start_time)
+        
+        last_start = start_time
+        for last_start in iter_occurrences(rule, start_time):
+            pass
+        
         service = get_calendar_service()
-        if not service:
-            return []
-            
-        start_of_day = datetime.combine(date, datetime.time.min)
-        end_of_day = datetime.combine(date, datetime.time.max)
+        body = {
+            "timeMin": start_time.isoformat(),
+            "timeMax": (last_start + duration).isoformat(),
+            "timeZone": profile.timezone,
+            "items": [{"id": "primary"}],
+        }
+        busy_times = _query_busy(service, body)
+        print(f"Checking recurring series against {len(busy_times)} busy blocks")
         
-        print(f"Querying events from {start_of_day} to {end_of_day}")
+        seconds = int(duration.total_seconds())
+        occurrences = (
+            (int(occurrence.timestamp()), int(occurrence.timestamp()) + seconds)
+            for occurrence in iter_occurrences(rule, start_time)
+        )
+        conflicts = []
+        for start, end, conflict in sweep_conflicts(occurrences, busy_times):
+            result["occurrences"] += 1
+            if conflict:
+                conflicts.append((datetime.fromtimestamp(start, profile.tz), datetime.fromtimestamp(end, profile.tz)))
+        result["conflicts"] = conflicts
         
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=start_of_day.isoformat() + 'Z',
-            timeMax=end_of_day.isoformat() + 'Z',
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+        recurrence = [f"RRULE:{rule}"]
+        if skip_conflicts and conflicts:
+            exdates = ",".join(start.strftime('%Y%m%dT%H%M%S') for start, _ in conflicts)
+            recurrence.append(f"EXDATE;TZID={profile.timezone}:{exdates}")
         
-        events = events_result.get('items', [])
-        print(f"Found {len(events)} events")
-        return events
+        event = {
+            'summary': summary,
+            'start': {
+                'dateTime': start_time.isoformat(),
+                'timeZone': profile.timezone
+            },
+            'end': {
+                'dateTime': end_time.isoformat(),
+                'timeZone': profile.timezone
+            },
+            'recurrence': recurrence,
+            'reminders': {
+                'useDefault': True
+            }
+        }
+        
+        print(f"Creating recurring event with {result['occurrences']} occurrences, {len(conflicts)} conflicts...")
+        event = execute(service.events().insert(calendarId='primary', body=event))
+        mark_calendar_changed()
+        result["link"] = event.get('htmlLink')
+        notify_session("booking_confirmed", start=start_time.isoformat(), end=end_time.isoformat(),
+                       summary=summary, link=result["link"], occurrences=result["occurrences"])
+        return result
+        
+    except Exception as e:
+        print(f"Error in book_recurring: {e}")
+        return result
+
+def get_events_in_range(start_date: date, end_date: date) -> List[Event]:
+    """
+    Fetch every event between two dates (both inclusive) with a single paged query.
+
+    Args:
+        start_date: First day of the range
+        end_date: Last day of the range
+
+    Returns:
+        list: Events ordered by start time
+    """
+    print(f"Checking events from {start_date} to {end_date}")
+    service = get_calendar_service()
+    if not service:
+        return []
+
+    profile = current_profile()
+    tz = profile.tz
+    range_start = profile.day_bounds(start_date)[0]
+    range_end = profile.day_bounds(end_date)[1]
+
+    print(f"Querying events from {datetime.fromtimestamp(range_start, tz)} to {datetime.fromtimestamp(range_end, tz)}")
+
+    events = _events_between(service, range_start, range_end, tz)
+
+    print(f"Found {len(events)} events")
+    return events
+
+def execute_batched(service, requests: List[Tuple[str, Any]], batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Execute (key, request) pairs with one HTTP round trip per batch_size requests.
+
+    A lone request is executed directly, since a batch of one only adds
+    multipart overhead. Per-request failures do not stop the rest, and a
+    round trip that fails as a whole (transport error) fails only its own
+    keys. Running out of time fails every key not yet sent. Either way the
+    outcome of the round trips already applied is returned, never lost.
+
+    Returns:
+        dict: "done" maps keys to responses, "failed" maps keys to exceptions,
+            "batches" counts round trips
+    """
+    result = {"done": {}, "failed": {}, "batches": 0}
+    for offset in range(0, len(requests), batch_size):
+        chunk = requests[offset:offset + batch_size]
+
+        def on_response(request_id, response, exception, chunk=chunk):
+            key = chunk[int(request_id)][0]
+            if exception is None:
+                result["done"][key] = response
+            else:
+                result["failed"][key] = exception
+
+        try:
+            if len(requests) == 1:
+                on_response("0", execute(chunk[0][1]), None)
+            else:
+                batch = service.new_batch_http_request(callback=on_response)
+                for i, (_, request) in enumerate(chunk):
+                    batch.add(request, request_id=str(i))
+                execute(batch)
+        except (Exception, DeadlineExceeded) as e:
+            print(f"Batch of {len(chunk)} requests failed: {e!r}")
+            unsent = chunk if not isinstance(e, DeadlineExceeded) else requests[offset:]
+            for key, _ in unsent:
+                if key not in result["done"]:
+                    result["failed"].setdefault(key, e)
+            if isinstance(e, DeadlineExceeded):
+                break
+        finally:
+            result["batches"] += 1
+    return result
+
+def cancel_events(event_ids: List[str], calendar_id: str = 'primary', batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Delete events with batched events.delete calls.
+
+    Events that are already gone (404/410) count as cancelled, so repeating a
+    partly failed bulk cancel is safe.
+
+    Returns:
+        dict: cancelled ids in input order, failures as {"id", "error"} and the number of round trips
+    """
+    service = get_calendar_service()
+    outcome = execute_batched(
+        service,
+        [(event_id, service.events().delete(calendarId=calendar_id, eventId=event_id)) for event_id in event_ids],
+        batch_size
+    )
+    failed = []
+    for event_id, error in outcome["failed"].items():
+        if isinstance(error, HttpError) and error.resp.status in (404, 410):
+            outcome["done"][event_id] = None
+        else:
+            failed.append({"id": event_id, "error": str(error)})
+    cancelled = [event_id for event_id in event_ids if event_id in outcome["done"]]
+    if cancelled:
+        mark_calendar_changed(calendar_id)
+    print(f"Cancelled {len(cancelled)} events in {outcome['batches']} round trips, {len(failed)} failed")
+    return {"cancelled": cancelled, "failed": failed, "batches": outcome["batches"]}
+
+def reschedule_events(changes: List[Tuple[str, datetime, datetime]], calendar_id: str = 'primary',
+                      batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Move events to new times with batched events.patch calls.
+
+    Only start and end are sent, so title, attendees and reminders stay as
+    they are.
+
+    Args:
+        changes: (event id, new start, new end) per event; naive times are read in the user's zone
+
+    Returns:
+        dict: rescheduled ids in input order, failures as {"id", "error"} and the number of round trips
+    """
+    service = get_calendar_service()
+    profile = current_profile()
+
+    def patch(event_id: str, start: datetime, end: datetime):
+        body = {
+            'start': {'dateTime': profile.localize(start).isoformat(), 'timeZone': profile.timezone},
+            'end': {'dateTime': profile.localize(end).isoformat(), 'timeZone': profile.timezone}
+        }
+        return service.events().patch(calendarId=calendar_id, eventId=event_id, body=body, fields="id,start,end")
+
+    outcome = execute_batched(service, [(event_id, patch(event_id, start, end)) for event_id, start, end in changes],
+                              batch_size)
+    rescheduled = [event_id for event_id, _, _ in changes if event_id in outcome["done"]]
+    if rescheduled:
+        mark_calendar_changed(calendar_id)
+    failed = [{"id": event_id, "error": str(error)} for event_id, error in outcome["failed"].items()]
+    print(f"Rescheduled {len(rescheduled)} events in {outcome['batches']} round trips, {len(failed)} failed")
+    return {"rescheduled": rescheduled, "failed": failed, "batches": outcome["batches"]}
+
+def import_events(events: Iterable[Dict[str, Any]], calendar_id: str = 'primary',
+                  batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Write events with batched events.import calls.
+
+    events is consumed lazily, so only one batch is held at a time. import is
+    keyed by iCalUID, so importing the same file twice updates events rather
+    than duplicating them. Items carrying an "error" key (unparseable input)
+    are counted as failures. A round trip that fails as a whole fails only
+    its own events, like in execute_batched; running out of time fails the
+    rest of the file unsent. Either way the counts of what was already
+    imported are returned.
+
+    Returns:
+        dict: imported and failed counts, the number of batches and the first failures
+    """
+    service = get_calendar_service()
+    result = {"imported": 0, "failed": 0, "batches": 0, "errors": []}
+
+    def fail(uid, error):
+        result["failed"] += 1
+        if len(result["errors"]) < MAX_REPORTED_FAILURES:
+            result["errors"].append({"uid": uid, "error": error})
+
+    uids = {}
+    answered = set()
+
+    def on_response(request_id, response, exception):
+        answered.add(request_id)
+        if exception is None:
+            result["imported"] += 1
+        else:
+            fail(uids.get(request_id), str(exception))
+
+    def flush(batch):
+        try:
+            execute(batch)
+        except (Exception, DeadlineExceeded) as e:
+            print(f"Import batch of {len(uids)} events failed: {e!r}")
+            for request_id, uid in uids.items():
+                if request_id not in answered:
+                    fail(uid, str(e) or type(e).__name__)
+            if isinstance(e, DeadlineExceeded):
+                raise
+        finally:
+            result["batches"] += 1
+            uids.clear()
+            answered.clear()
+
+    batch = None
+    events = iter(events)
+    try:
+        for event in events:
+            if "error" in event:
+                fail(event.get("uid"), event["error"])
+                continue
+            if batch is None:
+                batch = service.new_batch_http_request(callback=on_response)
+            # The same UID can appear more than once in a file, so batch ids are positional
+            request_id = str(len(uids))
+            uids[request_id] = event["iCalUID"]
+            batch.add(service.events().import_(calendarId=calendar_id, body=event), request_id=request_id)
+            if len(uids) >= batch_size:
+                flush(batch)
+                batch = None
+        if batch is not None:
+            flush(batch)
+    except DeadlineExceeded as e:
+        for event in events:
+            fail(event.get("uid", event.get("iCalUID")), f"not sent: {e}")
+    if result["imported"]:
+        mark_calendar_changed(calendar_id)
+
+    print(f"Imported {result['imported']} events in {result['batches']} batches, {result['failed']} failed")
+    return result
+
+def export_ics(start_date: date, end_date: date, calendar_id: str = 'primary') -> Iterator[str]:
+    """
+    Stream a calendar range as iCalendar text.
+
+    Recurring series are exported once with their RRULE. Pages are fetched
+    lazily as the output is consumed, and text goes out in chunks of about
+    EXPORT_CHUNK_BYTES.
+    """
+    service = get_calendar_service()
+    profile = current_profile()
+    time_min = datetime.fromtimestamp(profile.day_bounds(start_date)[0], profile.tz).isoformat()
+    time_max = datetime.fromtimestamp(profile.day_bounds(end_date)[1], profile.tz).isoformat()
+
+    buffer = [calendar_header()]
+    size = len(buffer[0])
+    for item in iter_events(service, time_min, time_max, fields=EXPORT_FIELDS,
+                            calendar_id=calendar_id, expand_recurring=False):
+        if item.get('status') == 'cancelled':
+            continue
+        text = event_to_ics(item)
+        buffer.append(text)
+        size += len(text)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    buffer.append(calendar_footer())
+    yield "".join(buffer)
+
+def bucket_events_by_day(events: List[Event], start_date: date, end_date: date) -> Dict[date, List[Event]]:
+    """
+    Group events by local calendar day in a single pass.
+
+    Events spanning several days are listed under every day they cover.
+    Days without events are kept with an empty list so views stay contiguous.
+    """
+    tz = current_profile().tz
+    days = {start_date + timedelta(days=i): [] for i in range((end_date - start_date).days + 1)}
+
+    for event in events:
+        day = max(event.start_dt(tz).date(), start_date)
+        # End is exclusive, so an event ending at midnight does not spill into the next day
+        last_day = min(datetime.fromtimestamp(max(event.end - 1, event.start), tz).date(), end_date)
+        while day <= last_day:
+            days[day].append(event)
+            day += timedelta(days=1)
+
+    return days
+
+def get_agenda(start_date: date, end_date: date) -> Dict[date, List[Event]]:
+    """Get events for a date range bucketed by local day"""
+    events = get_events_in_range(start_date, end_date)
+    return bucket_events_by_day(events, start_date, end_date)
+
+def get_view_range(anchor: date, view: str = "week") -> Tuple[date, date]:
+    """
+    Resolve a calendar view into an inclusive date range.
+
+    Args:
+        anchor: Any date inside the requested view
+        view: One of "day", "week" (Monday to Sunday) or "month"
+    """
+    view = view.lower()
+    if view == "day":
+        return anchor, anchor
+    if view == "week":
+        start = anchor - timedelta(days=anchor.weekday())
+        return start, start + timedelta(days=6)
+    if view == "month":
+        start = anchor.replace(day=1)
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    raise ValueError(f"Unknown calendar view: {view}")
+
+def summarize_agenda(agenda: Dict[date, List[Event]]) -> List[Dict[str, Any]]:
+    """Compact per-day summary of an agenda: event count and first/last busy times clipped to the day"""
+    profile = current_profile()
+    tz = profile.tz
+    summary = []
+    for day, events in agenda.items():
+        entry = {"date": day.isoformat(), "count": len(events)}
+        if events:
+            day_start, day_end = profile.day_bounds(day)
+            first_start = max(min(event.start for event in events), day_start)
+            last_end = min(max(event.end for event in events), day_end)
+            entry["first_start"] = datetime.fromtimestamp(first_start, tz).isoformat()
+            entry["last_end"] = datetime.fromtimestamp(last_end, tz).isoformat()
+        summary.append(entry)
+    return summary
+
+def check_calendar_events(date: date) -> List[Event]:
+    """Check events in calendar using Google Calendar API"""
+    try:
+        return get_events_in_range(date, date)
     except Exception as e:
         print(f"Error checking calendar events: {e}")
         raise
@@ -681,9 +1161,7 @@ async def test_availability(request: AvailabilityRequest):
             
         slots = suggest_available_slots(
             dt.date(),
-            duration_minutes=30,
-            start_hour=9,
-            end_hour=18
+            duration_minutes=30
         )
         
         print(f"Found {len(slots)} available slots")
@@ -708,7 +1186,8 @@ async def test_events(request: EventsRequest):
             
         events = check_calendar_events(dt.date())
         print(f"Found {len(events)} events")
-        return {"success": True, "events": events}
+        tz = current_profile().tz
+        return {"success": True, "events": [event.to_dict(tz) for event in events]}
         
     except HTTPException as e:
         print(f"HTTP error: {e.detail}")
@@ -719,13 +1198,12 @@ async def test_events(request: EventsRequest):
 
 # Add OAuth callback endpoint
 @app.get("/callback")
-async def oauth_callback(code: str):
+def oauth_callback(code: str, state: str):
     """Handle OAuth callback from Google"""
     try:
-        print(f"OAuth callback received with code: {code}")
+        print("OAuth callback received")
         
-        # Force OAuth flow to complete
-        get_calendar_service(force_oauth=True)
+        finish_web_flow(state, code)
         return {"success": True, "message": "Authentication successful!"}
     except Exception as e:
         print(f"OAuth error: {str(e)}")
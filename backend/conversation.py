@@ -0,0 +1,161 @@
+import os
+from collections import deque
+from typing import List, Tuple, Deque
+
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain.schema.messages import HumanMessage, AIMessage, BaseMessage
+
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "200"))
+TURN_TOKEN_LIMIT = int(os.getenv("TURN_TOKEN_LIMIT", "300"))
+SUMMARY_LINE_CHARS = 120
+
+SYSTEM_MESSAGE = """You are TailorTalk Assistant, a friendly and professional calendar scheduling bot.
+Your goal is to help users manage their calendar, book meetings, and check availability.
+
+Guidelines:
+- Be warm, concise, and helpful
+- Use natural language and emojis when appropriate
+- If you need more information, ask specific questions
+- When confirming actions, summarize the details
+- Keep responses brief and to the point
+- Use markdown for better readability
+
+You can help with:
+- Booking meetings
+- Checking availability
+- Viewing calendar events
+- Managing existing bookings"""
+
+# Built once; per-turn data goes in through variables so user text is never parsed as a template
+CHAT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_MESSAGE + "\n\nEarlier in this conversation:\n{summary}"),
+    MessagesPlaceholder(variable_name="history"),
+    ("user", "{input}")
+])
+
+EXTRACTION_INSTRUCTIONS = """For the user's latest message, work out what they want and write your reply to them.
+Resolve relative dates ("tomorrow", "next Friday") against the current time given in the message.
+Respond with a single JSON object and nothing else, matching this JSON schema:
+{schema}"""
+
+# Same conversation framing as CHAT_PROMPT, but the model answers with intent, slots and reply in one JSON object
+EXTRACTION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_MESSAGE + "\n\nEarlier in this conversation:\n{summary}\n\n" + EXTRACTION_INSTRUCTIONS),
+    MessagesPlaceholder(variable_name="history"),
+    ("user", "{input}")
+])
+
+
+def count_tokens(text: str) -> int:
+    """
+    Cheap token estimate (about four characters per token).
+
+    The model's own counter is a network call, which would cost more than
+    the prompt bytes it saves.
+    """
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens, marking the cut"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    return text[:max(max_tokens * 4 - 1, 0)].rstrip() + "…"
+
+
+# System message plus the summary heading and role overhead
+SYSTEM_TOKENS = count_tokens(SYSTEM_MESSAGE) + 20
+
+
+def _summary_line(role: str, content: str) -> str:
+    first_line = content.strip().splitlines()[0] if content.strip() else ""
+    if len(first_line) > SUMMARY_LINE_CHARS:
+        first_line = first_line[:SUMMARY_LINE_CHARS - 1].rstrip() + "…"
+    return f"- {role}: {first_line}"
+
+
+class ConversationContext:
+    """
+    Chat history kept under a hard prompt token budget.
+
+    Recent turns are kept verbatim, each capped at TURN_TOKEN_LIMIT so a
+    long calendar listing cannot crowd out the rest. Once the prompt would
+    exceed the budget, the oldest turns are folded into a rolling summary of
+    one line per message, which is itself capped at SUMMARY_TOKEN_BUDGET.
+    """
+
+    def __init__(
+        self,
+        max_prompt_tokens: int = PROMPT_TOKEN_BUDGET,
+        summary_tokens: int = SUMMARY_TOKEN_BUDGET,
+        turn_tokens: int = TURN_TOKEN_LIMIT,
+    ):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.summary_tokens = summary_tokens
+        self.turn_tokens = turn_tokens
+        self.turns: Deque[Tuple[BaseMessage, int]] = deque()
+        self.summary_lines: Deque[Tuple[str, int]] = deque()
+        self.history_tokens = 0
+        self.summary_token_count = 0
+        self.last_prompt_tokens = 0
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def _append(self, message: BaseMessage):
+        tokens = count_tokens(message.content)
+        self.turns.append((message, tokens))
+        self.history_tokens += tokens
+
+    def add_user(self, content: str):
+        self._append(HumanMessage(content=truncate_to_tokens(content, self.turn_tokens)))
+
+    def add_ai(self, content: str):
+        self._append(AIMessage(content=truncate_to_tokens(content, self.turn_tokens)))
+
+    def _fold_oldest(self):
+        """Move the oldest verbatim turn into the rolling summary"""
+        message, tokens = self.turns.popleft()
+        self.history_tokens -= tokens
+        role = "User" if isinstance(message, HumanMessage) else "Assistant"
+        line = _summary_line(role, message.content)
+        line_tokens = count_tokens(line)
+        self.summary_lines.append((line, line_tokens))
+        self.summary_token_count += line_tokens
+        while self.summary_token_count > self.summary_tokens and self.summary_lines:
+            _, dropped = self.summary_lines.popleft()
+            self.summary_token_count -= dropped
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(line for line, _ in self.summary_lines) or "(nothing yet)"
+
+    def prompt_variables(self, user_input: str, reserved_tokens: int = 0) -> dict:
+        """
+        Variables for CHAT_PROMPT with the whole prompt under max_prompt_tokens.
+
+        The current input is capped first; then old turns are folded into the
+        summary until system + summary + history + input fit. reserved_tokens
+        covers extra fixed prompt text such as EXTRACTION_INSTRUCTIONS.
+        """
+        fixed_tokens = SYSTEM_TOKENS + reserved_tokens
+        room_for_input = self.max_prompt_tokens - fixed_tokens - self.summary_tokens
+        user_input = truncate_to_tokens(user_input, max(room_for_input, 1))
+        input_tokens = count_tokens(user_input)
+
+        while self.turns and (
+            fixed_tokens + self.summary_token_count + self.history_tokens + input_tokens > self.max_prompt_tokens
+        ):
+            self._fold_oldest()
+
+        self.last_prompt_tokens = fixed_tokens + self.summary_token_count + self.history_tokens + input_tokens
+        return {
+            "summary": self.summary,
+            "history": [message for message, _ in self.turns],
+            "input": user_input
+        }
+
+    def messages(self) -> List[BaseMessage]:
+        return [message for message, _ in self.turns]
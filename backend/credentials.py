@@ -0,0 +1,428 @@
+import os
+import sys
+import json
+import time
+import secrets
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Tuple
+
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google.oauth2 import service_account
+from google_auth_oauthlib.flow import Flow, InstalledAppFlow
+
+from backend.deadline import UPSTREAM_TIMEOUT_SECONDS, remaining_time, DeadlineExceeded
+
+try:
+    import fcntl
+except ImportError:  # Windows: the in-process lock still serializes threads
+    fcntl = None
+
+
+SCOPES = [
+    "https://www.googleapis.com/auth/calendar.events",
+    "https://www.googleapis.com/auth/calendar.freebusy",
+    "https://www.googleapis.com/auth/calendar"
+]
+TOKEN_FILE = os.getenv("GOOGLE_TOKEN_FILE", "token.json")
+CREDENTIALS_FILE = os.getenv("GOOGLE_CLIENT_SECRETS_FILE", "credentials.json")
+OAUTH_PORT = 8080
+OAUTH_REDIRECT_URI = os.getenv("OAUTH_REDIRECT_URI", f"http://localhost:{OAUTH_PORT}/callback")
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+# Which provider supplies Calendar credentials: auto, service_account, env or token_file
+CREDENTIALS_PROVIDER = os.getenv("CREDENTIALS_PROVIDER", "auto")
+# Pending web OAuth flows older than this are dropped
+OAUTH_STATE_TTL_SECONDS = 600
+# Refresh this long before expiry, in the background, so requests never wait on it
+REFRESH_MARGIN_SECONDS = int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive lock shared by every worker process on this host"""
+    with open(path, "a+") as handle:
+        if fcntl:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _atomic_write(path: str, data: str):
+    """Write a file so readers see either the old or the new contents, never half of one"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".token-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _seconds_left(creds: Credentials) -> Optional[float]:
+    """Seconds until the access token expires; None when the expiry is unknown"""
+    if not creds.expiry:
+        return None
+    # google-auth keeps expiry as naive UTC
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return (creds.expiry - now).total_seconds()
+
+
+class CredentialStore:
+    """
+    OAuth token held in memory and shared safely between threads and worker processes.
+
+    The token file is read once per process. Refreshes take an in-process
+    lock and a file lock, then re-read the file first: if another worker has
+    already refreshed, its token is adopted instead of refreshing again, so
+    each refresh happens once per host. Refreshes, and the token file reads
+    and writes they involve, only run on the background refresher thread:
+    tokens close to expiry are refreshed behind the request, and a request
+    holding an expired or rejected token waits for the refresher.
+    """
+
+    def __init__(self, path: str = TOKEN_FILE, scopes: Optional[List[str]] = None,
+                 refresh_margin: int = REFRESH_MARGIN_SECONDS):
+        self.path = path
+        self.lock_path = path + ".lock"
+        # Web OAuth flows between /oauth/start and /callback, which may reach different workers
+        self.pending_path = path + ".pending.json"
+        self.scopes = scopes
+        self.refresh_margin = refresh_margin
+        self._creds: Optional[Credentials] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._background: Optional[threading.Thread] = None
+        # Access token the API answered 401 to; never served or adopted again
+        self._rejected: Optional[str] = None
+
+    def _read_file(self) -> Optional[Credentials]:
+        if not os.path.exists(self.path):
+            return None
+        return Credentials.from_authorized_user_file(self.path, self.scopes)
+
+    def _fresh(self, creds: Optional[Credentials]) -> bool:
+        if not creds or not creds.token or creds.token == self._rejected:
+            return False
+        left = _seconds_left(creds)
+        return left is None or left > self.refresh_margin
+
+    def _adopt(self, creds: Credentials):
+        """Take over a token from disk, updating in place so cached services keep working"""
+        if self._creds is None or self._creds.refresh_token != creds.refresh_token:
+            self._creds = creds
+        else:
+            self._creds.token = creds.token
+            self._creds.expiry = creds.expiry
+
+    def get(self) -> Optional[Credentials]:
+        """
+        Valid credentials, or None when there are none or they cannot be refreshed
+        (the caller then needs a new authorization).
+        """
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._creds = self._read_file()
+                    self._loaded = True
+
+        creds = self._creds
+        if creds is None:
+            return None
+        if self._fresh(creds):
+            return creds
+
+        left = _seconds_left(creds)
+        if creds.token and creds.token != self._rejected and left is not None and left > 0:
+            # Still usable: serve it now and refresh behind the request
+            self._refresh_in_background()
+            return creds
+
+        self._wait_for_refresh()
+        creds = self._creds
+        return creds if creds and creds.valid and creds.token != self._rejected else None
+
+    def reject(self, token: Optional[str]):
+        """The API refused this access token (401): refresh now unless another thread already did"""
+        with self._lock:
+            if self._creds and self._creds.token != token:
+                return
+            self._rejected = token
+        self._wait_for_refresh()
+
+    def _wait_for_refresh(self):
+        """Have the refresher run and wait for it within the request's deadline"""
+        thread = self._refresh_in_background()
+        timeout = remaining_time()
+        thread.join(timeout=None if timeout is None else max(timeout, 0))
+        if thread.is_alive():
+            raise DeadlineExceeded("Request deadline exceeded waiting for a token refresh")
+
+    def refresh(self):
+        """Refresh once across threads and processes, sharing the result through the token file"""
+        with self._lock, _file_lock(self.lock_path):
+            if self._fresh(self._creds):
+                return
+            on_disk = self._read_file()
+            if self._fresh(on_disk):
+                print("Using token refreshed by another worker")
+                self._adopt(on_disk)
+                return
+            creds = self._creds or on_disk
+            if not creds or not creds.refresh_token:
+                print("Token invalid and no refresh token available")
+                return
+            print("Refreshing expired token...")
+            creds.refresh(Request())
+            _atomic_write(self.path, creds.to_json())
+            self._creds = creds
+
+    def _refresh_in_background(self) -> threading.Thread:
+        with self._lock:
+            if not (self._background and self._background.is_alive()):
+                self._background = threading.Thread(target=self._refresh_quietly, daemon=True, name="token-refresh")
+                self._background.start()
+            return self._background
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Background token refresh failed: {e}")
+
+    def _read_pending(self) -> Dict[str, Tuple[float, Optional[str]]]:
+        try:
+            with open(self.pending_path) as f:
+                return {state: tuple(entry) for state, entry in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def add_pending(self, state: str, code_verifier: Optional[str]):
+        """Remember a started web flow for whichever worker receives its callback"""
+        now = time.time()
+        with self._lock, _file_lock(self.lock_path):
+            pending = {
+                key: entry for key, entry in self._read_pending().items()
+                if now - entry[0] <= OAUTH_STATE_TTL_SECONDS
+            }
+            pending[state] = (now, code_verifier)
+            _atomic_write(self.pending_path, json.dumps(pending))
+
+    def pop_pending(self, state: str) -> Optional[Tuple[float, Optional[str]]]:
+        """Take a started web flow, at most once; None when unknown or expired"""
+        with self._lock, _file_lock(self.lock_path):
+            pending = self._read_pending()
+            entry = pending.pop(state, None)
+            if entry is not None:
+                _atomic_write(self.pending_path, json.dumps(pending))
+        if entry is None or time.time() - entry[0] > OAUTH_STATE_TTL_SECONDS:
+            return None
+        return entry
+
+    def save(self, creds: Credentials):
+        """Store newly authorized credentials for this and every other worker"""
+        with self._lock, _file_lock(self.lock_path):
+            _atomic_write(self.path, creds.to_json())
+            self._creds = creds
+            self._loaded = True
+
+
+credential_store = CredentialStore(scopes=SCOPES)
+
+
+class CalendarAuthError(Exception):
+    """No usable Calendar credentials; raised immediately instead of waiting on a browser"""
+
+
+class StoreCredentials:
+    """
+    What AuthorizedHttp sees for store-managed tokens.
+
+    AuthorizedHttp refreshes its credentials itself before a request with an
+    expired token and after a 401. Here both go through the CredentialStore,
+    so they take its locks and never touch the token file on the request path.
+    """
+
+    def __init__(self, store: CredentialStore):
+        self.store = store
+        self._token: Optional[str] = None
+
+    def before_request(self, request, method, url, headers):
+        creds = self.store.get()
+        if creds is None:
+            raise CalendarAuthError("Google Calendar authorization expired. Visit /oauth/start to reconnect.")
+        self._token = creds.token
+        creds.apply(headers)
+
+    def refresh(self, request):
+        self.store.reject(self._token)
+
+
+def for_transport(creds):
+    """Credentials to give AuthorizedHttp: tokens from the credential store refresh through it"""
+    if creds is not None and creds is credential_store._creds:
+        return StoreCredentials(credential_store)
+    return creds
+
+
+class ServiceAccountProvider:
+    """
+    Service account key, impersonating a Workspace user through domain-wide
+    delegation (GOOGLE_SERVICE_ACCOUNT_FILE and GOOGLE_DELEGATED_USER).
+    """
+    name = "service_account"
+
+    def __init__(self):
+        self.key_file = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE")
+        self.subject = os.getenv("GOOGLE_DELEGATED_USER")
+        self._creds = None
+        self._lock = threading.Lock()
+
+    def configured(self) -> bool:
+        return bool(self.key_file)
+
+    def get(self):
+        with self._lock:
+            if self._creds is None:
+                creds = service_account.Credentials.from_service_account_file(self.key_file, scopes=SCOPES)
+                self._creds = creds.with_subject(self.subject) if self.subject else creds
+        return self._creds
+
+
+class EnvRefreshTokenProvider:
+    """Long-lived refresh token from the environment; access tokens live only in memory"""
+    name = "env"
+
+    def __init__(self):
+        self.refresh_token = os.getenv("GOOGLE_REFRESH_TOKEN")
+        self.client_id = os.getenv("GOOGLE_CLIENT_ID")
+        self.client_secret = os.getenv("GOOGLE_CLIENT_SECRET")
+        self._creds = None
+        self._lock = threading.Lock()
+
+    def configured(self) -> bool:
+        return bool(self.refresh_token and self.client_id and self.client_secret)
+
+    def get(self):
+        with self._lock:
+            if self._creds is None:
+                self._creds = Credentials(
+                    token=None,
+                    refresh_token=self.refresh_token,
+                    client_id=self.client_id,
+                    client_secret=self.client_secret,
+                    token_uri=TOKEN_URI,
+                    scopes=SCOPES
+                )
+            if not self._creds.valid:
+                self._creds.refresh(Request())
+        return self._creds
+
+
+class TokenFileProvider:
+    """Token provisioned ahead of time (web flow or `python -m backend.credentials`), shared via CredentialStore"""
+    name = "token_file"
+
+    def configured(self) -> bool:
+        return True
+
+    def get(self):
+        return credential_store.get()
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (ServiceAccountProvider(), EnvRefreshTokenProvider(), TokenFileProvider())
+}
+
+
+def get_credentials():
+    """
+    Credentials from the configured provider, never prompting.
+
+    With CREDENTIALS_PROVIDER=auto the first configured provider wins, in the
+    order service account, environment refresh token, token file.
+
+    Raises:
+        CalendarAuthError: No provider has usable credentials
+    """
+    if CREDENTIALS_PROVIDER == "auto":
+        candidates = [provider for provider in PROVIDERS.values() if provider.configured()]
+    elif CREDENTIALS_PROVIDER in PROVIDERS:
+        candidates = [PROVIDERS[CREDENTIALS_PROVIDER]]
+    else:
+        raise CalendarAuthError(f"Unknown CREDENTIALS_PROVIDER: {CREDENTIALS_PROVIDER}")
+
+    for provider in candidates:
+        try:
+            creds = provider.get()
+        except (RefreshError, OSError, ValueError) as e:
+            raise CalendarAuthError(f"{provider.name} credentials failed: {e}") from e
+        if creds:
+            return creds
+    raise CalendarAuthError("Google Calendar is not authorized. Visit /oauth/start to connect an account.")
+
+
+def _client_config() -> Dict:
+    if not os.path.exists(CREDENTIALS_FILE):
+        raise CalendarAuthError(f"{CREDENTIALS_FILE} not found. Please download it from Google Cloud Console.")
+    with open(CREDENTIALS_FILE) as f:
+        return json.load(f)
+
+
+def start_web_flow() -> str:
+    """
+    Begin a browser OAuth flow and return the Google consent URL.
+
+    Only the state and PKCE verifier are kept until /callback completes the
+    flow, in the credential store next to the token so any worker can finish
+    it; nothing blocks while the user is on Google's page.
+    """
+    flow = Flow.from_client_config(_client_config(), SCOPES, redirect_uri=OAUTH_REDIRECT_URI)
+    state = secrets.token_urlsafe(24)
+    url, _ = flow.authorization_url(access_type="offline", prompt="consent", state=state)
+    credential_store.add_pending(state, flow.code_verifier)
+    return url
+
+
+def finish_web_flow(state: str, code: str) -> Credentials:
+    """Exchange the authorization code from /callback and store the token for every worker"""
+    pending = credential_store.pop_pending(state)
+    if pending is None:
+        raise CalendarAuthError("Unknown or expired OAuth state. Start again at /oauth/start.")
+    flow = Flow.from_client_config(_client_config(), SCOPES, redirect_uri=OAUTH_REDIRECT_URI,
+                                   state=state, code_verifier=pending[1])
+    flow.fetch_token(code=code, timeout=UPSTREAM_TIMEOUT_SECONDS)
+    credential_store.save(flow.credentials)
+    return flow.credentials
+
+
+def authorize_local():
+    """Provision token.json from a terminal with the installed-app flow; run once, not from the server"""
+    flow = InstalledAppFlow.from_client_config(_client_config(), SCOPES)
+    creds = flow.run_local_server(
+        port=OAUTH_PORT,
+        authorization_prompt_message="Please visit this URL: {url}",
+        success_message="The auth flow is complete; you may close this window.",
+        open_browser=True
+    )
+    credential_store.save(creds)
+    print(f"Saved token to {credential_store.path}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["authorize"]:
+        authorize_local()
+    else:
+        print("Usage: python -m backend.credentials authorize")
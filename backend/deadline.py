@@ -0,0 +1,252 @@
+import os
+import time
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Optional, Callable, Any, Deque
+
+
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "25"))
+MAX_DEADLINE_SECONDS = float(os.getenv("MAX_DEADLINE_SECONDS", "60"))
+UPSTREAM_WORKERS = int(os.getenv("UPSTREAM_WORKERS", "32"))
+# Branches of one request run on their own pool so they never wait for a worker they would need themselves
+BRANCH_WORKERS = int(os.getenv("BRANCH_WORKERS", "16"))
+# Socket timeout for any single upstream call, also bounding abandoned calls after a deadline passes
+UPSTREAM_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "15"))
+# Hedged LLM calls: send a second request when the first is slower than the recent p95
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "3.0"))
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+
+class DeadlineExceeded(BaseException):
+    """
+    The request ran out of time.
+
+    A BaseException, like asyncio.CancelledError, so the broad
+    `except Exception` fallbacks in the flows do not turn a cancelled request
+    into an apology message and keep working on it.
+    """
+
+
+class Deadline:
+    """Absolute point in time by which a request must be answered"""
+    __slots__ = ("expires_at",)
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded("Request deadline exceeded")
+
+    def expire(self):
+        self.expires_at = time.monotonic()
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix="upstream")
+_branch_executor = ThreadPoolExecutor(max_workers=BRANCH_WORKERS, thread_name_prefix="branch")
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left for the current request, or None when it has no deadline"""
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline else None
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current request is out of time"""
+    deadline = _current_deadline.get()
+    if deadline:
+        deadline.check()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float] = None):
+    """
+    Give everything run inside this block a shared time budget.
+
+    A nested scope can only shorten the budget, never extend it.
+    """
+    seconds = min(seconds if seconds is not None else CHAT_DEADLINE_SECONDS, MAX_DEADLINE_SECONDS)
+    deadline = Deadline(seconds)
+    outer = _current_deadline.get()
+    if outer and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def _timeout(cap: Optional[float] = None) -> Optional[float]:
+    """Wait budget for one upstream call: the remaining request time, optionally capped"""
+    remaining = remaining_time()
+    if remaining is None:
+        return cap
+    if remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(remaining, cap) if cap is not None else remaining
+
+
+def _submit(fn: Callable, *args, **kwargs):
+    # The worker runs with the caller's context so the profile and deadline follow the call
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, fn, *args, **kwargs)
+
+
+def call_with_deadline(fn: Callable, *args, cap: Optional[float] = None, **kwargs) -> Any:
+    """
+    Run a blocking upstream call, giving up when the request deadline passes.
+
+    The call runs on a shared worker pool so the caller can stop waiting for
+    it; the worker itself is bounded by UPSTREAM_TIMEOUT_SECONDS on the socket.
+    Without a deadline in scope the call runs inline.
+    """
+    timeout = _timeout(cap)
+    if timeout is None:
+        return fn(*args, **kwargs)
+    future = _submit(fn, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        future.cancel()
+        raise DeadlineExceeded(f"{getattr(fn, '__qualname__', fn)} did not finish before the deadline")
+
+
+class Branch:
+    """
+    A call started in the background for the current request, e.g. a
+    speculative Calendar read while the LLM is still deciding what to read.
+
+    The branch runs with the caller's context under its own deadline, no
+    later than the caller's. cancel() expires that deadline: a branch that
+    has not started never runs, a running one stops with DeadlineExceeded at
+    its next upstream call. Threads cannot be interrupted, so a call already
+    on the wire finishes in the background, bounded by the socket timeout.
+    """
+
+    def __init__(self, fn: Callable, *args, **kwargs):
+        outer = _current_deadline.get()
+        self.deadline = Deadline(outer.remaining() if outer else MAX_DEADLINE_SECONDS)
+        self.name = getattr(fn, '__qualname__', str(fn))
+        context = contextvars.copy_context()
+        self.future = _branch_executor.submit(context.run, self._run, fn, args, kwargs)
+
+    def _run(self, fn: Callable, args, kwargs):
+        # Set inside the copied context, so only this branch sees its deadline
+        _current_deadline.set(self.deadline)
+        self.deadline.check()
+        return fn(*args, **kwargs)
+
+    def result(self) -> Any:
+        """Join the branch, waiting at most for the caller's remaining time"""
+        try:
+            return self.future.result(timeout=_timeout())
+        except FutureTimeout:
+            self.cancel()
+            raise DeadlineExceeded(f"{self.name} did not finish before the deadline")
+
+    def cancel(self):
+        self.future.cancel()
+        self.deadline.expire()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+
+def start_branch(fn: Callable, *args, **kwargs) -> Branch:
+    """Start fn concurrently with the caller; join with .result(), drop with .cancel()"""
+    return Branch(fn, *args, **kwargs)
+
+
+class LatencyTracker:
+    """Rolling window of call latencies, used to decide when to hedge"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.lock = Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self.lock:
+            if len(self.samples) < LATENCY_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+    def hedge_delay(self) -> float:
+        p95 = self.percentile(0.95)
+        if p95 is None:
+            return LLM_HEDGE_DEFAULT_DELAY
+        return max(p95, LLM_HEDGE_MIN_DELAY)
+
+
+def hedged_call(fn: Callable, *args, tracker: LatencyTracker, hedge: bool = LLM_HEDGE_ENABLED, **kwargs) -> Any:
+    """
+    Run an idempotent call under the request deadline, hedging slow attempts.
+
+    If the first attempt has not answered after the tracker's p95 latency, a
+    second identical attempt is started and whichever finishes first wins.
+    Only use this for calls that are safe to repeat, such as LLM prompts.
+    """
+    timeout = _timeout()
+
+    def timed():
+        started = time.monotonic()
+        result = fn(*args, **kwargs)
+        tracker.record(time.monotonic() - started)
+        return result
+
+    if not hedge:
+        return call_with_deadline(timed)
+
+    futures = [_submit(timed)]
+    started = time.monotonic()
+    delay = tracker.hedge_delay()
+    if timeout is not None:
+        delay = min(delay, timeout)
+    done, _ = wait(futures, timeout=delay)
+    if not done and (timeout is None or timeout - (time.monotonic() - started) > 0):
+        print(f"Hedging slow call after {delay:.2f}s")
+        futures.append(_submit(timed))
+
+    error = None
+    pending = set(futures)
+    while pending:
+        left = None if timeout is None else timeout - (time.monotonic() - started)
+        if left is not None and left <= 0:
+            break
+        done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = future.exception()
+    for future in pending:
+        future.cancel()
+    if error is not None and not pending:
+        raise error
+    raise DeadlineExceeded(f"{getattr(fn, '__qualname__', fn)} did not finish before the deadline")
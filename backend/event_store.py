@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from backend.events import Event
+
+
+# Unset means the store is off and every query goes to the Calendar API
+EVENT_STORE_PATH = os.getenv("EVENT_STORE_PATH")
+# An incremental sync runs before a read when the last one is older than this
+EVENT_STORE_MAX_AGE_SECONDS = float(os.getenv("EVENT_STORE_MAX_AGE_SECONDS", "30"))
+SYNC_FIELDS = "items(id,summary,status,start,end),nextPageToken,nextSyncToken"
+SYNC_PAGE_SIZE = 2500
+# A full sync mirrors this window around today rather than the whole calendar history
+EVENT_STORE_DAYS_BEHIND = int(os.getenv("EVENT_STORE_DAYS_BEHIND", "365"))
+EVENT_STORE_DAYS_AHEAD = int(os.getenv("EVENT_STORE_DAYS_AHEAD", "730"))
+DAY_SECONDS = 24 * 3600
+# All-day rows are stored widened by the largest UTC offset so they match in any timezone
+ALL_DAY_SLACK = 14 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    summary TEXT,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    start_json TEXT NOT NULL,
+    end_json TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, id)
+);
+CREATE INDEX IF NOT EXISTS events_range ON events (calendar_id, start, end);
+CREATE TABLE IF NOT EXISTS sync_state (
+    calendar_id TEXT PRIMARY KEY,
+    sync_token TEXT,
+    synced_at REAL NOT NULL DEFAULT 0,
+    max_span INTEGER NOT NULL DEFAULT 0,
+    window_start INTEGER NOT NULL DEFAULT 0,
+    window_end INTEGER NOT NULL DEFAULT 0
+);
+"""
+# Columns added after the first release, for mirrors created before them
+MIGRATIONS = [
+    "ALTER TABLE sync_state ADD COLUMN window_start INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE sync_state ADD COLUMN window_end INTEGER NOT NULL DEFAULT 0",
+]
+
+
+def _bounds(item: Dict[str, Any]) -> Tuple[int, int]:
+    """Epoch bounds used for indexing; all-day events are widened so they match in every zone"""
+    event = Event.from_api(item, timezone.utc)
+    if event.all_day:
+        return event.start - ALL_DAY_SLACK, event.end + ALL_DAY_SLACK
+    return event.start, event.end
+
+
+def _rfc3339(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+class EventStore:
+    """
+    On-disk mirror of a Google calendar in SQLite (WAL mode).
+
+    Overlap queries are range scans on (calendar_id, start, end): rows are
+    bounded below by the longest event seen, so a query touches only events
+    that can overlap the window. The sync token is persisted, so after a
+    restart the next read resumes with one incremental events.list call
+    instead of fetching everything again. A full sync covers a window
+    around today; reads outside it go to the API (see covers).
+    """
+
+    def __init__(self, path: str, max_age: float = EVENT_STORE_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        for statement in MIGRATIONS:
+            try:
+                conn.execute(statement)
+            except sqlite3.OperationalError:  # Column already there
+                pass
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run while a sync writes"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _state(self, calendar_id: str) -> Tuple[Optional[str], float, int]:
+        row = self._conn().execute(
+            "SELECT sync_token, synced_at, max_span FROM sync_state WHERE calendar_id = ?", (calendar_id,)
+        ).fetchone()
+        return row or (None, 0.0, 0)
+
+    def covers(self, calendar_id: str, start: int, end: int) -> bool:
+        """Whether [start, end) lies inside the window the mirror was synced for"""
+        window_start, window_end = self._conn().execute(
+            "SELECT window_start, window_end FROM sync_state WHERE calendar_id = ?", (calendar_id,)
+        ).fetchone() or (0, 0)
+        return window_start <= start and end <= window_end
+
+    def events_between(self, calendar_id: str, start: int, end: int, tz) -> List[Event]:
+        """Events overlapping [start, end) epoch seconds, ordered by start"""
+        max_span = self._state(calendar_id)[2]
+        rows = self._conn().execute(
+            "SELECT id, summary, start_json, end_json FROM events "
+            "WHERE calendar_id = ? AND start >= ? AND start < ? AND end > ? ORDER BY start",
+            (calendar_id, start - max_span, end, start)
+        ).fetchall()
+        events = []
+        for event_id, summary, start_json, end_json in rows:
+            event = Event.from_api(
+                {'id': event_id, 'summary': summary, 'start': json.loads(start_json), 'end': json.loads(end_json)}, tz
+            )
+            if event.overlaps(start, end):
+                events.append(event)
+        events.sort(key=lambda e: e.start)
+        return events
+
+    def _apply_page(self, calendar_id: str, items: List[Dict[str, Any]]):
+        conn = self._conn()
+        max_span = 0
+        with conn:
+            for item in items:
+                if item.get('status') == 'cancelled':
+                    conn.execute("DELETE FROM events WHERE calendar_id = ? AND id = ?", (calendar_id, item['id']))
+                    continue
+                start, end = _bounds(item)
+                max_span = max(max_span, end - start)
+                conn.execute(
+                    "INSERT OR REPLACE INTO events (calendar_id, id, summary, start, end, start_json, end_json) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (calendar_id, item['id'], item.get('summary', 'No title'), start, end,
+                     json.dumps(item['start']), json.dumps(item['end']))
+                )
+            conn.execute(
+                "INSERT INTO sync_state (calendar_id, max_span) VALUES (?, ?) "
+                "ON CONFLICT(calendar_id) DO UPDATE SET max_span = MAX(max_span, excluded.max_span)",
+                (calendar_id, max_span)
+            )
+
+    def _sync_pages(self, service, calendar_id: str, sync_token: Optional[str]) -> int:
+        # Imported here: calendar_utils imports this module. Its execute also drops the
+        # thread's client when a call is abandoned at the deadline.
+        from backend.calendar_utils import execute
+
+        changed = 0
+        page_token = None
+        window = None
+        if not sync_token:
+            # Google refuses timeMin/timeMax together with a sync token; the token remembers the window
+            today = int(time.time()) // DAY_SECONDS * DAY_SECONDS
+            window = (today - EVENT_STORE_DAYS_BEHIND * DAY_SECONDS, today + EVENT_STORE_DAYS_AHEAD * DAY_SECONDS)
+        while True:
+            params = {
+                'calendarId': calendar_id,
+                'singleEvents': True,
+                'maxResults': SYNC_PAGE_SIZE,
+                'pageToken': page_token,
+                'fields': SYNC_FIELDS
+            }
+            if sync_token:
+                params['syncToken'] = sync_token
+            else:
+                params['timeMin'] = _rfc3339(window[0])
+                params['timeMax'] = _rfc3339(window[1])
+            result = execute(service.events().list(**params))
+            items = result.get('items', [])
+            self._apply_page(calendar_id, items)
+            changed += len(items)
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                with self._conn() as conn:
+                    conn.execute(
+                        "UPDATE sync_state SET sync_token = ?, synced_at = ? WHERE calendar_id = ?",
+                        (result.get('nextSyncToken'), time.time(), calendar_id)
+                    )
+                    if window:
+                        conn.execute(
+                            "UPDATE sync_state SET window_start = ?, window_end = ? WHERE calendar_id = ?",
+                            (window[0], window[1], calendar_id)
+                        )
+                return changed
+
+    def _stale(self, calendar_id: str) -> bool:
+        return time.time() - self._state(calendar_id)[1] > self.max_age
+
+    def _window_ending(self, calendar_id: str) -> bool:
+        """The synced window no longer reaches half its span ahead of today"""
+        row = self._conn().execute(
+            "SELECT window_end FROM sync_state WHERE calendar_id = ?", (calendar_id,)
+        ).fetchone()
+        return bool(row) and row[0] - time.time() < EVENT_STORE_DAYS_AHEAD * DAY_SECONDS / 2
+
+    def _reset(self, calendar_id: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+            conn.execute("DELETE FROM sync_state WHERE calendar_id = ?", (calendar_id,))
+
+    def sync(self, service, calendar_id: str = 'primary', only_if_stale: bool = False) -> int:
+        """
+        Bring the mirror up to date: incremental with the stored sync token,
+        full when there is none, Google has expired it (410 Gone) or the
+        synced window is running out.
+
+        Args:
+            only_if_stale: Skip the sync if another thread completed one while this one waited
+
+        Returns:
+            int: Number of changed events
+        """
+        with self._sync_lock:
+            if only_if_stale and not self._stale(calendar_id):
+                return 0
+            sync_token = self._state(calendar_id)[0]
+            if sync_token and self._window_ending(calendar_id):
+                print("Event store window is running out, running a full sync...")
+                self._reset(calendar_id)
+                sync_token = None
+            try:
+                changed = self._sync_pages(service, calendar_id, sync_token)
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                print("Sync token expired, running a full sync...")
+                self._reset(calendar_id)
+                changed = self._sync_pages(service, calendar_id, None)
+            print(f"Event store sync for {calendar_id}: {changed} changes")
+            return changed
+
+    def sync_if_stale(self, service, calendar_id: str = 'primary'):
+        if self._stale(calendar_id):
+            self.sync(service, calendar_id, only_if_stale=True)
+
+    def mark_stale(self, calendar_id: str = 'primary'):
+        """Force a sync before the next read, e.g. after this process wrote to the calendar"""
+        with self._conn() as conn:
+            conn.execute("UPDATE sync_state SET synced_at = 0 WHERE calendar_id = ?", (calendar_id,))
+
+
+event_store = EventStore(EVENT_STORE_PATH) if EVENT_STORE_PATH else None
@@ -0,0 +1,164 @@
+from datetime import datetime, date, time
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+
+
+def _local_midnight(day: date, tz) -> datetime:
+    """Midnight of a calendar day in the given timezone"""
+    return datetime.combine(day, time.min, tzinfo=tz)
+
+
+def _to_epoch(value: Dict[str, str], tz) -> int:
+    """Convert a Google start/end object ({'dateTime': ...} or {'date': ...}) to UTC epoch seconds"""
+    if 'dateTime' in value:
+        dt = datetime.fromisoformat(value['dateTime'])
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=tz)
+        return int(dt.timestamp())
+    return int(_local_midnight(date.fromisoformat(value['date']), tz).timestamp())
+
+
+class Event:
+    """
+    Compact, pre-parsed calendar event.
+
+    Start and end are UTC epoch seconds, parsed once when the event is read
+    from the API. All-day events cover local midnight to local midnight of
+    their (exclusive) end date, so slot math treats them like any other busy
+    block.
+    """
+    __slots__ = ("id", "summary", "start", "end", "all_day")
+
+    def __init__(self, id: str, summary: str, start: int, end: int, all_day: bool = False):
+        self.id = id
+        self.summary = summary
+        self.start = start
+        self.end = end
+        self.all_day = all_day
+
+    @classmethod
+    def from_api(cls, item: Dict[str, Any], tz) -> "Event":
+        """Build an Event from a Google Calendar event resource"""
+        return cls(
+            item.get('id', ''),
+            item.get('summary', 'No title'),
+            _to_epoch(item['start'], tz),
+            _to_epoch(item['end'], tz),
+            'dateTime' not in item['start']
+        )
+
+    def start_dt(self, tz) -> datetime:
+        return datetime.fromtimestamp(self.start, tz)
+
+    def end_dt(self, tz) -> datetime:
+        return datetime.fromtimestamp(self.end, tz)
+
+    def overlaps(self, start: int, end: int) -> bool:
+        return self.start < end and self.end > start
+
+    def time_range_text(self, tz) -> str:
+        """Human readable time range, e.g. '9:00 AM - 10:00 AM' or 'All day'"""
+        if self.all_day:
+            return "All day"
+        return f"{format_time(self.start_dt(tz))} - {format_time(self.end_dt(tz))}"
+
+    def to_dict(self, tz) -> Dict[str, Any]:
+        """JSON friendly representation in the given timezone"""
+        return {
+            "id": self.id,
+            "summary": self.summary,
+            "start": self.start_dt(tz).isoformat(),
+            "end": self.end_dt(tz).isoformat(),
+            "all_day": self.all_day
+        }
+
+    def __repr__(self) -> str:
+        return f"Event({self.id!r}, {self.summary!r}, {self.start}, {self.end}, all_day={self.all_day})"
+
+
+class BusyInterval:
+    """Busy block in UTC epoch seconds, as returned by the freebusy API"""
+    __slots__ = ("start", "end")
+
+    def __init__(self, start: int, end: int):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_api(cls, busy: Dict[str, str]) -> "BusyInterval":
+        return cls(
+            int(datetime.fromisoformat(busy['start']).timestamp()),
+            int(datetime.fromisoformat(busy['end']).timestamp())
+        )
+
+    def overlaps(self, start: int, end: int) -> bool:
+        return self.start < end and self.end > start
+
+    def __repr__(self) -> str:
+        return f"BusyInterval({self.start}, {self.end})"
+
+
+def parse_events(items: Iterable[Dict[str, Any]], tz) -> List[Event]:
+    """Parse raw API events into Event objects, skipping cancelled ones"""
+    return [Event.from_api(item, tz) for item in items if item.get('status') != 'cancelled']
+
+
+def parse_busy(busy_times: Iterable[Dict[str, str]]) -> List[BusyInterval]:
+    """Parse freebusy 'busy' entries into intervals sorted by start"""
+    return sorted((BusyInterval.from_api(busy) for busy in busy_times), key=lambda b: b.start)
+
+
+def free_intervals(busy: Iterable, window_start: int, window_end: int, min_seconds: int = 0) -> List[tuple]:
+    """
+    Subtract busy blocks from a window.
+
+    Args:
+        busy: Events or BusyIntervals (anything with epoch start/end), in any order
+        window_start: Window start in epoch seconds
+        window_end: Window end in epoch seconds
+        min_seconds: Drop free gaps shorter than this
+
+    Returns:
+        list: (start, end) epoch pairs of free time, in order
+    """
+    free = []
+    cursor = window_start
+    for block in sorted(busy, key=lambda b: b.start):
+        if block.end <= cursor or block.start >= window_end:
+            continue
+        if block.start > cursor and block.start - cursor >= min_seconds:
+            free.append((cursor, block.start))
+        cursor = max(cursor, block.end)
+        if cursor >= window_end:
+            break
+    if window_end > cursor and window_end - cursor >= min_seconds:
+        free.append((cursor, window_end))
+    return free
+
+
+def sweep_conflicts(candidates: Iterable[Tuple[int, int]], busy: List) -> Iterator[Tuple[int, int, bool]]:
+    """
+    Flag which candidate intervals overlap a busy block.
+
+    Candidates must come in increasing start order and busy must be sorted by
+    start, so the whole check is one forward pass over the busy list.
+
+    Yields:
+        tuple: (start, end, has_conflict) for every candidate
+    """
+    busy_index = 0
+    for start, end in candidates:
+        while busy_index < len(busy) and busy[busy_index].end <= start:
+            busy_index += 1
+        conflict = False
+        i = busy_index
+        while i < len(busy) and busy[i].start < end:
+            if busy[i].overlaps(start, end):
+                conflict = True
+                break
+            i += 1
+        yield start, end, conflict
+
+
+def format_time(dt: datetime) -> str:
+    """'9:00 AM' style time without a leading zero"""
+    return dt.strftime('%I:%M %p').lstrip('0')
@@ -0,0 +1,218 @@
+import re
+import uuid
+from datetime import datetime, date, timedelta, timezone
+from typing import Iterable, Iterator, Dict, Any, List, Tuple, Optional
+
+from backend.profiles import get_zone
+
+
+PRODID = "-//ScheduleAI//Calendar Export//EN"
+MAX_LINE_OCTETS = 75
+_DURATION_PATTERN = re.compile(
+    r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$'
+)
+
+
+def _unfold(lines: Iterable[str]) -> Iterator[str]:
+    """Join RFC 5545 folded lines (continuations start with a space or tab), one line at a time"""
+    current = None
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def _split_property(line: str) -> Tuple[str, Dict[str, str], str]:
+    """'DTSTART;TZID=Europe/Berlin:20240101T090000' -> ('DTSTART', {'TZID': 'Europe/Berlin'}, '20240101T090000')"""
+    head, _, value = line.partition(":")
+    name, *params = head.split(";")
+    parameters = {}
+    for param in params:
+        key, _, param_value = param.partition("=")
+        parameters[key.upper()] = param_value.strip('"')
+    return name.upper(), parameters, value
+
+
+def _unescape(text: str) -> str:
+    return (text.replace("\\n", "\n").replace("\\N", "\n")
+            .replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\"))
+
+
+def _escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _parse_duration(value: str) -> Optional[timedelta]:
+    match = _DURATION_PATTERN.match(value.strip())
+    if not match:
+        return None
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == "-" else duration
+
+
+def _parse_time(value: str, params: Dict[str, str], default_tz: str):
+    """
+    ICS date or date-time to (value, timeZone).
+
+    value is a date for VALUE=DATE and an aware datetime otherwise; floating
+    times are read in default_tz.
+    """
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.strptime(value[:8], "%Y%m%d").date(), None
+    if value.endswith("Z"):
+        return datetime.strptime(value[:-1], "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc), "UTC"
+    zone = params.get("TZID", default_tz)
+    return datetime.strptime(value, "%Y%m%dT%H%M%S").replace(tzinfo=get_zone(zone)), zone
+
+
+def _to_api_time(value, zone: Optional[str]) -> Dict[str, str]:
+    if isinstance(value, datetime):
+        return {"dateTime": value.isoformat(), "timeZone": zone}
+    return {"date": value.isoformat()}
+
+
+def _build_event(props: Dict[str, Tuple[Dict[str, str], str]], extra: List[str], default_tz: str) -> Dict[str, Any]:
+    """Google event resource from the properties of one VEVENT"""
+    params, value = props["DTSTART"]
+    start, zone = _parse_time(value, params, default_tz)
+    if "DTEND" in props:
+        end_params, end_value = props["DTEND"]
+        end, end_zone = _parse_time(end_value, end_params, default_tz)
+    else:
+        duration = _parse_duration(props["DURATION"][1]) if "DURATION" in props else None
+        if duration is None:
+            duration = timedelta(days=1) if not isinstance(start, datetime) else timedelta(0)
+        end, end_zone = start + duration, zone
+
+    event = {
+        "iCalUID": props["UID"][1] if "UID" in props else f"{uuid.uuid4()}@scheduleai",
+        "summary": _unescape(props["SUMMARY"][1]) if "SUMMARY" in props else "No title",
+        "start": _to_api_time(start, zone),
+        "end": _to_api_time(end, end_zone),
+    }
+    for name, field in (("DESCRIPTION", "description"), ("LOCATION", "location")):
+        if name in props:
+            event[field] = _unescape(props[name][1])
+    if "STATUS" in props and props["STATUS"][1].upper() in ("CONFIRMED", "TENTATIVE", "CANCELLED"):
+        event["status"] = props["STATUS"][1].lower()
+    if extra:
+        event["recurrence"] = extra
+    return event
+
+
+def iter_ics_events(lines: Iterable[str], default_tz: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream VEVENTs out of an iCalendar file as Google event resources.
+
+    Works on any line iterable (an open file, an upload), holding only the
+    event being parsed. Nested components such as VALARM are skipped.
+    Events that cannot be parsed are yielded as {"error": ..., "uid": ...}
+    so the caller can report them without stopping the import.
+
+    Args:
+        lines: iCalendar text, line by line
+        default_tz: Zone for floating (zone-less) times
+
+    Yields:
+        dict: Event resources ready for events.import
+    """
+    props: Optional[Dict[str, Tuple[Dict[str, str], str]]] = None
+    extra: List[str] = []
+    depth = 0
+    for line in _unfold(lines):
+        if not line:
+            continue
+        name, params, value = _split_property(line)
+        if name == "BEGIN":
+            if value.upper() == "VEVENT" and props is None:
+                props, extra, depth = {}, [], 0
+            elif props is not None:
+                depth += 1
+            continue
+        if name == "END":
+            if props is not None and depth:
+                depth -= 1
+            elif props is not None and value.upper() == "VEVENT":
+                try:
+                    if "RECURRENCE-ID" in props:
+                        raise ValueError("modified occurrences of a series are not imported")
+                    yield _build_event(props, extra, default_tz)
+                except (KeyError, ValueError) as e:
+                    yield {"error": f"{type(e).__name__}: {e}", "uid": props.get("UID", ({}, None))[1]}
+                props = None
+            continue
+        if props is None or depth:
+            continue
+        if name in ("RRULE", "EXDATE", "RDATE", "EXRULE"):
+            extra.append(line)
+        else:
+            props.setdefault(name, (params, value))
+
+
+def _fold(line: str) -> str:
+    """Fold a content line at 75 octets without splitting a UTF-8 character"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= MAX_LINE_OCTETS:
+        return line + "\r\n"
+    parts = []
+    limit = MAX_LINE_OCTETS
+    while encoded:
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = MAX_LINE_OCTETS - 1
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _format_time(name: str, value: Dict[str, str]) -> str:
+    if "date" in value:
+        return f"{name};VALUE=DATE:{value['date'].replace('-', '')}"
+    dt = datetime.fromisoformat(value["dateTime"])
+    zone = value.get("timeZone")
+    if zone and zone != "UTC":
+        # Keep the zone so recurring series stay at the same wall-clock time across DST
+        local = dt.astimezone(get_zone(zone)) if dt.tzinfo else dt
+        return f"{name};TZID={zone}:{local.strftime('%Y%m%dT%H%M%S')}"
+    if dt.tzinfo is None:
+        return f"{name}:{dt.strftime('%Y%m%dT%H%M%S')}"
+    return f"{name}:{dt.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+
+
+def calendar_header() -> str:
+    return _fold("BEGIN:VCALENDAR") + _fold("VERSION:2.0") + _fold(f"PRODID:{PRODID}") + _fold("CALSCALE:GREGORIAN")
+
+
+def calendar_footer() -> str:
+    return _fold("END:VCALENDAR")
+
+
+def event_to_ics(item: Dict[str, Any]) -> str:
+    """One Google event resource as a folded VEVENT block"""
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{item.get('iCalUID') or item.get('id', uuid.uuid4())}",
+        f"DTSTAMP:{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}",
+        _format_time("DTSTART", item["start"]),
+        _format_time("DTEND", item["end"]),
+        f"SUMMARY:{_escape(item.get('summary', 'No title'))}",
+    ]
+    if item.get("description"):
+        lines.append(f"DESCRIPTION:{_escape(item['description'])}")
+    if item.get("location"):
+        lines.append(f"LOCATION:{_escape(item['location'])}")
+    if item.get("status"):
+        lines.append(f"STATUS:{item['status'].upper()}")
+    lines.extend(item.get("recurrence", []))
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
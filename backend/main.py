@@ -1,4 +1,11 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import uuid
+from contextlib import asynccontextmanager
+import io
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse, FileResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 from datetime import datetime, date, time, timedelta
@@ -6,12 +13,48 @@ from backend.calendar_utils import (
     suggest_available_slots,
     book_slot,
     check_calendar_events,
-    get_calendar_service,
-    extract_date_time
+    get_agenda,
+    get_view_range,
+    summarize_agenda,
+    find_best_slots,
+    book_recurring,
+    extract_date_time,
+    import_events,
+    export_ics,
+    get_events_in_range,
+    cancel_events,
+    reschedule_events,
+    find_next_available,
+    MAX_SEARCH_DAYS
 )
-from backend.agent import process_user_message
+from backend.agent import process_user_message, get_routing_stats, admission_priority
+from backend.admission import admission, Overloaded
+from backend.profiles import current_profile, set_profile, use_profile
+from backend.sessions import use_session
+from backend.push import hub
+from backend.recurrence import parse_recurrence, cap_occurrences, MAX_OCCURRENCES
+from backend.ics import iter_ics_events
+from backend.deadline import deadline_scope, DeadlineExceeded
+from backend.credentials import start_web_flow, finish_web_flow, CalendarAuthError
+from backend.profiling import (
+    PROFILING_ENABLED,
+    profiled,
+    profiling_middleware,
+    list_profiles,
+    profile_path,
+    profile_summary
+)
+from backend.warmup import warm_up, is_ready, warmup_status
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm parsers, the Calendar client and Gemini in the background; /readyz reports when done"""
+    warmup = asyncio.get_running_loop().run_in_executor(None, warm_up)
+    yield
+    if not warmup.done():
+        warmup.cancel()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -24,29 +67,155 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# Bulk transfers that legitimately outlast a chat turn: a partial import has already written
+# events and a cut-off export is a truncated file, so they run without a request deadline.
+# Each Calendar call they make is still bounded by UPSTREAM_TIMEOUT_SECONDS.
+UNBOUNDED_PATHS = {"/calendar/import", "/calendar/export"}
+
+class DeadlineMiddleware:
+    """
+    Give each request one time budget shared by every Calendar and Gemini call it makes.
+
+    Plain ASGI rather than @app.middleware: DeadlineExceeded is a
+    BaseException, which the function-style middleware would wrap in an
+    exception group instead of letting it reach this handler.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNBOUNDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        response_started = False
+
+        async def send_tracking(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        with deadline_scope(_requested_deadline(headers.get(b"x-request-timeout"))):
+            try:
+                await self.app(scope, receive, send_tracking)
+            except DeadlineExceeded as e:
+                print(f"Deadline exceeded: {e}")
+                if response_started:
+                    raise
+                await JSONResponse(status_code=504, content={"detail": "Request timed out"})(scope, receive, send)
+
+def _requested_deadline(value) -> Optional[float]:
+    """Client supplied budget in seconds (X-Request-Timeout header or socket frame), if any"""
+    try:
+        return float(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+app.add_middleware(DeadlineMiddleware)
+
+@app.middleware("http")
+async def user_profile_middleware(request: Request, call_next):
+    """
+    Run each request with the caller's timezone and working hours (X-User-Id
+    header) and conversation state (X-Session-Id header)
+    """
+    with use_profile(request.headers.get("X-User-Id")), use_session(request.headers.get("X-Session-Id")):
+        return await call_next(request)
+
+if PROFILING_ENABLED:
+    # Only registered when profiling is on, so normal requests pay nothing for it
+    app.middleware("http")(profiling_middleware)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load fast: the client learns at once when to come back"""
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+def _client_key(user_id: Optional[str], session_id: Optional[str], host: Optional[str]) -> str:
+    """Who a turn counts against for the per-client cap"""
+    return user_id or session_id or host or "anonymous"
+
+def _request_client(request: Request) -> str:
+    return _client_key(request.headers.get("X-User-Id"), request.headers.get("X-Session-Id"),
+                       request.client.host if request.client else None)
+
 # Request models
 class BookingRequest(BaseModel):
     date: str
     time: str
     summary: Optional[str] = "Meeting"
 
+class RecurringBookingRequest(BaseModel):
+    date: str
+    time: str
+    duration_minutes: int = 60
+    rrule: Optional[str] = None
+    recurrence: Optional[str] = None
+    summary: Optional[str] = "Meeting"
+    skip_conflicts: bool = False
+
 class AvailabilityRequest(BaseModel):
     date: str
     time: Optional[str] = None
+    duration_minutes: int = 30
+    top: Optional[int] = None
+    days: int = 1
 
 class EventsRequest(BaseModel):
     date: str
 
+class AgendaRequest(BaseModel):
+    date: str
+    end_date: Optional[str] = None
+    view: str = "week"
+    summary: bool = False
+
+class CancelRequest(BaseModel):
+    event_ids: List[str] = []
+    date: Optional[str] = None
+    calendar_id: str = "primary"
+
+class EventMove(BaseModel):
+    id: str
+    start: datetime
+    end: datetime
+
+class RescheduleRequest(BaseModel):
+    moves: List[EventMove]
+    calendar_id: str = "primary"
+
 class ChatRequest(BaseModel):
     message: str
 
+class ProfileRequest(BaseModel):
+    timezone: str
+    work_start: str = "09:00"
+    work_end: str = "18:00"
+
 @app.get("/")
 async def root():
     """Root endpoint"""
     return {"message": "TailorTalk Calendar API"}
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: only send traffic here once warmup has finished"""
+    status = warmup_status()
+    if not is_ready():
+        return JSONResponse(status_code=503, content=status)
+    return status
+
 @app.post("/test/book")
-async def test_booking(request: BookingRequest):
+@profiled
+def test_booking(request: BookingRequest):
     """Test booking endpoint for Google Calendar"""
     try:
         print(f"Booking request received: {request.dict()}")
@@ -77,8 +246,53 @@ async def test_booking(request: BookingRequest):
         print(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/test/book/recurring")
+@profiled
+def test_recurring_booking(request: RecurringBookingRequest):
+    """Book a recurring meeting from an RRULE or a phrase like "every Tuesday for 3 months" """
+    try:
+        print(f"Recurring booking request received: {request.dict()}")
+        
+        dt, _ = extract_date_time(f"{request.date} {request.time}")
+        if not dt:
+            raise HTTPException(status_code=400, detail="Invalid date/time format")
+        
+        rule = request.rrule or (parse_recurrence(request.recurrence, dt) if request.recurrence else None)
+        if not rule:
+            raise HTTPException(status_code=400, detail="Provide an rrule or a recurrence description")
+        if "COUNT=" not in rule.upper() and "UNTIL=" not in rule.upper():
+            raise HTTPException(status_code=400, detail="Recurrence must be bounded with COUNT or UNTIL")
+        try:
+            capped = cap_occurrences(rule, current_profile().localize(dt))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid rrule: {e}")
+        if capped != rule.removeprefix("RRULE:"):
+            # Refuse rather than book a shorter series than the client asked for
+            raise HTTPException(status_code=400, detail=f"Recurrence must not exceed {MAX_OCCURRENCES} occurrences")
+        
+        result = book_recurring(dt, dt + timedelta(minutes=request.duration_minutes), rule, request.summary,
+                                skip_conflicts=request.skip_conflicts)
+        if not result["link"]:
+            raise HTTPException(status_code=500, detail="Failed to book recurring meeting")
+        
+        return {
+            "success": True,
+            "booking_url": result["link"],
+            "rrule": result["rule"],
+            "occurrences": result["occurrences"],
+            "conflicts": [{"start": start.isoformat(), "end": end.isoformat()} for start, end in result["conflicts"]]
+        }
+        
+    except HTTPException as e:
+        print(f"HTTP error: {e.detail}")
+        raise
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/test/availability")
-async def test_availability(request: AvailabilityRequest):
+@profiled
+def test_availability(request: AvailabilityRequest):
     """Test availability endpoint for Google Calendar"""
     try:
         print(f"Availability request received: {request.dict()}")
@@ -86,13 +300,23 @@ async def test_availability(request: AvailabilityRequest):
         dt, _ = extract_date_time(f"{request.date} {request.time}" if request.time else request.date)
         if not dt:
             raise HTTPException(status_code=400, detail="Invalid date/time format")
+        if request.top is not None and request.top < 1:
+            raise HTTPException(status_code=400, detail="top must be at least 1")
+        if not 1 <= request.days <= MAX_SEARCH_DAYS:
+            raise HTTPException(status_code=400, detail=f"days must be between 1 and {MAX_SEARCH_DAYS}")
             
-        slots = suggest_available_slots(
-            dt.date(),
-            duration_minutes=30,
-            start_hour=9,
-            end_hour=18
-        )
+        if request.top:
+            slots = find_best_slots(
+                dt.date(),
+                days=request.days,
+                duration_minutes=request.duration_minutes,
+                k=request.top
+            )
+        else:
+            slots = suggest_available_slots(
+                dt.date(),
+                duration_minutes=request.duration_minutes
+            )
         
         print(f"Found {len(slots)} available slots")
         return {"success": True, "available_slots": slots}
@@ -105,7 +329,8 @@ async def test_availability(request: AvailabilityRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/test/events")
-async def test_events(request: EventsRequest):
+@profiled
+def test_events(request: EventsRequest):
     """Test events endpoint for Google Calendar"""
     try:
         print(f"Events request received: {request.dict()}")
@@ -116,7 +341,8 @@ async def test_events(request: EventsRequest):
             
         events = check_calendar_events(dt.date())
         print(f"Found {len(events)} events")
-        return {"success": True, "events": events}
+        tz = current_profile().tz
+        return {"success": True, "events": [event.to_dict(tz) for event in events]}
         
     except HTTPException as e:
         print(f"HTTP error: {e.detail}")
@@ -125,26 +351,328 @@ async def test_events(request: EventsRequest):
         print(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/test/agenda")
+@profiled
+def test_agenda(request: AgendaRequest):
+    """Agenda endpoint for a day, week, month or explicit date range"""
+    try:
+        print(f"Agenda request received: {request.dict()}")
+
+        dt, _ = extract_date_time(request.date)
+        if not dt:
+            raise HTTPException(status_code=400, detail="Invalid date format")
+
+        if request.end_date:
+            end_dt, _ = extract_date_time(request.end_date)
+            if not end_dt or end_dt.date() < dt.date():
+                raise HTTPException(status_code=400, detail="Invalid end date")
+            start_date, end_date = dt.date(), end_dt.date()
+        else:
+            try:
+                start_date, end_date = get_view_range(dt.date(), request.view)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        agenda = get_agenda(start_date, end_date)
+        tz = current_profile().tz
+        if request.summary:
+            return {"success": True, "start_date": start_date.isoformat(), "end_date": end_date.isoformat(),
+                    "days": summarize_agenda(agenda)}
+
+        return {
+            "success": True,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "days": {day.isoformat(): [event.to_dict(tz) for event in events] for day, events in agenda.items()}
+        }
+
+    except HTTPException as e:
+        print(f"HTTP error: {e.detail}")
+        raise
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/calendar/import")
+def calendar_import(file: UploadFile = File(...), calendar_id: str = "primary"):
+    """Import an uploaded .ics file with batched Calendar writes"""
+    try:
+        print(f"Importing {file.filename} into {calendar_id}")
+        # The upload is spooled to disk when large and read line by line from there
+        lines = io.TextIOWrapper(file.file, encoding="utf-8", errors="replace", newline="")
+        result = import_events(iter_ics_events(lines, current_profile().timezone), calendar_id=calendar_id)
+        return {"success": result["failed"] == 0, **result}
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/calendar/export")
+def calendar_export(start: Optional[str] = None, end: Optional[str] = None, calendar_id: str = "primary"):
+    """Stream a date range (default: a year either side of today) as an .ics file"""
+    today = current_profile().now().date()
+    try:
+        start_date = date.fromisoformat(start) if start else today - timedelta(days=365)
+        end_date = date.fromisoformat(end) if end else today + timedelta(days=365)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    return StreamingResponse(
+        export_ics(start_date, end_date, calendar_id=calendar_id),
+        media_type="text/calendar; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{calendar_id}.ics"'}
+    )
+
+@app.get("/calendar/next-available")
+def calendar_next_available(duration_minutes: int = 60, after: Optional[datetime] = None):
+    """Earliest free slot of the given length inside working hours, searching from now or `after`"""
+    if not 0 < duration_minutes <= 24 * 60:
+        raise HTTPException(status_code=400, detail="duration_minutes must be between 1 and 1440")
+    try:
+        slot = find_next_available(duration_minutes, after=after)
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not slot:
+        return {"found": False}
+    start, end = slot
+    return {"found": True, "start": start.isoformat(), "end": end.isoformat()}
+
+@app.post("/calendar/cancel")
+def calendar_cancel(request: CancelRequest):
+    """Cancel events by id, or every event on a date of the primary calendar, in batched requests"""
+    event_ids = list(request.event_ids)
+    if request.date:
+        if request.calendar_id != "primary":
+            raise HTTPException(status_code=400, detail="date only applies to the primary calendar")
+        try:
+            day = date.fromisoformat(request.date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+        event_ids += [event.id for event in get_events_in_range(day, day) if event.id not in event_ids]
+    if not event_ids:
+        return {"success": True, "cancelled": [], "failed": [], "batches": 0}
+    try:
+        result = cancel_events(event_ids, calendar_id=request.calendar_id)
+        return {"success": not result["failed"], **result}
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/calendar/reschedule")
+def calendar_reschedule(request: RescheduleRequest):
+    """Move events to new start and end times with batched patches"""
+    for move in request.moves:
+        if move.end <= move.start:
+            raise HTTPException(status_code=400, detail=f"{move.id}: end must be after start")
+    try:
+        result = reschedule_events([(move.id, move.start, move.end) for move in request.moves],
+                                   calendar_id=request.calendar_id)
+        return {"success": not result["failed"], **result}
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     """Handle chat messages from frontend"""
+    async with admission.admit(_request_client(http_request), admission_priority(request.message)):
+        try:
+            # Off the event loop; the deadline and profile context travel with the call
+            response = await run_in_threadpool(process_user_message, request.message)
+            return {"response": response}
+        except Exception as e:
+            print(f"Error in chat endpoint: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    """
+    Chat reply as a plain text stream.
+
+    Small talk arrives token by token from Gemini; calendar turns arrive as
+    one chunk once the action is done. Admission is decided before the
+    response starts, so an overloaded server still answers 429/503; the
+    slot is held until the turn itself finishes, however the stream is
+    consumed.
+    """
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+    done = object()
+    admitted = admission.admit(_request_client(http_request), admission_priority(request.message))
+    await admitted.__aenter__()
+
+    def on_token(text: str):
+        loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+    async def run():
+        try:
+            return await run_in_threadpool(process_user_message, request.message, on_token)
+        finally:
+            chunks.put_nowait(done)
+            await admitted.__aexit__(None, None, None)
+
+    task = asyncio.create_task(run())
+
+    async def body():
+        sent = []
+        while (chunk := await chunks.get()) is not done:
+            sent.append(chunk)
+            yield chunk
+        try:
+            reply = await task
+        except DeadlineExceeded:
+            reply = "Sorry, that took too long. Please try again."
+        streamed = "".join(sent).strip()
+        # Calendar turns, and anything that failed part way, send the reply itself
+        if not streamed:
+            yield reply
+        elif reply != streamed:
+            yield "\n\n" + reply
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket, session_id: Optional[str] = None, user_id: Optional[str] = None):
+    """
+    Chat over one long-lived socket bound to a session.
+
+    Client frames are {"type": "message", "message": "...", "timeout": seconds}
+    and {"type": "ping"}. The server sends "session" on connect, "token" while
+    small talk streams, "reply" with the full text once a turn is done,
+    "error", "pong", and whatever the flows push: "booking_confirmed" to the
+    session that booked, "calendar_changed" to every socket. Turns of a session
+    run one at a time, even across several sockets; pushes and pongs go out
+    while a turn is running. Every socket of the worker shares its event loop,
+    turns run in the threadpool like /chat.
+    """
+    await websocket.accept()
+    session_id = session_id or uuid.uuid4().hex
+    user_id = user_id or websocket.headers.get("X-User-Id")
+    connection = hub.connect(session_id)
+    connection.push({"type": "session", "session_id": session_id})
+    inbox: asyncio.Queue = asyncio.Queue()
+
+    def on_token(text: str):
+        connection.push({"type": "token", "text": text})
+
+    async def receive():
+        while True:
+            try:
+                frame = json.loads(await websocket.receive_text())
+                kind = frame.get("type")
+            except (ValueError, AttributeError):
+                connection.push({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+            if kind == "ping":
+                connection.push({"type": "pong"})
+            elif kind == "message" and str(frame.get("message") or "").strip():
+                await inbox.put(frame)
+            else:
+                connection.push({"type": "error", "detail": f"Unsupported frame: {kind}"})
+
+    async def process():
+        while True:
+            frame = await inbox.get()
+            with use_profile(user_id), use_session(session_id), \
+                    deadline_scope(_requested_deadline(frame.get("timeout"))):
+                try:
+                    async with admission.admit(_client_key(user_id, session_id, None),
+                                               admission_priority(frame["message"])):
+                        reply = await run_in_threadpool(process_user_message, frame["message"], on_token)
+                except Overloaded as e:
+                    connection.push({"type": "error", "status": e.status_code, "detail": e.detail,
+                                     "retry_after": e.retry_after})
+                    continue
+                except DeadlineExceeded:
+                    reply = "Sorry, that took too long. Please try again."
+                except Exception as e:
+                    print(f"Error in chat socket: {str(e)}")
+                    connection.push({"type": "error", "detail": str(e)})
+                    continue
+            connection.push({"type": "reply", "response": reply})
+
+    async def send():
+        while True:
+            await websocket.send_json(await connection.outbox.get())
+
+    tasks = [asyncio.create_task(loop()) for loop in (receive, process, send)]
     try:
-        response = process_user_message(request.message)
-        return {"response": response}
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not isinstance(task.exception(), WebSocketDisconnect):
+                print(f"Chat socket {session_id} closed: {task.exception()!r}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        hub.disconnect(connection)
+
+@app.get("/stats/admission")
+async def admission_stats():
+    """Chat turns running, queued and turned away in this worker"""
+    return admission.stats()
+
+@app.get("/stats/sockets")
+async def socket_stats():
+    """Open chat sockets and the sessions they belong to, in this worker"""
+    return hub.stats()
+
+@app.get("/stats/routing")
+async def routing_stats():
+    """How often date extraction was answered by the rule parser vs Gemini"""
+    return get_routing_stats()
+
+@app.put("/profile/{user_id}")
+async def update_profile(user_id: str, request: ProfileRequest):
+    """Set a user's timezone and working hours"""
+    try:
+        profile = set_profile(user_id, request.dict())
     except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=400, detail=f"Invalid profile: {e}")
+    return {
+        "success": True,
+        "user_id": profile.user_id,
+        "timezone": profile.timezone,
+        "work_start": profile.work_start.isoformat(),
+        "work_end": profile.work_end.isoformat()
+    }
 
 
+if PROFILING_ENABLED:
+    @app.get("/debug/profiles")
+    async def debug_profiles():
+        """Saved request profiles, newest first"""
+        return {"profiles": list_profiles()}
+
+    @app.get("/debug/profiles/{profile_id}")
+    async def debug_profile(profile_id: str, format: str = "prof", sort: str = "cumulative"):
+        """Download a profile (.prof for snakeviz/pstats) or view its top functions as text"""
+        path = profile_path(profile_id)
+        if not path:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        if format == "text":
+            if sort not in ("cumulative", "tottime", "calls"):
+                raise HTTPException(status_code=400, detail="sort must be cumulative, tottime or calls")
+            return PlainTextResponse(profile_summary(path, sort=sort))
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+@app.get("/oauth/start")
+async def oauth_start():
+    """Send the user to Google's consent page to connect a calendar"""
+    try:
+        return RedirectResponse(start_web_flow())
+    except CalendarAuthError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 @app.get("/callback")
-async def oauth_callback(code: str):
+def oauth_callback(code: str, state: str):
     """Handle OAuth callback from Google"""
     try:
-        print(f"OAuth callback received with code: {code}")
-        
-        
-        get_calendar_service(force_oauth=True)
+        print("OAuth callback received")
+        finish_web_flow(state, code)
         return {"success": True, "message": "Authentication successful!"}
+    except CalendarAuthError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"OAuth error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
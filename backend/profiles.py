@@ -0,0 +1,136 @@
+import os
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, date, time, timedelta
+from functools import lru_cache
+from typing import Optional, Dict, Tuple
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Kolkata")
+DEFAULT_WORK_START = os.getenv("DEFAULT_WORK_START", "09:00")
+DEFAULT_WORK_END = os.getenv("DEFAULT_WORK_END", "18:00")
+PROFILES_FILE = os.getenv("USER_PROFILES_FILE", "user_profiles.json")
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: str) -> ZoneInfo:
+    """Resolve an IANA timezone name once per process"""
+    return ZoneInfo(name)
+
+
+@lru_cache(maxsize=4096)
+def _day_window(timezone: str, day: date, start: time, end: time) -> Tuple[int, int]:
+    """Epoch bounds of a local [start, end) window on a day; zoneinfo resolves DST per day"""
+    tz = get_zone(timezone)
+    window_start = datetime.combine(day, start, tzinfo=tz)
+    if end == time.min:
+        window_end = datetime.combine(day + timedelta(days=1), end, tzinfo=tz)
+    else:
+        window_end = datetime.combine(day, end, tzinfo=tz)
+    return int(window_start.timestamp()), int(window_end.timestamp())
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    """Timezone and working hours for one user"""
+    user_id: str
+    timezone: str = DEFAULT_TIMEZONE
+    work_start: time = time.fromisoformat(DEFAULT_WORK_START)
+    work_end: time = time.fromisoformat(DEFAULT_WORK_END)
+
+    @property
+    def tz(self) -> ZoneInfo:
+        return get_zone(self.timezone)
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def localize(self, dt: datetime) -> datetime:
+        """Attach this profile's timezone to a naive datetime, or convert an aware one"""
+        if dt.tzinfo is None:
+            return dt.replace(tzinfo=self.tz)
+        return dt.astimezone(self.tz)
+
+    def working_window(self, day: date) -> Tuple[int, int]:
+        """Working hours of a local day as (start, end) epoch seconds"""
+        return _day_window(self.timezone, day, self.work_start, self.work_end)
+
+    def day_bounds(self, day: date) -> Tuple[int, int]:
+        """Local midnight to next local midnight as (start, end) epoch seconds"""
+        return _day_window(self.timezone, day, time.min, time.min)
+
+    def is_working_time(self, value: time) -> bool:
+        return self.work_start <= value < self.work_end
+
+    def working_hours_text(self) -> str:
+        start = self.work_start.strftime('%I %p').lstrip('0')
+        end = self.work_end.strftime('%I %p').lstrip('0')
+        return f"{start} and {end}"
+
+    @classmethod
+    def from_dict(cls, user_id: str, data: Dict[str, str]) -> "UserProfile":
+        timezone = data.get("timezone", DEFAULT_TIMEZONE)
+        get_zone(timezone)  # Fail early on unknown zone names
+        return cls(
+            user_id=user_id,
+            timezone=timezone,
+            work_start=time.fromisoformat(data.get("work_start", DEFAULT_WORK_START)),
+            work_end=time.fromisoformat(data.get("work_end", DEFAULT_WORK_END))
+        )
+
+
+DEFAULT_PROFILE = UserProfile(user_id="default")
+
+_profiles: Optional[Dict[str, UserProfile]] = None
+_active_profile: ContextVar[Optional[UserProfile]] = ContextVar("active_profile", default=None)
+
+
+def _load_profiles() -> Dict[str, UserProfile]:
+    """Read user profiles from PROFILES_FILE once; a missing file means everyone gets the default"""
+    global _profiles
+    if _profiles is None:
+        _profiles = {}
+        if os.path.exists(PROFILES_FILE):
+            try:
+                with open(PROFILES_FILE) as f:
+                    for user_id, data in json.load(f).items():
+                        _profiles[user_id] = UserProfile.from_dict(user_id, data)
+                print(f"Loaded {len(_profiles)} user profiles")
+            except Exception as e:
+                print(f"Error loading user profiles: {e}")
+    return _profiles
+
+
+def get_profile(user_id: Optional[str] = None) -> UserProfile:
+    """Profile for a user, falling back to the default profile"""
+    if not user_id:
+        return DEFAULT_PROFILE
+    return _load_profiles().get(user_id, DEFAULT_PROFILE)
+
+
+def set_profile(user_id: str, data: Dict[str, str]) -> UserProfile:
+    """Register or replace a user's profile in memory"""
+    profile = UserProfile.from_dict(user_id, data)
+    _load_profiles()[user_id] = profile
+    return profile
+
+
+def current_profile() -> UserProfile:
+    """Profile of the user the current request is running for"""
+    return _active_profile.get() or DEFAULT_PROFILE
+
+
+@contextmanager
+def use_profile(user_id: Optional[str] = None):
+    """Make a user's profile the active one for the duration of a request"""
+    token = _active_profile.set(get_profile(user_id))
+    try:
+        yield current_profile()
+    finally:
+        _active_profile.reset(token)
@@ -0,0 +1,147 @@
+import os
+import re
+import io
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import functools
+import inspect
+import threading
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Any, Callable
+
+
+# Off unless PROFILING is set; when off, profiled() returns functions untouched
+PROFILING_ENABLED = os.getenv("PROFILING", "false").lower() in ("1", "true", "yes")
+# Fraction of requests profiled without the X-Profile header
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+MAX_PROFILES = int(os.getenv("MAX_PROFILES", "200"))
+PROFILE_HEADER = "X-Profile"
+
+_PROFILE_ID_PATTERN = re.compile(r'^[0-9a-f]{12}-[A-Za-z0-9_]+$')
+
+_profile_id: ContextVar[Optional[str]] = ContextVar("profile_id", default=None)
+_active = threading.local()
+
+
+def _prune():
+    """Keep only the newest MAX_PROFILES files"""
+    files = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".prof")),
+        key=os.path.getmtime
+    )
+    for path in files[:-MAX_PROFILES] if len(files) > MAX_PROFILES else []:
+        os.remove(path)
+
+
+def _save(profiler: cProfile.Profile, profile_id: str, name: str, seconds: float):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{profile_id}-{name}.prof")
+    profiler.dump_stats(path)
+    print(f"Saved profile {path} ({seconds:.3f}s)")
+    _prune()
+
+
+def _run_profiled(fn: Callable, args, kwargs, name: str):
+    profile_id = _profile_id.get()
+    # Not selected, or already inside a profiled call on this thread
+    if profile_id is None or getattr(_active, "on", False):
+        return fn(*args, **kwargs)
+    profiler = cProfile.Profile()
+    _active.on = True
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        _active.on = False
+        _save(profiler, profile_id, name, time.perf_counter() - started)
+
+
+def profiled(fn: Callable) -> Callable:
+    """
+    Profile calls made for requests selected by profiling_middleware.
+
+    cProfile only sees the thread it runs on, so the profiler is started
+    inside the decorated function (which may run in the threadpool), not in
+    the middleware. With PROFILING off the function is returned as is.
+    """
+    if not PROFILING_ENABLED:
+        return fn
+    name = fn.__name__
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            profile_id = _profile_id.get()
+            if profile_id is None or getattr(_active, "on", False):
+                return await fn(*args, **kwargs)
+            profiler = cProfile.Profile()
+            _active.on = True
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+                _active.on = False
+                _save(profiler, profile_id, name, time.perf_counter() - started)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return _run_profiled(fn, args, kwargs, name)
+    return wrapper
+
+
+async def profiling_middleware(request, call_next):
+    """Select a request for profiling (X-Profile: 1 or sampling) and return its id in X-Profile-Id"""
+    wanted = request.headers.get(PROFILE_HEADER) == "1" or (
+        PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+    if not wanted:
+        return await call_next(request)
+    profile_id = uuid.uuid4().hex[:12]
+    token = _profile_id.set(profile_id)
+    try:
+        response = await call_next(request)
+    finally:
+        _profile_id.reset(token)
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Saved profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for filename in os.listdir(PROFILE_DIR):
+        if not filename.endswith(".prof"):
+            continue
+        path = os.path.join(PROFILE_DIR, filename)
+        profiles.append({
+            "id": filename[:-len(".prof")],
+            "size": os.path.getsize(path),
+            "created": os.path.getmtime(path)
+        })
+    return sorted(profiles, key=lambda p: p["created"], reverse=True)
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Path of a saved profile, or None for unknown or malformed ids"""
+    if not _PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+    return path if os.path.exists(path) else None
+
+
+def profile_summary(path: str, limit: int = 40, sort: str = "cumulative") -> str:
+    """Top functions of a saved profile as pstats text"""
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
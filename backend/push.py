@@ -0,0 +1,94 @@
+import os
+import asyncio
+import threading
+from typing import Dict, Any, Set
+
+from backend.sessions import current_session_id
+
+
+# Frames waiting for a slow client; beyond this, sheddable frames to it are dropped
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "256"))
+# Frames a client can do without: the reply repeats the tokens, and an agenda refresh
+# or pong can be missed. Replies, errors and booking confirmations are always queued.
+SHEDDABLE_FRAMES = {"token", "calendar_changed", "pong"}
+
+
+class Connection:
+    """One open WebSocket: its session and the frames waiting to be sent to it"""
+
+    def __init__(self, session_id: str, loop: asyncio.AbstractEventLoop):
+        self.session_id = session_id
+        self.loop = loop
+        # Unbounded so turn results always fit; push() bounds everything else
+        self.outbox: asyncio.Queue = asyncio.Queue()
+
+    def push(self, frame: Dict[str, Any]):
+        """Queue a frame; safe to call from any thread"""
+        def put():
+            if frame.get("type") in SHEDDABLE_FRAMES and self.outbox.qsize() >= PUSH_QUEUE_SIZE:
+                print(f"Dropping {frame.get('type')} push for slow session {self.session_id}")
+                return
+            self.outbox.put_nowait(frame)
+        self.loop.call_soon_threadsafe(put)
+
+
+class PushHub:
+    """
+    Open WebSocket connections of this worker, by session.
+
+    Flows running in the threadpool publish through it without knowing
+    whether anyone is listening; each connection's sender task writes the
+    frames out on the event loop. Connections live in one worker process, so
+    with several workers a push reaches only the sockets of the worker that
+    published it.
+    """
+
+    def __init__(self):
+        self._connections: Dict[str, Set[Connection]] = {}
+        self._lock = threading.Lock()
+
+    def connect(self, session_id: str) -> Connection:
+        """Register a socket; call from the event loop that serves it"""
+        connection = Connection(session_id, asyncio.get_running_loop())
+        with self._lock:
+            self._connections.setdefault(session_id, set()).add(connection)
+        return connection
+
+    def disconnect(self, connection: Connection):
+        with self._lock:
+            connections = self._connections.get(connection.session_id)
+            if connections is None:
+                return
+            connections.discard(connection)
+            if not connections:
+                del self._connections[connection.session_id]
+
+    def publish(self, session_id: str, frame: Dict[str, Any]) -> int:
+        """Push a frame to every socket of a session; returns how many there were"""
+        with self._lock:
+            connections = list(self._connections.get(session_id, ()))
+        for connection in connections:
+            connection.push(frame)
+        return len(connections)
+
+    def broadcast(self, frame: Dict[str, Any]) -> int:
+        with self._lock:
+            connections = [c for group in self._connections.values() for c in group]
+        for connection in connections:
+            connection.push(frame)
+        return len(connections)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._connections),
+                "connections": sum(len(group) for group in self._connections.values())
+            }
+
+
+hub = PushHub()
+
+
+def notify_session(frame_type: str, **data):
+    """Push a frame to the sockets of the current session, if it has any"""
+    hub.publish(current_session_id(), {"type": frame_type, **data})
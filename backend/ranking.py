@@ -0,0 +1,174 @@
+import heapq
+from dataclasses import dataclass
+from datetime import datetime, time
+from typing import List, Tuple, Iterable, Optional
+
+from backend.events import free_intervals
+
+
+@dataclass(frozen=True)
+class SlotPreferences:
+    """What makes one free slot better than another"""
+    preferred_start: time = time(10, 0)
+    preferred_end: time = time(16, 0)
+    buffer_minutes: int = 15
+    cluster_minutes: int = 60
+    lunch_start: time = time(12, 30)
+    lunch_end: time = time(13, 30)
+    # Weights
+    preferred_weight: float = 3.0
+    cluster_weight: float = 2.0
+    buffer_weight: float = 2.0
+    lunch_weight: float = 4.0
+    day_weight: float = 0.5
+
+
+DEFAULT_PREFERENCES = SlotPreferences()
+
+
+def _seconds(value: time) -> int:
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+class _Gap:
+    """A free interval plus what is on either side of it, prepared once for scoring"""
+    __slots__ = ("start", "end", "busy_before", "busy_after", "midnight", "day_index")
+
+    def __init__(self, start: int, end: int, busy_before: bool, busy_after: bool, midnight: int, day_index: int):
+        self.start = start
+        self.end = end
+        self.busy_before = busy_before
+        self.busy_after = busy_after
+        self.midnight = midnight
+        self.day_index = day_index
+
+
+def _prepare_gaps(busy: Iterable, windows: List[Tuple[int, int]], duration: int, tz) -> List[_Gap]:
+    """Split each working window into free gaps long enough for the meeting"""
+    busy = sorted(busy, key=lambda b: b.start)
+    gaps = []
+    for day_index, (window_start, window_end) in enumerate(windows):
+        local_start = datetime.fromtimestamp(window_start, tz)
+        midnight = window_start - (local_start.hour * 3600 + local_start.minute * 60 + local_start.second)
+        for start, end in free_intervals(busy, window_start, window_end, min_seconds=duration):
+            gaps.append(_Gap(start, end, start != window_start, end != window_end, midnight, day_index))
+    return gaps
+
+
+def _upper_bound(gap: _Gap, prefs: SlotPreferences) -> float:
+    """Best score any candidate inside a gap could reach"""
+    bound = prefs.preferred_weight - prefs.day_weight * gap.day_index
+    if gap.busy_before or gap.busy_after:
+        bound += prefs.cluster_weight
+    return bound
+
+
+def _score(start: int, end: int, gap: _Gap, prefs: SlotPreferences) -> float:
+    """Score one candidate; every term is O(1) given its gap"""
+    score = -prefs.day_weight * gap.day_index
+    start_of_day = start - gap.midnight
+    end_of_day = end - gap.midnight
+
+    # Preferred hours: full credit inside, decaying by the hour outside
+    preferred_start = _seconds(prefs.preferred_start)
+    preferred_end = _seconds(prefs.preferred_end)
+    if preferred_start <= start_of_day and end_of_day <= preferred_end:
+        score += prefs.preferred_weight
+    else:
+        distance = max(preferred_start - start_of_day, end_of_day - preferred_end, 0)
+        score += prefs.preferred_weight * max(0.0, 1 - distance / 3600)
+
+    # Distance to the neighbouring meetings: too close breaks the buffer, close enough clusters
+    neighbours = []
+    if gap.busy_before:
+        neighbours.append(start - gap.start)
+    if gap.busy_after:
+        neighbours.append(gap.end - end)
+    if neighbours:
+        nearest = min(neighbours)
+        buffer = prefs.buffer_minutes * 60
+        if nearest < buffer:
+            score -= prefs.buffer_weight * (buffer - nearest) / buffer
+        else:
+            cluster = max(prefs.cluster_minutes * 60, 1)
+            score += prefs.cluster_weight * max(0.0, 1 - (nearest - buffer) / cluster)
+
+    # Lunch: penalise by the fraction of the lunch break the meeting eats
+    lunch_start = _seconds(prefs.lunch_start)
+    lunch_end = _seconds(prefs.lunch_end)
+    overlap = min(end_of_day, lunch_end) - max(start_of_day, lunch_start)
+    if overlap > 0 and lunch_end > lunch_start:
+        score -= prefs.lunch_weight * overlap / (lunch_end - lunch_start)
+
+    return score
+
+
+def rank_slots(
+    busy: Iterable,
+    windows: List[Tuple[int, int]],
+    duration_minutes: int = 30,
+    k: int = 3,
+    prefs: Optional[SlotPreferences] = None,
+    step_minutes: int = 5,
+    spacing_minutes: int = 60,
+    tz=None,
+) -> List[Tuple[float, int, int]]:
+    """
+    Pick the k best meeting slots.
+
+    Candidates are generated lazily at step_minutes granularity inside the
+    free gaps of each working window and kept in a bounded min-heap, so only
+    k candidates are ever held. Gaps whose best possible score cannot beat
+    the current k-th best are skipped without generating their candidates.
+    Only the best candidate of each spacing_minutes stretch of a gap is
+    considered, so suggestions are not five-minute variations of each other.
+
+    Args:
+        busy: Busy blocks (Events or BusyIntervals) with epoch start/end
+        windows: Working windows as (start, end) epoch pairs, one per day, in order
+        duration_minutes: Meeting length
+        k: Number of slots to return; below 1 nothing is returned
+        prefs: Ranking preferences, defaults to DEFAULT_PREFERENCES
+        step_minutes: Candidate granularity
+        spacing_minutes: Minimum spread between suggestions from the same gap
+        tz: Timezone used to read local time of day
+
+    Returns:
+        list: (score, start, end) tuples, best first
+    """
+    if k < 1:
+        return []
+    prefs = prefs or DEFAULT_PREFERENCES
+    duration = duration_minutes * 60
+    step = step_minutes * 60
+    spacing = max(spacing_minutes * 60, step)
+    heap = []
+
+    def offer(item):
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heappushpop(heap, item)
+
+    for gap in _prepare_gaps(busy, windows, duration, tz):
+        if len(heap) == k and _upper_bound(gap, prefs) <= heap[0][0]:
+            continue
+        # Align candidates to the step grid so suggestions read like 10:05, not 10:03
+        start = gap.start + (-(gap.start - gap.midnight)) % step
+        bucket_end = start + spacing
+        best = None
+        while start + duration <= gap.end:
+            if start >= bucket_end:
+                offer(best)
+                best = None
+                bucket_end = start + spacing
+            end = start + duration
+            # Earlier slots win ties: -start sorts them above later ones in the min-heap
+            item = (_score(start, end, gap, prefs), -start, end)
+            if best is None or item > best:
+                best = item
+            start += step
+        if best is not None:
+            offer(best)
+
+    return [(score, -neg_start, end) for score, neg_start, end in sorted(heap, reverse=True)]
@@ -0,0 +1,164 @@
+import re
+from itertools import islice
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Iterator
+
+from dateutil.rrule import rrulestr
+import dateparser
+
+
+MAX_OCCURRENCES = 730
+DEFAULT_SERIES_WEEKS = 12
+
+WEEKDAY_CODES = {
+    'monday': 'MO', 'tuesday': 'TU', 'wednesday': 'WE', 'thursday': 'TH',
+    'friday': 'FR', 'saturday': 'SA', 'sunday': 'SU'
+}
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12
+}
+
+_NUMBER = r'(\d+|' + '|'.join(NUMBER_WORDS) + r')'
+_SPAN_PATTERN = re.compile(r'\bfor\s+(?:the\s+next\s+)?' + _NUMBER + r'\s+(day|week|month|year)s?\b', re.IGNORECASE)
+_COUNT_PATTERN = re.compile(r'\b' + _NUMBER + r'\s+(?:times|sessions|occurrences|meetings)\b', re.IGNORECASE)
+_UNTIL_PATTERN = re.compile(r'\buntil\s+(.+?)(?:\s+at\s+.*)?$', re.IGNORECASE)
+_RECURRING_PATTERN = re.compile(r'\b(every|daily|weekly|biweekly|fortnightly|monthly|recurring)\b', re.IGNORECASE)
+
+
+def _to_number(value: str) -> int:
+    return int(value) if value.isdigit() else NUMBER_WORDS[value.lower()]
+
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    month_index = dt.month - 1 + months
+    year = dt.year + month_index // 12
+    month = month_index % 12 + 1
+    # Clamp to the last day of the target month
+    for day in range(dt.day, 27, -1):
+        try:
+            return dt.replace(year=year, month=month, day=day)
+        except ValueError:
+            continue
+    return dt.replace(year=year, month=month, day=28)
+
+
+def is_recurring_request(message: str) -> bool:
+    """Whether a message asks for a repeating meeting"""
+    return bool(_RECURRING_PATTERN.search(message))
+
+
+def _format_until(until: datetime) -> str:
+    return until.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def parse_recurrence(message: str, start: datetime) -> Optional[str]:
+    """
+    Build an RFC 5545 RRULE from phrases like "every Tuesday for 3 months",
+    "daily until March 5" or "every other week, 6 times".
+
+    Every rule is bounded with COUNT or UNTIL; open-ended requests get
+    DEFAULT_SERIES_WEEKS worth of occurrences, and no rule has more than
+    MAX_OCCURRENCES.
+
+    Args:
+        message: User's message
+        start: Aware datetime of the first occurrence
+
+    Returns:
+        str: RRULE without the "RRULE:" prefix, or None if the message is not recurring
+    """
+    message_lower = message.lower()
+    if not is_recurring_request(message_lower):
+        return None
+
+    days = [code for name, code in WEEKDAY_CODES.items() if name in message_lower]
+    parts = []
+    if 'weekday' in message_lower:
+        parts += ['FREQ=WEEKLY', 'BYDAY=MO,TU,WE,TH,FR']
+    elif 'every day' in message_lower or 'daily' in message_lower:
+        parts.append('FREQ=DAILY')
+    elif 'month' in message_lower and ('every month' in message_lower or 'monthly' in message_lower):
+        parts.append('FREQ=MONTHLY')
+    else:
+        parts.append('FREQ=WEEKLY')
+        if days:
+            parts.append('BYDAY=' + ','.join(days))
+
+    if ('every other' in message_lower or 'biweekly' in message_lower or 'fortnightly' in message_lower
+            or 'every 2 weeks' in message_lower or 'every two weeks' in message_lower):
+        parts.append('INTERVAL=2')
+
+    count_match = _COUNT_PATTERN.search(message)
+    span_match = _SPAN_PATTERN.search(message)
+    until_match = _UNTIL_PATTERN.search(message)
+
+    if count_match:
+        parts.append(f'COUNT={min(_to_number(count_match.group(1)), MAX_OCCURRENCES)}')
+    elif span_match:
+        amount = _to_number(span_match.group(1))
+        unit = span_match.group(2).lower()
+        if unit == 'day':
+            until = start + timedelta(days=amount)
+        elif unit == 'week':
+            until = start + timedelta(weeks=amount)
+        elif unit == 'month':
+            until = _add_months(start, amount)
+        else:
+            until = _add_months(start, amount * 12)
+        parts.append(f'UNTIL={_format_until(until)}')
+    elif until_match and (until := dateparser.parse(
+            until_match.group(1),
+            languages=['en'],
+            settings={"PREFER_DATES_FROM": "future", "RETURN_AS_TIMEZONE_AWARE": False})):
+        # Include the whole last day
+        until = until.replace(hour=23, minute=59, second=59, tzinfo=start.tzinfo)
+        parts.append(f'UNTIL={_format_until(until)}')
+    else:
+        parts.append(f'UNTIL={_format_until(start + timedelta(weeks=DEFAULT_SERIES_WEEKS))}')
+
+    return cap_occurrences(';'.join(parts), start)
+
+
+def cap_occurrences(rule: str, start: datetime) -> str:
+    """
+    Bound a rule to MAX_OCCURRENCES, replacing a longer COUNT or UNTIL with
+    COUNT=MAX_OCCURRENCES, so the series booked is the series expanded and
+    checked. Rules within the cap are returned unchanged.
+    """
+    rule = rule.removeprefix('RRULE:')
+    expanded = rrulestr(rule, dtstart=start)
+    if sum(1 for _ in islice(expanded, MAX_OCCURRENCES + 1)) <= MAX_OCCURRENCES:
+        return rule
+    parts = [part for part in rule.split(';') if part.split('=', 1)[0].upper() not in ('COUNT', 'UNTIL')]
+    return ';'.join(parts + [f'COUNT={MAX_OCCURRENCES}'])
+
+
+def iter_occurrences(rule: str, start: datetime) -> Iterator[datetime]:
+    """
+    Lazily expand a recurrence rule, capped at MAX_OCCURRENCES.
+
+    Occurrences keep start's wall-clock time in its zone, so a 3 PM series
+    stays at 3 PM across DST changes.
+    """
+    expanded = rrulestr(rule.removeprefix('RRULE:'), dtstart=start)
+    for i, occurrence in enumerate(expanded):
+        if i >= MAX_OCCURRENCES:
+            return
+        yield occurrence
+
+
+def describe_rule(rule: str) -> str:
+    """Short human readable form of an RRULE, e.g. 'weekly on TU until 2027-01-19'"""
+    fields = dict(part.split('=', 1) for part in rule.removeprefix('RRULE:').split(';'))
+    text = fields.get('FREQ', 'WEEKLY').lower()
+    if fields.get('INTERVAL') == '2':
+        text = f"every other {'week' if text == 'weekly' else text}"
+    if 'BYDAY' in fields:
+        text += f" on {fields['BYDAY']}"
+    if 'COUNT' in fields:
+        text += f", {fields['COUNT']} times"
+    elif 'UNTIL' in fields:
+        until = datetime.strptime(fields['UNTIL'], '%Y%m%dT%H%M%SZ')
+        text += f" until {until.strftime('%B %d, %Y')}"
+    return text
@@ -0,0 +1,342 @@
+"""
+Replay recorded conversations and count upstream calls per chat turn.
+
+    python -m backend.replay backend/transcripts/*.json
+    python -m backend.replay backend/transcripts/*.json --update-baseline
+
+Each turn runs through process_user_message against an in-memory fake
+Calendar and a scripted stub LLM. The per-turn counts are compared with
+the baseline file; the run fails if any count went up, if a turn's reply
+or intent is not the one the transcript expects, or if a turn calls the
+LLM without a scripted reply.
+"""
+import io
+import re
+import sys
+import json
+import time
+import argparse
+import contextlib
+from collections import Counter
+from datetime import datetime, timedelta, time as dt_time
+from typing import Dict, Any, List, Optional
+
+from langchain.schema.messages import AIMessage
+
+import backend.agent as agent
+import backend.calendar_utils as calendar_utils
+from backend.profiles import current_profile
+
+
+DEFAULT_BASELINE = "backend/replay_baseline.json"
+# Counted per turn; wall time is reported but not compared, it is too noisy
+COUNTED = ["service_builds", "events_list", "freebusy", "insert", "patch", "delete", "batch", "llm", "date_parses"]
+# Answer to an unscripted LLM call, so the turn can finish and be reported
+UNSCRIPTED_LLM_REPLY = '{"intent": "general conversation", "reply": "(unscripted LLM call)"}'
+# {today}, {today+1}, {today-2}: dates in scripted replies, relative to the day of the replay
+_TODAY_PATTERN = re.compile(r'\{today(?:([+-]\d+))?\}')
+
+
+class _Request:
+    """Stands in for an HttpRequest; the call is counted when it executes"""
+
+    def __init__(self, counters: Counter, name: str, result):
+        self.counters = counters
+        self.name = name
+        self.result = result
+
+    def execute(self, http=None):
+        self.counters[self.name] += 1
+        return self.result()
+
+
+class FakeBatch:
+    def __init__(self, counters: Counter, callback):
+        self.counters = counters
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None):
+        self.counters["batch"] += 1
+        for request_id, request in self.requests:
+            try:
+                response = request.execute()
+            except Exception as e:
+                self.callback(request_id, None, e)
+            else:
+                self.callback(request_id, response, None)
+
+
+class FakeCalendar:
+    """
+    In-memory calendar with the slice of the Calendar API the bot uses.
+
+    Events are stored as API resources; list and freebusy filter them by
+    overlap with the requested window.
+    """
+
+    def __init__(self, events: List[Dict[str, Any]], counters: Counter):
+        self.stored = {event["id"]: event for event in events}
+        self.counters = counters
+        self._next_id = 0
+        self._resource = None
+
+    @staticmethod
+    def _epoch(value: Dict[str, str]) -> float:
+        if "dateTime" in value:
+            return datetime.fromisoformat(value["dateTime"]).timestamp()
+        return datetime.combine(datetime.fromisoformat(value["date"]).date(), dt_time.min,
+                                tzinfo=current_profile().tz).timestamp()
+
+    def _overlapping(self, time_min: str, time_max: str) -> List[Dict[str, Any]]:
+        low = datetime.fromisoformat(time_min).timestamp()
+        high = datetime.fromisoformat(time_max).timestamp()
+        found = [event for event in self.stored.values()
+                 if self._epoch(event["start"]) < high and self._epoch(event["end"]) > low]
+        return sorted(found, key=lambda event: self._epoch(event["start"]))
+
+    def _add(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        self._next_id += 1
+        event = dict(body, id=f"created{self._next_id}", htmlLink=f"https://calendar.test/event/{self._next_id}")
+        self.stored[event["id"]] = event
+        return event
+
+    def events(self):
+        self._resource = "events"
+        return self
+
+    def freebusy(self):
+        self._resource = "freebusy"
+        return self
+
+    def list(self, **kwargs):
+        items = self._overlapping(kwargs["timeMin"], kwargs["timeMax"])[:kwargs.get("maxResults", 2500)]
+        return _Request(self.counters, "events_list", lambda: {"items": items})
+
+    def query(self, body):
+        busy = [{"start": event["start"].get("dateTime"), "end": event["end"].get("dateTime")}
+                for event in self._overlapping(body["timeMin"], body["timeMax"]) if "dateTime" in event["start"]]
+        return _Request(self.counters, "freebusy", lambda: {"calendars": {"primary": {"busy": busy}}})
+
+    def insert(self, calendarId, body):
+        return _Request(self.counters, "insert", lambda: self._add(body))
+
+    def import_(self, calendarId, body):
+        return _Request(self.counters, "insert", lambda: self._add(body))
+
+    def delete(self, calendarId, eventId):
+        return _Request(self.counters, "delete", lambda: self.stored.pop(eventId, None) and {})
+
+    def patch(self, calendarId, eventId, body, fields=None):
+        return _Request(self.counters, "patch", lambda: self.stored[eventId].update(body) or self.stored[eventId])
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self.counters, callback)
+
+
+def _expand_dates(reply: str) -> str:
+    """Replace {today+N} placeholders in a scripted reply with ISO dates"""
+    today = current_profile().now().date()
+    return _TODAY_PATTERN.sub(lambda m: (today + timedelta(days=int(m.group(1) or 0))).isoformat(), reply)
+
+
+def _build_events(specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Concrete events from transcript specs relative to today, e.g.
+    {"day": 1, "start": "10:00", "end": "11:00", "summary": "Standup"}
+    """
+    profile = current_profile()
+    today = profile.now().date()
+    events = []
+    for i, spec in enumerate(specs):
+        day = today + timedelta(days=spec.get("day", 0))
+        start = datetime.combine(day, dt_time.fromisoformat(spec["start"]), tzinfo=profile.tz)
+        end = datetime.combine(day, dt_time.fromisoformat(spec["end"]), tzinfo=profile.tz)
+        events.append({
+            "id": f"seed{i}",
+            "summary": spec.get("summary", "Busy"),
+            "status": "confirmed",
+            "start": {"dateTime": start.isoformat()},
+            "end": {"dateTime": end.isoformat()}
+        })
+    return events
+
+
+@contextlib.contextmanager
+def _patched(calendar: FakeCalendar, counters: Counter, llm_replies: List[str]):
+    """Route Calendar, LLM and parser calls through counting fakes for the duration of a replay"""
+    original = {
+        "service_for": calendar_utils._service_for,
+        "credentials": calendar_utils.get_credentials,
+        "parse": calendar_utils._parse_date_time,
+        "invoke_llm": agent.invoke_llm,
+        "event_store": calendar_utils.event_store,
+        "speculative": agent.SPECULATIVE_READS,
+    }
+    parse = original["parse"]
+
+    # Only the builders behind get_calendar_service and extract_date_time_with_confidence are
+    # replaced, so their per-turn memoization is part of what gets measured
+    def service_for(creds):
+        counters["service_builds"] += 1
+        return calendar
+
+    def counting_parse(message):
+        counters["date_parses"] += 1
+        return parse(message)
+
+    def stub_llm(runnable, variables):
+        counters["llm"] += 1
+        if not llm_replies:
+            counters["unscripted_llm"] += 1
+            return AIMessage(content=UNSCRIPTED_LLM_REPLY)
+        return AIMessage(content=_expand_dates(llm_replies.pop(0)))
+
+    calendar_utils._service_for = service_for
+    calendar_utils.get_credentials = lambda: None
+    calendar_utils._parse_date_time = counting_parse
+    agent.invoke_llm = stub_llm
+    calendar_utils.event_store = None
+    # Background reads would race the instant stub LLM and make the counts nondeterministic
+    agent.SPECULATIVE_READS = False
+    try:
+        yield
+    finally:
+        calendar_utils._service_for = original["service_for"]
+        calendar_utils.get_credentials = original["credentials"]
+        calendar_utils._parse_date_time = original["parse"]
+        agent.invoke_llm = original["invoke_llm"]
+        calendar_utils.event_store = original["event_store"]
+        agent.SPECULATIVE_READS = original["speculative"]
+
+
+def replay(transcript: Dict[str, Any], verbose: bool = False) -> List[Dict[str, Any]]:
+    """
+    Run every turn of a transcript and measure it.
+
+    Transcript format:
+        {"name": "...", "calendar": [event specs], "turns": [{"user": "...", "llm": ["scripted reply", ...],
+                                                               "intent": "...", "expect": "..."}]}
+
+    Scripted replies may use {today+N} for dates. intent, when given, is the
+    intent the turn must end up with; expect is text its reply must contain.
+
+    Returns:
+        list: One dict per turn with wall_ms, the COUNTED call counts, and
+        the intent and full reply the checks run against
+    """
+    agent.reset_session()
+    counters = Counter()
+    calendar = FakeCalendar(_build_events(transcript.get("calendar", [])), counters)
+    results = []
+    for turn in transcript["turns"]:
+        llm_replies = list(turn.get("llm", []))
+        counters.clear()
+        output = io.StringIO()
+        with _patched(calendar, counters, llm_replies):
+            with contextlib.redirect_stdout(sys.stdout if verbose else output):
+                started = time.perf_counter()
+                reply = agent.process_user_message(turn["user"])
+                wall_ms = (time.perf_counter() - started) * 1000
+        result = {"user": turn["user"], "wall_ms": round(wall_ms, 1)}
+        result.update({name: counters[name] for name in COUNTED})
+        result["unscripted_llm"] = counters["unscripted_llm"]
+        result["intent"] = agent.session_state.get("intent")
+        result["reply"] = reply or ""
+        results.append(result)
+    return results
+
+
+def check(name: str, turns: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> List[str]:
+    """Turns whose reply or intent differs from the transcript's expectations, as messages"""
+    problems = []
+    for i, (turn, result) in enumerate(zip(turns, results), 1):
+        where = f"{name} turn {i} ({result['user']!r})"
+        if result["unscripted_llm"]:
+            problems.append(f"{where}: LLM called without a scripted reply")
+        if "intent" in turn and result["intent"] != turn["intent"]:
+            problems.append(f"{where}: intent {result['intent']!r}, expected {turn['intent']!r}")
+        if "expect" in turn and turn["expect"].lower() not in result["reply"].lower():
+            first_line = result["reply"].splitlines()[0][:80] if result["reply"] else ""
+            problems.append(f"{where}: reply {first_line!r} does not contain {turn['expect']!r}")
+    return problems
+
+
+def compare(name: str, results: List[Dict[str, Any]], baseline: Optional[List[Dict[str, Any]]]) -> List[str]:
+    """Regressions of one transcript against its baseline, as messages"""
+    if baseline is None:
+        return [f"{name}: no baseline (run with --update-baseline)"]
+    if len(baseline) != len(results):
+        return [f"{name}: baseline has {len(baseline)} turns, transcript has {len(results)}"]
+    problems = []
+    for i, (result, expected) in enumerate(zip(results, baseline), 1):
+        for counter in COUNTED:
+            if result[counter] > expected.get(counter, 0):
+                problems.append(f"{name} turn {i} ({result['user']!r}): {counter} "
+                                f"{expected.get(counter, 0)} -> {result[counter]}")
+    return problems
+
+
+def _print_table(name: str, results: List[Dict[str, Any]]):
+    print(f"\n{name}")
+    header = ["turn", "wall_ms"] + COUNTED
+    print("  ".join(f"{column:>14}" if i else f"{column:>4}" for i, column in enumerate(header)))
+    for i, result in enumerate(results, 1):
+        values = [str(i), f"{result['wall_ms']:.1f}"] + [str(result[counter]) for counter in COUNTED]
+        print("  ".join(f"{value:>14}" if j else f"{value:>4}" for j, value in enumerate(values)))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("transcripts", nargs="+", help="Transcript JSON files")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline counts file")
+    parser.add_argument("--update-baseline", action="store_true", help="Write current counts as the new baseline")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot's own logging")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    problems = []
+    current = {}
+    for path in args.transcripts:
+        with open(path) as f:
+            transcript = json.load(f)
+        name = transcript.get("name", path)
+        results = replay(transcript, verbose=args.verbose)
+        _print_table(name, results)
+        current[name] = [{counter: result[counter] for counter in COUNTED} for result in results]
+        problems += check(name, transcript["turns"], results)
+        if not args.update_baseline:
+            problems += compare(name, results, baseline.get(name))
+
+    if args.update_baseline:
+        if problems:
+            print("\nNot updating the baseline, these turns do not behave as scripted:")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+        baseline.update(current)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if problems:
+        print("\nRegressions:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, Callable, Tuple
+
+from backend.deadline import remaining_time, DeadlineExceeded
+
+
+# Idle sessions are forgotten after this long
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "10000"))
+# Requests that do not name a session share this one
+DEFAULT_SESSION_ID = "default"
+
+
+class SessionStore:
+    """
+    Conversation state per session id, created on first use by a factory.
+
+    Sessions idle for longer than ttl start over, and beyond max_sessions the
+    least recently used one is dropped, so abandoned browser tabs do not
+    accumulate.
+    """
+
+    def __init__(self, factory: Callable[[], Dict[str, Any]], ttl: float = SESSION_TTL_SECONDS,
+                 max_sessions: int = MAX_SESSIONS):
+        self.factory = factory
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            state = entry[1] if entry and now - entry[0] <= self.ttl else self.factory()
+            self._sessions[session_id] = (now, state)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return state
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+_active_session: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+
+
+def current_session_id() -> str:
+    """Session the current request or socket message belongs to"""
+    return _active_session.get() or DEFAULT_SESSION_ID
+
+
+@contextmanager
+def use_session(session_id: Optional[str] = None):
+    """Bind conversation state to a session for the duration of a request"""
+    token = _active_session.set(session_id or None)
+    try:
+        yield current_session_id()
+    finally:
+        _active_session.reset(token)
+
+
+# Per-session turn locks with the number of turns holding or waiting for each
+_turn_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+_turn_locks_guard = threading.Lock()
+
+
+@contextmanager
+def session_turn():
+    """
+    Run the current session's turns one at a time, whether they arrive over
+    HTTP, a socket, or several of either; a turn waits for the previous one
+    within its own deadline. Also usable as a decorator.
+    """
+    session_id = current_session_id()
+    with _turn_locks_guard:
+        lock, users = _turn_locks.get(session_id, (None, 0))
+        lock = lock or threading.Lock()
+        _turn_locks[session_id] = (lock, users + 1)
+    try:
+        timeout = remaining_time()
+        if not lock.acquire(timeout=-1 if timeout is None else max(timeout, 0)):
+            raise DeadlineExceeded("Request deadline exceeded waiting for the session's previous turn")
+        try:
+            yield
+        finally:
+            lock.release()
+    finally:
+        with _turn_locks_guard:
+            lock, users = _turn_locks[session_id]
+            if users > 1:
+                _turn_locks[session_id] = (lock, users - 1)
+            else:
+                del _turn_locks[session_id]
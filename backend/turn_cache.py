@@ -0,0 +1,123 @@
+import functools
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Callable, Dict, Any, Hashable, Tuple
+
+from backend.deadline import remaining_time, DeadlineExceeded
+
+
+class TurnCache:
+    """
+    Results memoized for one chat turn.
+
+    Keys are (group, function, arguments); a group can be dropped as a whole,
+    e.g. every calendar query after the turn writes to the calendar. Entries
+    are futures, so a call that is still running (say in a speculative
+    branch) is joined rather than repeated. Failed calls are not cached: the
+    next caller runs the call itself.
+    """
+
+    def __init__(self):
+        self._values: Dict[Tuple[str, str, Hashable], Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                entry = self._values.get(key)
+                if entry is None:
+                    entry = self._values[key] = Future()
+                    self.misses += 1
+                    break
+                self.hits += 1
+            try:
+                return entry.result(timeout=remaining_time())
+            except (Exception, DeadlineExceeded):
+                if not entry.done():
+                    raise DeadlineExceeded("Request deadline exceeded waiting for a shared call")
+                # The call being joined failed or was cancelled; run it here instead
+                continue
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                if self._values.get(key) is entry:
+                    del self._values[key]
+            entry.set_exception(e)
+            raise
+        entry.set_result(value)
+        return value
+
+    def invalidate(self, group: str):
+        with self._lock:
+            for key in [key for key in self._values if key[0] == group]:
+                del self._values[key]
+
+
+_current_cache: ContextVar[Optional[TurnCache]] = ContextVar("turn_cache", default=None)
+
+
+def current_turn_cache() -> Optional[TurnCache]:
+    return _current_cache.get()
+
+
+@contextmanager
+def turn_scope():
+    """
+    Memoize turn_memoized calls made inside this block.
+
+    A nested scope shares the outer cache, so a flow called from another flow
+    reuses what the outer one already computed. Also usable as a decorator.
+    """
+    outer = _current_cache.get()
+    if outer is not None:
+        yield outer
+        return
+    cache = TurnCache()
+    token = _current_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _current_cache.reset(token)
+
+
+def invalidate_turn_cache(group: str):
+    """Forget a group's results in the current turn, e.g. after a write"""
+    cache = _current_cache.get()
+    if cache is not None:
+        cache.invalidate(group)
+
+
+def turn_memoized(key: Optional[Callable[..., Hashable]] = None, group: str = "default"):
+    """
+    Memoize a function for the duration of the current turn_scope.
+
+    Outside a scope the function runs as usual. By default the cache key is
+    the positional and keyword arguments; pass key to build it from the
+    arguments instead (to ignore a service handle or hash a dict body).
+    Calls with unhashable arguments are not cached.
+
+    Args:
+        key: Called with the function's arguments, returns a hashable key
+        group: Name used with invalidate_turn_cache
+    """
+    def decorate(fn: Callable) -> Callable:
+        name = fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = _current_cache.get()
+            if cache is None:
+                return fn(*args, **kwargs)
+            try:
+                cache_key = (group, name, key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items()))))
+                hash(cache_key)
+            except TypeError:
+                return fn(*args, **kwargs)
+            return cache.get_or_compute(cache_key, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorate
@@ -0,0 +1,108 @@
+import os
+import time
+from threading import Lock
+from typing import Dict, Any, Callable
+
+from backend.calendar_utils import extract_date_time_with_confidence, get_calendar_service
+from backend.event_store import event_store
+from backend.recurrence import parse_recurrence
+from backend.profiles import DEFAULT_PROFILE
+from backend.agent import detect_intent, extract_duration, invoke_llm, llm
+
+
+WARMUP_LLM = os.getenv("WARMUP_LLM", "true").lower() in ("1", "true", "yes")
+
+# Phrases covering every parser branch, so dateparser loads its language data and
+# the re module caches the patterns before the first real request
+WARMUP_PHRASES = [
+    "book a meeting tomorrow at 3pm for 30 minutes",
+    "am I free next friday afternoon",
+    "what do I have on October 21",
+    "schedule a call on 21/10 at 10:30",
+    "cancel my meeting in 2 days",
+]
+
+_lock = Lock()
+_state: Dict[str, Any] = {"ready": False, "started": None, "finished": None, "steps": {}}
+
+
+def _warm_parsers():
+    for phrase in WARMUP_PHRASES:
+        detect_intent(phrase)
+        extract_duration(phrase)
+        extract_date_time_with_confidence(phrase)
+    parse_recurrence("every tuesday for 3 months", DEFAULT_PROFILE.now())
+
+
+def _warm_calendar():
+    # Loads credentials and builds the client; fails fast when nothing is authorized yet
+    get_calendar_service()
+
+
+def _warm_event_store():
+    # Resumes from the persisted sync token, so this is one small incremental call after a restart
+    if not event_store:
+        raise RuntimeError("disabled (EVENT_STORE_PATH not set)")
+    event_store.sync(get_calendar_service())
+
+
+def _warm_llm():
+    if not WARMUP_LLM:
+        raise RuntimeError("disabled by WARMUP_LLM")
+    invoke_llm(llm, "Reply with OK.")
+
+
+# (name, function, required): the worker is ready once every required step has succeeded
+WARMUP_STEPS = [
+    ("parsers", _warm_parsers, True),
+    ("calendar", _warm_calendar, False),
+    ("event_store", _warm_event_store, False),
+    ("llm", _warm_llm, False),
+]
+
+
+def _run_step(name: str, fn: Callable) -> bool:
+    started = time.perf_counter()
+    try:
+        fn()
+        result = {"ok": True}
+    except Exception as e:
+        result = {"ok": False, "error": str(e)}
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    print(f"Warmup {name}: {result}")
+    with _lock:
+        _state["steps"][name] = result
+    return result["ok"]
+
+
+def warm_up():
+    """
+    Pay the first-request costs up front: parser data, regexes, the Calendar
+    client and the first Gemini connection.
+
+    Optional steps that fail (no token yet, LLM disabled) are reported but do
+    not keep the worker out of rotation.
+    """
+    with _lock:
+        _state["started"] = time.time()
+    ready = True
+    for name, fn, required in WARMUP_STEPS:
+        if not _run_step(name, fn) and required:
+            ready = False
+    with _lock:
+        _state["ready"] = ready
+        _state["finished"] = time.time()
+
+
+def is_ready() -> bool:
+    return _state["ready"]
+
+
+def warmup_status() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "ready": _state["ready"],
+            "started": _state["started"],
+            "finished": _state["finished"],
+            "steps": dict(_state["steps"])
+        }
@@ -1,41 +1,65 @@
 import streamlit as st
-import httpx
+from datetime import date
 from google.auth.transport.requests import Request
+from client import stream_message, fetch_agenda, get_setting
 
 st.title("SchedulAI")
 
+# Messages kept in memory per session; older ones are dropped (the backend keeps its own summary)
+HISTORY_LIMIT = int(get_setting("CHAT_HISTORY_LIMIT", "200"))
+# Messages rendered per page; "Load earlier" reveals another page
+PAGE_SIZE = int(get_setting("CHAT_PAGE_SIZE", "20"))
+
 if "messages" not in st.session_state:
     st.session_state["messages"] = []
+if "visible" not in st.session_state:
+    st.session_state["visible"] = PAGE_SIZE
 
-backend_url = "https://scheduleai-hej2.onrender.com/chat" 
+with st.sidebar:
+    st.subheader("Agenda")
+    agenda_day = st.date_input("Date", value=date.today())
+    agenda_view = st.selectbox("View", ["day", "week", "month"], index=1)
+    if st.button("Show agenda"):
+        try:
+            agenda = fetch_agenda(agenda_day.isoformat(), agenda_view)
+            for day, events in agenda.get("days", {}).items():
+                if events:
+                    st.markdown(f"**{day}**")
+                    for event in events:
+                        st.markdown(f"- {event['summary']}")
+            if not any(agenda.get("days", {}).values()):
+                st.info("Nothing scheduled.")
+        except Exception as e:
+            st.error(f"Could not load agenda: {e}")
 
 
-form_key = st.session_state.get("form_key", 0)
+def render(sender: str, msg: str):
+    with st.chat_message("user" if sender == "user" else "assistant"):
+        st.markdown(msg)
 
-with st.form(f"chat_form_{form_key}"):
-    user_input = st.text_input("You:", "", key=f"input_{form_key}")
-    submitted = st.form_submit_button("Send")
 
+messages = st.session_state["messages"]
+hidden = max(len(messages) - st.session_state["visible"], 0)
+if hidden and st.button(f"Load earlier messages ({hidden} more)"):
+    st.session_state["visible"] += PAGE_SIZE
+    st.rerun()
+
+# Only the visible window is rendered, so a rerun costs the same after hundreds of turns
+for sender, msg in messages[hidden:]:
+    render(sender, msg)
 
-if submitted and user_input:
-    st.session_state["messages"].append(("user", user_input))
-    with st.spinner("Thinking..."):
+user_input = st.chat_input("Ask about your calendar...")
+if user_input:
+    render("user", user_input)
+    with st.chat_message("assistant"):
         try:
-    
-            response = httpx.post(backend_url, json={"message": user_input})
-            agent_reply = response.json().get("response", "No response from backend.")
+            agent_reply = st.write_stream(stream_message(user_input))
         except Exception as e:
             agent_reply = f"Error: {e}"
-    st.session_state["messages"].append(("agent", agent_reply))
-    
-
-    st.session_state["form_key"] = form_key + 1
-
-    st.rerun()
-
+            st.markdown(agent_reply)
 
-for sender, msg in st.session_state["messages"]:
-    if sender == "user":
-        st.markdown(f"**You:** {msg}")
-    else:
-        st.markdown(f"**Agent:** {msg}")
+    messages.append(("user", user_input))
+    messages.append(("agent", agent_reply if isinstance(agent_reply, str) else str(agent_reply)))
+    if len(messages) > HISTORY_LIMIT:
+        del messages[:len(messages) - HISTORY_LIMIT]
+    st.session_state["visible"] = min(st.session_state["visible"], HISTORY_LIMIT)
@@ -0,0 +1,165 @@
+import os
+import json
+import uuid
+from typing import Optional, Dict, Any, Iterator
+
+import httpx
+import streamlit as st
+
+
+DEFAULT_BACKEND_URL = "https://scheduleai-hej2.onrender.com"
+
+
+def get_setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Environment variable first, then .streamlit/secrets.toml"""
+    value = os.getenv(name)
+    if value is not None:
+        return value
+    try:
+        return st.secrets.get(name, default)
+    except Exception:  # No secrets file
+        return default
+
+
+BACKEND_URL = get_setting("BACKEND_URL", DEFAULT_BACKEND_URL).rstrip("/")
+USER_ID = get_setting("SCHEDULEAI_USER_ID")
+CONNECT_TIMEOUT = float(get_setting("BACKEND_CONNECT_TIMEOUT", "5"))
+CHAT_TIMEOUT = float(get_setting("BACKEND_CHAT_TIMEOUT", "30"))
+AGENDA_CACHE_TTL = int(get_setting("AGENDA_CACHE_TTL", "30"))
+# HTTP/2 needs the h2 package (pip install "httpx[http2]")
+USE_HTTP2 = get_setting("BACKEND_HTTP2", "false").lower() in ("1", "true", "yes")
+# "ws" keeps one /ws/chat socket per browser session (pip install websockets); "http" posts each message
+TRANSPORT = get_setting("BACKEND_TRANSPORT", "http").lower()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _websockets_available() -> bool:
+    try:
+        import websockets.sync.client  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _busy_message(retry_after) -> str:
+    return f"The assistant is busy right now. Please try again in {retry_after or 'a few'} seconds."
+
+
+def session_id() -> str:
+    """Backend conversation this browser session belongs to"""
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
+    return st.session_state["session_id"]
+
+
+@st.cache_resource
+def get_client() -> httpx.Client:
+    """
+    One pooled client per Streamlit server process.
+
+    Reruns and sessions share it, so each message reuses a warm keep-alive
+    connection instead of paying for a new TCP and TLS handshake.
+    """
+    headers = {"X-User-Id": USER_ID} if USER_ID else {}
+    return httpx.Client(
+        base_url=BACKEND_URL,
+        headers=headers,
+        http2=USE_HTTP2 and _http2_available(),
+        timeout=httpx.Timeout(CHAT_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+    )
+
+
+def _socket():
+    """This browser session's open /ws/chat socket, connecting on first use"""
+    from websockets.sync.client import connect
+
+    socket = st.session_state.get("chat_socket")
+    if socket is None:
+        url = BACKEND_URL.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+        headers = {"X-User-Id": USER_ID} if USER_ID else {}
+        socket = connect(f"{url}/ws/chat?session_id={session_id()}", additional_headers=headers,
+                         open_timeout=CONNECT_TIMEOUT)
+        st.session_state["chat_socket"] = socket
+    return socket
+
+
+def _handle_push(frame: Dict[str, Any]):
+    """Frames the backend sent on its own rather than in answer to a message"""
+    if frame.get("type") in ("calendar_changed", "booking_confirmed"):
+        fetch_agenda.clear()
+
+
+def _stream_socket(message: str) -> Iterator[str]:
+    """
+    One turn over the session's socket.
+
+    Streamlit only runs while handling input, so pushes that arrived between
+    turns are picked up here, before the reply.
+    """
+    socket = _socket()
+    try:
+        socket.send(json.dumps({"type": "message", "message": message, "timeout": max(CHAT_TIMEOUT - 2, 1)}))
+        streamed = []
+        while True:
+            frame = json.loads(socket.recv(timeout=CHAT_TIMEOUT))
+            kind = frame.get("type")
+            if kind == "token":
+                streamed.append(frame["text"])
+                yield frame["text"]
+            elif kind == "reply":
+                reply = frame.get("response", "No response from backend.")
+                text = "".join(streamed).strip()
+                if not text:
+                    yield reply
+                elif reply != text:
+                    yield "\n\n" + reply
+                return
+            elif kind == "error" and frame.get("status") in (429, 503):
+                yield _busy_message(frame.get("retry_after"))
+                return
+            elif kind == "error":
+                raise RuntimeError(frame.get("detail", "Backend error"))
+            else:
+                _handle_push(frame)
+    except Exception:
+        # A broken or timed out socket is replaced on the next message
+        st.session_state.pop("chat_socket", None)
+        socket.close()
+        raise
+
+
+def stream_message(message: str) -> Iterator[str]:
+    """Send a chat message and yield the reply text as the backend produces it"""
+    if TRANSPORT == "ws" and _websockets_available():
+        yield from _stream_socket(message)
+        return
+    with get_client().stream(
+        "POST",
+        "/chat/stream",
+        json={"message": message},
+        headers={"X-Request-Timeout": str(max(CHAT_TIMEOUT - 2, 1)), "X-Session-Id": session_id()}
+    ) as response:
+        if response.status_code == 504:
+            yield "That took too long. Please try again."
+            return
+        if response.status_code in (429, 503):
+            yield _busy_message(response.headers.get("Retry-After"))
+            return
+        response.raise_for_status()
+        yield from response.iter_text()
+
+
+@st.cache_data(ttl=AGENDA_CACHE_TTL, show_spinner=False)
+def fetch_agenda(day: str, view: str) -> Dict[str, Any]:
+    """Agenda for a day, week or month; read-only, so briefly cached per (day, view)"""
+    response = get_client().post("/test/agenda", json={"date": day, "view": view})
+    response.raise_for_status()
+    return response.json()
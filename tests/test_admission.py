@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from backend.admission import (
+    AdmissionController, Overloaded, PRIORITY_CONFIRMATION, PRIORITY_CHAT
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _hold(controller, client, release, priority=PRIORITY_CHAT, entered=None):
+    async with controller.admit(client, priority):
+        if entered is not None:
+            entered.append(client)
+        await release.wait()
+
+
+def test_admits_up_to_capacity_and_releases():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=2, max_per_client=2)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_hold(controller, f"c{i}", release)) for i in range(2)]
+        await asyncio.sleep(0)
+        assert controller.in_flight == 2
+        release.set()
+        await asyncio.gather(*tasks)
+        return controller
+
+    controller = run(scenario())
+    assert controller.in_flight == 0
+    assert controller.admitted == 2
+    assert controller.stats()["clients"] == 0
+
+
+def test_client_over_its_share_gets_429():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=4, max_per_client=1)
+        release = asyncio.Event()
+        task = asyncio.create_task(_hold(controller, "alice", release))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as rejected:
+            async with controller.admit("alice"):
+                pass
+        async with controller.admit("bob"):
+            pass
+        release.set()
+        await task
+        return controller, rejected.value
+
+    controller, error = run(scenario())
+    assert error.status_code == 429
+    assert error.retry_after >= 1
+    assert controller.rejected["client"] == 1
+
+
+def test_queued_turns_run_by_priority():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_client=4, queue_timeout=5)
+        release = asyncio.Event()
+        entered = []
+        running = asyncio.create_task(_hold(controller, "first", release, entered=entered))
+        await asyncio.sleep(0)
+        chat = asyncio.create_task(_hold(controller, "chat", release, PRIORITY_CHAT, entered))
+        await asyncio.sleep(0)
+        confirmation = asyncio.create_task(_hold(controller, "confirm", release, PRIORITY_CONFIRMATION, entered))
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 2
+        release.set()
+        await asyncio.gather(running, chat, confirmation)
+        return entered
+
+    assert run(scenario()) == ["first", "confirm", "chat"]
+
+
+def test_full_queue_displaces_a_less_important_waiter():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_client=4, queue_size=1, queue_timeout=5)
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(controller, "first", release))
+        await asyncio.sleep(0)
+        chat = asyncio.create_task(_hold(controller, "chat", release, PRIORITY_CHAT))
+        await asyncio.sleep(0)
+        confirmation = asyncio.create_task(_hold(controller, "confirm", release, PRIORITY_CONFIRMATION))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(running, chat, confirmation, return_exceptions=True)
+        return controller, results
+
+    controller, (_, chat, confirmation) = run(scenario())
+    assert isinstance(chat, Overloaded) and chat.status_code == 503
+    assert confirmation is None
+    assert controller.rejected["displaced"] == 1
+    assert controller.in_flight == 0
+
+
+def test_waiting_past_the_queue_timeout_is_rejected():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_client=4, queue_timeout=0.05)
+        controller._service_seconds = 0.01
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(controller, "first", release))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as rejected:
+            async with controller.admit("second"):
+                pass
+        release.set()
+        await running
+        return controller, rejected.value
+
+    controller, error = run(scenario())
+    assert error.status_code == 503
+    assert controller.rejected["timeout"] == 1
+    assert controller.in_flight == 0
+    assert controller.stats()["clients"] == 0
+
+
+def test_a_cancelled_waiter_gives_its_place_back():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_client=4, queue_timeout=5)
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(controller, "first", release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(_hold(controller, "gone", release))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await asyncio.gather(running, waiter, return_exceptions=True)
+        return controller
+
+    controller = run(scenario())
+    assert controller.in_flight == 0
+    assert controller.stats()["queued"] == 0
+    assert controller.stats()["clients"] == 0
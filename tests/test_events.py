@@ -0,0 +1,55 @@
+from datetime import timezone
+
+from backend.events import Event, BusyInterval, parse_events, parse_busy, free_intervals, sweep_conflicts
+
+
+def test_from_api_parses_timed_and_all_day_events():
+    timed = Event.from_api({
+        "id": "a", "summary": "Standup",
+        "start": {"dateTime": "2026-10-19T09:00:00+00:00"},
+        "end": {"dateTime": "2026-10-19T09:15:00+00:00"}
+    }, timezone.utc)
+    all_day = Event.from_api({
+        "id": "b", "start": {"date": "2026-10-19"}, "end": {"date": "2026-10-20"}
+    }, timezone.utc)
+
+    assert timed.end - timed.start == 15 * 60
+    assert not timed.all_day
+    assert all_day.all_day
+    assert all_day.summary == "No title"
+    assert all_day.end - all_day.start == 24 * 3600
+
+
+def test_parse_events_skips_cancelled():
+    items = [
+        {"id": "a", "start": {"date": "2026-10-19"}, "end": {"date": "2026-10-20"}},
+        {"id": "b", "status": "cancelled", "start": {"date": "2026-10-19"}, "end": {"date": "2026-10-20"}},
+    ]
+    assert [event.id for event in parse_events(items, timezone.utc)] == ["a"]
+
+
+def test_parse_busy_sorts_by_start():
+    busy = parse_busy([
+        {"start": "2026-10-19T12:00:00+00:00", "end": "2026-10-19T13:00:00+00:00"},
+        {"start": "2026-10-19T09:00:00+00:00", "end": "2026-10-19T10:00:00+00:00"},
+    ])
+    assert busy[0].start < busy[1].start
+
+
+def test_free_intervals_merges_overlaps_and_drops_short_gaps():
+    busy = [BusyInterval(30, 50), BusyInterval(10, 20), BusyInterval(15, 25), BusyInterval(52, 60)]
+    assert free_intervals(busy, 0, 100) == [(0, 10), (25, 30), (50, 52), (60, 100)]
+    assert free_intervals(busy, 0, 100, min_seconds=5) == [(0, 10), (25, 30), (60, 100)]
+
+
+def test_free_intervals_ignores_blocks_outside_the_window():
+    busy = [BusyInterval(0, 10), BusyInterval(90, 120)]
+    assert free_intervals(busy, 20, 80) == [(20, 80)]
+    assert free_intervals([BusyInterval(0, 200)], 20, 80) == []
+
+
+def test_sweep_conflicts_flags_overlapping_candidates():
+    busy = [BusyInterval(10, 20), BusyInterval(40, 50)]
+    candidates = [(0, 10), (5, 15), (20, 40), (45, 60), (60, 70)]
+    flags = [conflict for _, _, conflict in sweep_conflicts(candidates, busy)]
+    assert flags == [False, True, False, True, False]
@@ -0,0 +1,82 @@
+from backend.ics import iter_ics_events, event_to_ics, calendar_header, calendar_footer, MAX_LINE_OCTETS
+
+
+SAMPLE = """BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+UID:one@example.com
+DTSTART;TZID=Europe/Berlin:20261020T090000
+DTEND;TZID=Europe/Berlin:20261020T100000
+SUMMARY:Planning\\, Q4
+DESCRIPTION:First line\\nsecond line that is folded
+ onto the next line
+RRULE:FREQ=WEEKLY;COUNT=4
+BEGIN:VALARM
+TRIGGER:-PT15M
+SUMMARY:Alarm
+END:VALARM
+END:VEVENT
+BEGIN:VEVENT
+UID:two@example.com
+DTSTART;VALUE=DATE:20261021
+SUMMARY:Offsite
+END:VEVENT
+BEGIN:VEVENT
+UID:three@example.com
+DTSTART:20261022T080000Z
+DURATION:PT1H30M
+END:VEVENT
+BEGIN:VEVENT
+UID:four@example.com
+SUMMARY:No start
+END:VEVENT
+END:VCALENDAR
+""".splitlines(keepends=True)
+
+
+def test_parses_events_into_api_resources():
+    timed, all_day, with_duration, broken = iter_ics_events(SAMPLE, "UTC")
+
+    assert timed["iCalUID"] == "one@example.com"
+    assert timed["summary"] == "Planning, Q4"
+    assert timed["description"] == "First line\nsecond line that is foldedonto the next line"
+    assert timed["start"] == {"dateTime": "2026-10-20T09:00:00+02:00", "timeZone": "Europe/Berlin"}
+    assert timed["recurrence"] == ["RRULE:FREQ=WEEKLY;COUNT=4"]
+
+    assert all_day["start"] == {"date": "2026-10-21"}
+    assert all_day["end"] == {"date": "2026-10-22"}
+
+    assert with_duration["end"]["dateTime"] == "2026-10-22T09:30:00+00:00"
+    assert with_duration["summary"] == "No title"
+
+    assert broken["uid"] == "four@example.com"
+    assert "error" in broken
+
+
+def test_floating_times_use_the_default_zone():
+    lines = ["BEGIN:VEVENT", "UID:x", "DTSTART:20261020T090000", "DTEND:20261020T093000", "END:VEVENT"]
+    event, = iter_ics_events(lines, "America/New_York")
+    assert event["start"] == {"dateTime": "2026-10-20T09:00:00-04:00", "timeZone": "America/New_York"}
+
+
+def test_round_trips_through_export():
+    event, = iter_ics_events(SAMPLE[:17], "UTC")
+    text = calendar_header() + event_to_ics(event) + calendar_footer()
+
+    parsed, = iter_ics_events(text.splitlines(keepends=True), "UTC")
+    for field in ("iCalUID", "summary", "description", "start", "end", "recurrence"):
+        assert parsed[field] == event[field]
+
+
+def test_long_lines_are_folded_without_splitting_characters():
+    event = {
+        "iCalUID": "long@example.com",
+        "summary": "Überprüfung " * 20,
+        "start": {"date": "2026-10-20"},
+        "end": {"date": "2026-10-21"},
+    }
+    block = event_to_ics(event)
+
+    assert all(len(line.encode("utf-8")) <= MAX_LINE_OCTETS for line in block.split("\r\n"))
+    parsed, = iter_ics_events(block.splitlines(keepends=True), "UTC")
+    assert parsed["summary"] == event["summary"]
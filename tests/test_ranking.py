@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+
+from backend.events import BusyInterval
+from backend.ranking import rank_slots, SlotPreferences
+
+
+def _at(hour, minute=0, day=19):
+    return int(datetime(2026, 10, day, hour, minute, tzinfo=timezone.utc).timestamp())
+
+
+WORKDAY = [(_at(9), _at(17))]
+
+
+def test_returns_k_slots_best_first_inside_the_window():
+    ranked = rank_slots([], WORKDAY, duration_minutes=30, k=3, tz=timezone.utc)
+
+    assert len(ranked) == 3
+    scores = [score for score, _, _ in ranked]
+    assert scores == sorted(scores, reverse=True)
+    for _, start, end in ranked:
+        assert end - start == 30 * 60
+        assert _at(9) <= start and end <= _at(17)
+
+
+def test_slots_avoid_busy_blocks():
+    busy = [BusyInterval(_at(9), _at(12)), BusyInterval(_at(13), _at(17))]
+    ranked = rank_slots(busy, WORKDAY, duration_minutes=30, k=5, tz=timezone.utc)
+
+    assert ranked
+    for _, start, end in ranked:
+        assert _at(12) <= start and end <= _at(13)
+
+
+def test_slots_from_one_gap_are_spread_out():
+    ranked = rank_slots([], WORKDAY, duration_minutes=30, k=4, spacing_minutes=60, tz=timezone.utc)
+    starts = sorted(start for _, start, _ in ranked)
+    assert all(later - earlier >= 5 * 60 for earlier, later in zip(starts, starts[1:]))
+    assert len(set(start // 3600 for start in starts)) == len(starts)
+
+
+def test_preferred_hours_win():
+    prefs = SlotPreferences(lunch_weight=0.0, cluster_weight=0.0, buffer_weight=0.0)
+    _, start, end = rank_slots([], WORKDAY, duration_minutes=60, k=1, prefs=prefs, tz=timezone.utc)[0]
+    assert _at(10) <= start and end <= _at(16)
+
+
+def test_earlier_days_rank_higher():
+    windows = [(_at(9, day=19), _at(17, day=19)), (_at(9, day=20), _at(17, day=20))]
+    _, start, _ = rank_slots([], windows, duration_minutes=30, k=1, tz=timezone.utc)[0]
+    assert start < _at(0, day=20)
+
+
+def test_no_room_or_no_k_returns_nothing():
+    assert rank_slots([BusyInterval(_at(9), _at(17))], WORKDAY, k=3, tz=timezone.utc) == []
+    assert rank_slots([], WORKDAY, k=0, tz=timezone.utc) == []
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from backend.recurrence import (
+    parse_recurrence, iter_occurrences, describe_rule, is_recurring_request, cap_occurrences, MAX_OCCURRENCES
+)
+
+
+BERLIN = ZoneInfo("Europe/Berlin")
+START = datetime(2026, 10, 20, 15, 0, tzinfo=BERLIN)
+
+
+def test_non_recurring_message_has_no_rule():
+    assert not is_recurring_request("book a call tomorrow at 3pm")
+    assert parse_recurrence("book a call tomorrow at 3pm", START) is None
+
+
+def test_weekday_with_count():
+    assert parse_recurrence("every Tuesday, 6 times", START) == "FREQ=WEEKLY;BYDAY=TU;COUNT=6"
+
+
+def test_every_other_week_with_number_words():
+    assert parse_recurrence("every other week, six sessions", START) == "FREQ=WEEKLY;INTERVAL=2;COUNT=6"
+
+
+def test_span_becomes_until():
+    rule = parse_recurrence("daily standup for 2 weeks", START)
+    assert rule.startswith("FREQ=DAILY;UNTIL=")
+    assert rule.endswith("20261103T140000Z")
+
+
+def test_open_ended_series_is_bounded():
+    rule = parse_recurrence("weekly sync", START)
+    assert "UNTIL=" in rule or "COUNT=" in rule
+
+
+def test_count_is_capped():
+    assert parse_recurrence("every day, 5000 times", START).endswith(f"COUNT={MAX_OCCURRENCES}")
+
+
+def test_long_spans_are_capped():
+    assert parse_recurrence("daily standup for 5 years", START) == f"FREQ=DAILY;COUNT={MAX_OCCURRENCES}"
+
+
+def test_cap_occurrences_replaces_a_longer_bound():
+    assert cap_occurrences("RRULE:FREQ=DAILY;COUNT=5000;BYHOUR=15", START) == f"FREQ=DAILY;BYHOUR=15;COUNT={MAX_OCCURRENCES}"
+    assert cap_occurrences("FREQ=DAILY;UNTIL=20600101T000000Z", START) == f"FREQ=DAILY;COUNT={MAX_OCCURRENCES}"
+    assert cap_occurrences("RRULE:FREQ=WEEKLY;COUNT=10", START) == "FREQ=WEEKLY;COUNT=10"
+
+
+def test_occurrences_keep_wall_clock_time_across_dst():
+    occurrences = list(iter_occurrences("FREQ=WEEKLY;COUNT=3", START))
+    assert [o.hour for o in occurrences] == [15, 15, 15]
+    # Berlin leaves summer time on October 25th, 2026
+    assert occurrences[0].utcoffset() - occurrences[1].utcoffset() == timedelta(hours=1)
+
+
+def test_occurrences_are_capped():
+    assert sum(1 for _ in iter_occurrences("RRULE:FREQ=DAILY", START)) == MAX_OCCURRENCES
+
+
+def test_describe_rule():
+    assert describe_rule("FREQ=WEEKLY;INTERVAL=2;BYDAY=TU;COUNT=6") == "every other week on TU, 6 times"
+    assert describe_rule("RRULE:FREQ=DAILY;UNTIL=20261103T140000Z") == "daily until November 03, 2026"
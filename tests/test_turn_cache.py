@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from backend.deadline import deadline_scope, DeadlineExceeded
+from backend.turn_cache import TurnCache, turn_scope, turn_memoized, invalidate_turn_cache, current_turn_cache
+
+
+calls = []
+
+
+@turn_memoized(group="calendar")
+def lookup(day):
+    calls.append(day)
+    return f"events on {day}"
+
+
+@turn_memoized(key=lambda service, day: day, group="calendar")
+def lookup_with_service(service, day):
+    calls.append(day)
+    return day
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+def test_outside_a_scope_every_call_runs():
+    lookup("mon")
+    lookup("mon")
+    assert calls == ["mon", "mon"]
+    assert current_turn_cache() is None
+
+
+def test_inside_a_scope_repeated_calls_are_memoized():
+    with turn_scope() as cache:
+        assert lookup("mon") == lookup("mon") == "events on mon"
+        lookup("tue")
+    assert calls == ["mon", "tue"]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_nested_scopes_share_the_outer_cache():
+    with turn_scope() as outer:
+        lookup("mon")
+        with turn_scope() as inner:
+            lookup("mon")
+        assert inner is outer
+    assert calls == ["mon"]
+
+
+def test_key_function_ignores_unhashable_arguments():
+    with turn_scope():
+        lookup_with_service({"handle": 1}, "mon")
+        lookup_with_service({"handle": 2}, "mon")
+    assert calls == ["mon"]
+
+
+def test_unhashable_arguments_are_not_cached():
+    with turn_scope():
+        lookup(["mon"])
+        lookup(["mon"])
+    assert calls == [["mon"], ["mon"]]
+
+
+def test_invalidate_drops_only_its_group():
+    cache = TurnCache()
+    cache.get_or_compute(("calendar", "f", 1), lambda: 1)
+    cache.get_or_compute(("profile", "f", 1), lambda: 1)
+    cache.invalidate("calendar")
+    cache.get_or_compute(("calendar", "f", 1), lambda: 1)
+    cache.get_or_compute(("profile", "f", 1), lambda: 1)
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_invalidate_turn_cache_after_a_write():
+    with turn_scope():
+        lookup("mon")
+        invalidate_turn_cache("calendar")
+        lookup("mon")
+    assert calls == ["mon", "mon"]
+
+
+def test_failures_are_not_cached():
+    cache = TurnCache()
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute(("g", "f", 1), fail)
+    assert cache.get_or_compute(("g", "f", 1), lambda: "ok") == "ok"
+
+
+def test_concurrent_callers_join_the_running_call():
+    cache = TurnCache()
+    started = threading.Event()
+    results = []
+
+    def slow():
+        started.set()
+        time.sleep(0.1)
+        calls.append("slow")
+        return "value"
+
+    first = threading.Thread(target=lambda: results.append(cache.get_or_compute(("g", "f", 1), slow)))
+    first.start()
+    started.wait()
+    results.append(cache.get_or_compute(("g", "f", 1), slow))
+    first.join()
+
+    assert results == ["value", "value"]
+    assert calls == ["slow"]
+
+
+def test_joining_a_running_call_respects_the_deadline():
+    cache = TurnCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocked():
+        started.set()
+        release.wait()
+        return "late"
+
+    first = threading.Thread(target=lambda: cache.get_or_compute(("g", "f", 1), blocked))
+    first.start()
+    started.wait()
+    try:
+        with deadline_scope(0.05), pytest.raises(DeadlineExceeded):
+            cache.get_or_compute(("g", "f", 1), blocked)
+    finally:
+        release.set()
+        first.join()